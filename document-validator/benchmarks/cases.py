@@ -0,0 +1,222 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import json
+from byteplug.document import Node, validate_specs, normalize_specs
+from byteplug.document import document_to_object, object_to_document
+from byteplug.document import specs, pattern
+
+# Notes:
+# - This module defines the shapes of specs and documents the benchmarks run
+#   on; it's shared by the timing benchmarks ('run' script) and the memory
+#   benchmarks ('memory' script).
+# - Each case has a valid and an invalid input, both in their Python object
+#   form (for object_to_document()) and in their JSON document form (for
+#   document_to_object()). Inputs are deterministic so results can be compared
+#   across runs.
+# - Both scripts run the same benchmarks (see make_benchmarks()). Converters
+#   are given normalized specs, like Endpoints does; invalid inputs are
+#   converted with lazy validation (all errors are collected).
+# - The memos of validate_specs() and normalize_specs() (and the cache of the
+#   compiled patterns) are cleared before each call, and the 'Node' target
+#   builds a new tree of nodes (its object form is built along); otherwise
+#   the benchmarks would only measure memo and cache hits.
+
+__all__ = ['Case', 'CASES', 'count_nodes', 'clear_memos', 'make_benchmarks']
+
+class Case:
+    def __init__(self, name, make_node, valid_object, invalid_object):
+        # The function building the tree of nodes is kept; nodes cache their
+        # object form and their canonical form, a new tree has neither.
+        self.name = name
+        self.make_node = make_node
+        self.node = make_node()
+        self.specs = self.node.to_object()
+
+        self.objects = {
+            'valid': valid_object,
+            'invalid': invalid_object
+        }
+
+        # The document of the valid object is produced by the toolkit (for
+        # instance, integer keys must be turned into strings).
+        self.documents = {
+            'valid': object_to_document(valid_object, self.specs),
+            'invalid': json.dumps(invalid_object)
+        }
+
+def count_nodes(object):
+    # Count the nodes of an object (or of a specs) without recursion.
+    count = 0
+    stack = [object]
+    while stack:
+        node = stack.pop()
+        count += 1
+        if type(node) is dict:
+            stack.extend(node.values())
+        elif type(node) in (list, tuple):
+            stack.extend(node)
+
+    return count
+
+def clear_memos():
+    # Forget the specs validated and normalized so far, and the compiled
+    # patterns.
+    specs.validated_specs.clear()
+    specs.validated_specs_ids.clear()
+    specs.validated_nodes.clear()
+    specs.normalized_specs_memo.clear()
+    specs.normalized_specs_ids.clear()
+    pattern.compiled_patterns.clear()
+
+def make_benchmarks(case):
+    # Return a list of (target, input, function, nodes) tuples.
+    specs = normalize_specs(case.specs)
+    specs_nodes = count_nodes(case.specs)
+
+    def validate():
+        clear_memos()
+        validate_specs(case.specs)
+
+    def normalize():
+        clear_memos()
+        normalize_specs(case.specs)
+
+    benchmarks = [
+        ('validate_specs', 'valid', validate, specs_nodes),
+        ('normalize_specs', 'valid', normalize, specs_nodes),
+        ('Node', 'valid', lambda: case.make_node().to_object(), specs_nodes)
+    ]
+
+    for input in ['valid', 'invalid']:
+        document = case.documents[input]
+        object = case.objects[input]
+        nodes = count_nodes(object)
+
+        benchmarks.append((
+            'document_to_object', input,
+            lambda document=document: document_to_object(document, specs, errors=[]),
+            nodes
+        ))
+        benchmarks.append((
+            'object_to_document', input,
+            lambda object=object: object_to_document(object, specs, errors=[]),
+            nodes
+        ))
+
+    return benchmarks
+
+def make_wide_map_case():
+    # Records of 300 fields, which is the typical shape of our payloads.
+    def make_node():
+        fields = {}
+        for index in range(300):
+            if index % 3 == 0:
+                fields[f'number-{index}'] = Node('number', min=0, max=1000)
+            elif index % 3 == 1:
+                fields[f'string-{index}'] = Node('string', length=(1, 32))
+            else:
+                fields[f'flag-{index}'] = Node('flag', option=True)
+
+        return Node('array', value=Node('map', fields=fields))
+
+    fields = make_node().to_object()['value']['fields']
+
+    def make_record(index, valid):
+        record = {}
+        for key in fields.keys():
+            if key.startswith('number'):
+                record[key] = index if valid or index % 10 else -1
+            elif key.startswith('string'):
+                record[key] = "Lorem ipsum"
+            elif index % 2:
+                record[key] = True
+
+        return record
+
+    return Case(
+        'wide-map', make_node,
+        [make_record(index, True) for index in range(100)],
+        [make_record(index, False) for index in range(100)]
+    )
+
+def make_deep_nesting_case():
+    depth = 200
+
+    def make_node():
+        node = Node('map', fields={'value': Node('number')})
+        for _ in range(depth):
+            node = Node('map', fields={
+                'value': Node('number'),
+                'child': node
+            })
+
+        return node
+
+    def make_object(valid):
+        object = {'value': 0}
+        for index in range(depth):
+            object = {'value': index, 'child': object}
+
+        if not valid:
+            object['child']['child']['value'] = "foo"
+
+        return object
+
+    return Case('deep-nesting', make_node, make_object(True), make_object(False))
+
+def make_numeric_array_case():
+    def make_node():
+        return Node('array', value=Node('number', decimal=False, min=0, max=(1000000, True)))
+
+    valid_object = list(range(100000))
+    invalid_object = [value if value % 10 else -value - 1 for value in range(100000)]
+
+    return Case('numeric-array', make_node, valid_object, invalid_object)
+
+def make_string_patterns_case():
+    def make_node():
+        return Node('array', value=Node('map', fields={
+            'email': Node('string', pattern=r"^[\w.+-]+@[\w-]+\.[\w.-]+$"),
+            'phone': Node('string', pattern=r"^\+?\d{2,3}( \d{2,4}){2,4}$"),
+            'zip-code': Node('string', length=5, pattern=r"^\d{5}$"),
+            'slug': Node('string', length=(1, 64), pattern=r"^[a-z0-9]+(-[a-z0-9]+)*$"),
+            'country': Node('enum', values=['be', 'fr', 'nl', 'us'])
+        }))
+
+    def make_record(index, valid):
+        return {
+            'email': f"john.doe{index}@example.com",
+            'phone': "+32 470 12 34 56",
+            'zip-code': f"{10000 + index % 90000}",
+            'slug': f"lorem-ipsum-{index}" if valid or index % 10 else "Lorem Ipsum",
+            'country': 'be'
+        }
+
+    return Case(
+        'string-patterns', make_node,
+        [make_record(index, True) for index in range(10000)],
+        [make_record(index, False) for index in range(10000)]
+    )
+
+def make_integer_keys_case():
+    def make_node():
+        return Node('object', key='integer', value=Node('number', min=0))
+
+    valid_object = {index: index * 1.5 for index in range(20000)}
+    invalid_object = {index: index * 1.5 if index % 10 else -1 for index in range(20000)}
+
+    return Case('integer-keys', make_node, valid_object, invalid_object)
+
+CASES = [
+    make_wide_map_case(),
+    make_deep_nesting_case(),
+    make_numeric_array_case(),
+    make_string_patterns_case(),
+    make_integer_keys_case()
+]
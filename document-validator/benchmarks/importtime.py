@@ -0,0 +1,88 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import os
+import sys
+import argparse
+import compileall
+import subprocess
+import importlib.util
+
+# Notes:
+# - Run the import-time benchmarks with 'python benchmarks/importtime.py'
+#   from the directory of the package (the package must be installed or be
+#   in the PYTHONPATH). Each statement is run in a fresh interpreter with the
+#   '-X importtime' option and the best of several repetitions is kept.
+# - The time of a statement is the cumulative time of the top-level imports
+#   of the 'byteplug' namespace it triggers (imports of the interpreter
+#   startup are excluded). The script fails if a statement exceeds its budget
+#   (in milliseconds); CLI tools and batch workers pay it on every start. It
+#   runs in CI (with scaled budgets).
+# - The modules of the package are compiled to bytecode first, like they are
+#   when the package is installed; otherwise the time to compile them (on
+#   every run if PYTHONDONTWRITEBYTECODE is set) would be measured instead.
+
+STATEMENTS = [
+    ("import byteplug.document", 5),
+    ("from byteplug.document import document_to_object", 15),
+    ("from byteplug.document import object_to_document", 15),
+    ("from byteplug.document import validate_specs, normalize_specs", 10)
+]
+
+def measure_import_time(statement):
+    # Return the import time in microseconds.
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        capture_output=True, text=True, check=True, env=os.environ
+    )
+
+    total = 0
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+
+        if name.startswith(' byteplug'):
+            total += int(cumulative)
+
+    return total
+
+def compile_package():
+    spec = importlib.util.find_spec('byteplug.document')
+    for directory in spec.submodule_search_locations:
+        compileall.compile_dir(directory, quiet=1)
+
+def run_benchmarks(repeat=5, scale=1.0):
+    compile_package()
+
+    exceeded = False
+    for statement, budget in STATEMENTS:
+        duration = min(measure_import_time(statement) for _ in range(repeat)) / 1000
+        budget *= scale
+
+        status = "ok" if duration <= budget else "EXCEEDED"
+        print(f"{statement:<64} {duration:>8.2f} ms (budget {budget:>6.2f} ms) {status}")
+
+        exceeded = exceeded or duration > budget
+
+    return not exceeded
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the import-time benchmarks of the document validator.")
+    parser.add_argument('--repeat', type=int, default=5, help="number of repetitions (the best is kept)")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply the budgets (for slower machines)")
+    arguments = parser.parse_args()
+
+    if not run_benchmarks(arguments.repeat, arguments.scale):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import os
+import sys
+import json
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime, timezone
+from cases import CASES, make_benchmarks, clear_memos
+
+# Notes:
+# - Run the memory benchmarks with 'python benchmarks/memory.py' from the
+#   directory of the package (the package must be installed or be in the
+#   PYTHONPATH). Results can be saved in a JSON file with the '--output'
+#   option.
+# - For each call, the peak memory is the maximum memory allocated during the
+#   call, and the retained memory is the memory still allocated once it
+#   returns while its result is kept alive (for instance, the Python object
+#   produced by document_to_object()). Both are measured relative to the
+#   memory allocated before the call, and are also reported per node of the
+#   input. The benchmarks are the ones of the timing benchmarks (see the
+#   'cases' module); the memos are cleared before the baseline is taken, so
+#   the memory they retain once the call returns is accounted for.
+# - The allocation sites are the lines of code that retained the most memory
+#   once the call returns, obtained by comparing tracemalloc snapshots taken
+#   before and after the call; they don't explain the peak memory (memory
+#   allocated and released during the call, such as the parsed JSON document
+#   or the work stack of the traversal, doesn't appear in them).
+# - Unlike the timing benchmarks, the measures are exact and reproducible for
+#   a given version of Python; they can be attached to any change of the
+#   converters.
+
+FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__)
+]
+
+def format_site(frame):
+    # Keep the end of the path of the file (for instance,
+    # 'byteplug/document/document.py').
+    parts = frame.filename.split(os.sep)
+    return f"{'/'.join(parts[-3:])}:{frame.lineno}"
+
+def measure_memory(function, sites):
+    clear_memos()
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot().filter_traces(FILTERS)
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+        result = function()
+
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot().filter_traces(FILTERS)
+    finally:
+        tracemalloc.stop()
+
+    statistics = after.compare_to(before, 'lineno')
+    statistics.sort(key=lambda statistic: statistic.size_diff, reverse=True)
+
+    allocation_sites = []
+    for statistic in statistics[:sites]:
+        if statistic.size_diff <= 0:
+            break
+
+        allocation_sites.append({
+            'site': format_site(statistic.traceback[0]),
+            'size': statistic.size_diff,
+            'count': statistic.count_diff
+        })
+
+    del result
+    return peak - baseline, current - baseline, allocation_sites
+
+def run_benchmarks(filter=None, sites=5):
+    results = []
+    for case in CASES:
+        for target, input, function, nodes in make_benchmarks(case):
+            name = f"{case.name}/{target}/{input}"
+            if filter and filter not in name:
+                continue
+
+            peak, retained, allocation_sites = measure_memory(function, sites)
+            results.append({
+                'name': name,
+                'case': case.name,
+                'target': target,
+                'input': input,
+                'nodes': nodes,
+                'peak_memory': peak,
+                'retained_memory': retained,
+                'peak_memory_per_node': peak / nodes,
+                'retained_memory_per_node': retained / nodes,
+                'allocation_sites': allocation_sites
+            })
+
+            print_result(results[-1])
+
+    return results
+
+def print_result(result):
+    print(
+        f"{result['name']:<48} "
+        f"peak {result['peak_memory'] / 1024:>10.1f} KiB ({result['peak_memory_per_node']:>7.1f} B/node) "
+        f"retained {result['retained_memory'] / 1024:>10.1f} KiB ({result['retained_memory_per_node']:>7.1f} B/node)"
+    )
+
+    if result['allocation_sites']:
+        print("    retained by:")
+
+    for site in result['allocation_sites']:
+        print(f"        {site['size'] / 1024:>10.1f} KiB {site['count']:>9} blocks  {site['site']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the memory benchmarks of the document validator.")
+    parser.add_argument('--filter', help="only run benchmarks whose name contains this string")
+    parser.add_argument('--sites', type=int, default=5, help="number of sites retaining the most memory to report")
+    parser.add_argument('--output', help="save the results to this JSON file")
+    arguments = parser.parse_args()
+
+    results = run_benchmarks(arguments.filter, arguments.sites)
+
+    if arguments.output:
+        report = {
+            'date': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version,
+            'platform': platform.platform(),
+            'results': results
+        }
+
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+if __name__ == '__main__':
+    main()
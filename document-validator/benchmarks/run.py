@@ -0,0 +1,115 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import sys
+import json
+import timeit
+import platform
+import argparse
+import tracemalloc
+from datetime import datetime, timezone
+from cases import CASES, make_benchmarks
+
+# Notes:
+# - Run the timing benchmarks with 'python benchmarks/run.py' from the
+#   directory of the package (the package must be installed or be in the
+#   PYTHONPATH). Results can be saved in a JSON file with the
+#   '--output' option, and compared to a previous run with the '--compare'
+#   option (for instance, to check an upgrade doesn't regress throughput).
+# - Each benchmark is calibrated to run for at least 0.2 second and the best
+#   of several repetitions is kept. The peak memory is measured separately
+#   (tracemalloc slows down execution) for a single call.
+# - The benchmarks are the ones of the memory benchmarks (see the 'cases'
+#   module).
+
+def measure_time(function, repeat):
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(1, number)
+
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def measure_peak_memory(function):
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak - baseline
+
+def run_benchmarks(filter=None, repeat=5):
+    results = []
+    for case in CASES:
+        for target, input, function, nodes in make_benchmarks(case):
+            name = f"{case.name}/{target}/{input}"
+            if filter and filter not in name:
+                continue
+
+            duration = measure_time(function, repeat)
+            results.append({
+                'name': name,
+                'case': case.name,
+                'target': target,
+                'input': input,
+                'nodes': nodes,
+                'ops_per_sec': 1 / duration,
+                'ns_per_node': duration * 1e9 / nodes,
+                'peak_memory': measure_peak_memory(function)
+            })
+
+            print_result(results[-1])
+
+    return results
+
+def print_result(result, previous=None):
+    line = (
+        f"{result['name']:<48} {result['ops_per_sec']:>12.2f} ops/sec "
+        f"{result['ns_per_node']:>10.1f} ns/node {result['peak_memory'] / 1024:>10.1f} KiB"
+    )
+
+    if previous is not None:
+        ratio = result['ops_per_sec'] / previous['ops_per_sec']
+        line += f"  {ratio:>6.2f}x"
+
+    print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmarks of the document validator.")
+    parser.add_argument('--filter', help="only run benchmarks whose name contains this string")
+    parser.add_argument('--repeat', type=int, default=5, help="number of repetitions (the best is kept)")
+    parser.add_argument('--output', help="save the results to this JSON file")
+    parser.add_argument('--compare', help="compare the results to a previously saved JSON file")
+    arguments = parser.parse_args()
+
+    results = run_benchmarks(arguments.filter, arguments.repeat)
+
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            previous_results = {result['name']: result for result in json.load(file)['results']}
+
+        print(f"\nCompared to {arguments.compare} (ops/sec ratio, higher is better):")
+        for result in results:
+            print_result(result, previous_results.get(result['name']))
+
+    if arguments.output:
+        report = {
+            'date': datetime.now(timezone.utc).isoformat(),
+            'python': sys.version,
+            'platform': platform.platform(),
+            'results': results
+        }
+
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+if __name__ == '__main__':
+    main()
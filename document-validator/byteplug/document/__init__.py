@@ -6,8 +6,51 @@
 #
 # Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
 
-from byteplug.document.node import Node
-from byteplug.document.specs import validate_specs
-from byteplug.document.document import document_to_object
-from byteplug.document.object import object_to_document
-from byteplug.document.exception import ValidationError, ValidationWarning
+import importlib
+
+# Notes:
+# - Submodules are imported on first access to one of their names (see PEP
+#   562); applications only converting documents don't import the YAML
+#   loader, the generator and their dependencies.
+
+# Map the public names to the submodule defining them.
+EXPORTS = {
+    'Node': 'node',
+    'validate_specs': 'specs',
+    'normalize_specs': 'specs',
+    'pickle_specs': 'pickling',
+    'load_specs': 'loader',
+    'document_to_object': 'document',
+    'object_to_document': 'object',
+    'object_to_binary': 'binary',
+    'binary_to_object': 'binary',
+    'make_dictionary': 'dictionary',
+    'compress_document': 'dictionary',
+    'decompress_document': 'dictionary',
+    'LazyDict': 'lazy',
+    'LazyList': 'lazy',
+    'ValidationError': 'exception',
+    'ValidationWarning': 'exception',
+    'ErrorCode': 'exception',
+    'ErrorRecord': 'exception',
+    'ErrorSummary': 'summary',
+    'Profiler': 'profiler',
+    'generate_documents': 'generator',
+    'CostEstimate': 'cost',
+    'estimate_cost': 'cost'
+}
+
+__all__ = list(EXPORTS.keys())
+
+def __getattr__(name):
+    module = EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), name)
+    globals()[name] = value
+
+    return value
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(__all__))
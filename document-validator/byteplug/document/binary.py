@@ -0,0 +1,423 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import sys
+import math
+from struct import Struct
+from byteplug.document.specs import normalize_specs
+from byteplug.document.limits import Limits, LimitExceeded, check_document_size
+from byteplug.document.traversal import ROOT_PATH, traverse
+from byteplug.document.summary import ErrorSummary
+from byteplug.document.exception import ErrorCode, ErrorRecord
+from byteplug.document.document import adjust_node_map as document_node_map
+from byteplug.document.document import finalize_node_map
+from byteplug.document.object import adjust_node_map as object_node_map
+
+# Notes:
+# - This module implements a compact binary form of the documents; both sides
+#   share the specs, therefore the names of the fields, the values of the
+#   enums and the number of items of the tuples aren't encoded. The encoded
+#   values are the ones of the JSON form, in the order of the specs.
+# - Values are encoded as follows (varints are unsigned LEB128 integers,
+#   signed integers are zigzag-encoded first).
+#   - option: a 0 (null) or 1 (present) byte, followed by the value
+#   - flag: a 0 or 1 byte
+#   - number: a zigzag varint if it's not decimal, otherwise a 0 byte
+#     followed by a zigzag varint, or a 1 byte followed by a little-endian
+#     double
+#   - string: the length in bytes (a varint) followed by the UTF-8 bytes
+#   - array: the number of items (a varint) followed by the items
+#   - object: the number of items (a varint) followed by the keys and values;
+#     integer keys are zigzag varints, string keys are encoded like strings
+#   - tuple: the items
+#   - map: the fields in the order of the specs
+#   - enum: the index of the value (a varint)
+#   - union: the index of the variant (a varint) followed by the fields of its
+#     map, except the discriminator
+#   A map without fields and a tuple without items are a 0 byte; all values
+#   take at least one byte and the number of items of an array or an object
+#   can't exceed the number of remaining bytes (it's checked before the items
+#   are allocated).
+# - Encoding checks the object with the traversal engine of the 'object'
+#   module, then encodes its JSON form. Decoding rebuilds the JSON form, then
+#   checks it with the traversal engine of the 'document' module; the same
+#   rules are enforced and the same errors are reported. Malformed bytes (a
+#   truncated value, an out-of-range index, etc.) abort the decoding, they're
+#   reported with the BINARY error code.
+
+__all__ = ['object_to_binary', 'binary_to_object']
+
+DOUBLE = Struct('<d')
+
+INTEGER_TAG = 0
+DOUBLE_TAG = 1
+
+# Specs of the keys of 'object' nodes, they're only used by this module.
+INTEGER_KEY_SPECS = {'type': 'integer-key', 'option': False}
+STRING_KEY_SPECS = {'type': 'string', 'option': False}
+
+# Integers are limited to the number of digits the 'json' module accepts (see
+# sys.get_int_max_str_digits()); longer varints are malformed, they would
+# otherwise take a quadratic time to decode.
+MAX_INTEGER_DIGITS = getattr(sys, 'get_int_max_str_digits', lambda: 4300)() or 4300
+MAX_VARINT_SIZE = math.ceil((MAX_INTEGER_DIGITS * math.log2(10) + 1) / 7)
+MAX_INTEGER = 10 ** MAX_INTEGER_DIGITS
+
+class InvalidBinary(Exception):
+    pass
+
+def write_varint(buffer, value):
+    while value > 0x7f:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+def write_integer(buffer, value):
+    write_varint(buffer, value << 1 if value >= 0 else (-value << 1) - 1)
+
+def encode(node, specs):
+    buffer = bytearray()
+
+    stack = [(node, specs)]
+    while stack:
+        node, specs = stack.pop()
+
+        if specs['option']:
+            if node is None:
+                buffer.append(0)
+                continue
+            buffer.append(1)
+
+        type_ = specs['type']
+        if type_ == 'string':
+            data = node.encode('utf-8')
+            write_varint(buffer, len(data))
+            buffer += data
+        elif type_ == 'number':
+            if not specs['decimal']:
+                write_integer(buffer, node)
+            elif type(node) is int:
+                buffer.append(INTEGER_TAG)
+                write_integer(buffer, node)
+            else:
+                buffer.append(DOUBLE_TAG)
+                buffer += DOUBLE.pack(node)
+        elif type_ == 'flag':
+            buffer.append(1 if node else 0)
+        elif type_ == 'enum':
+            write_varint(buffer, specs['values'].index(node))
+        elif type_ == 'map':
+            fields = specs['fields']
+            if len(fields) == 0:
+                buffer.append(0)
+            for key, field in reversed(fields.items()):
+                stack.append((node.get(key), field))
+        elif type_ == 'array':
+            value = specs['value']
+            write_varint(buffer, len(node))
+            for item in reversed(node):
+                stack.append((item, value))
+        elif type_ == 'object':
+            value = specs['value']
+            key_specs = INTEGER_KEY_SPECS if specs['key'] == 'integer' else STRING_KEY_SPECS
+            write_varint(buffer, len(node))
+            for key, item in reversed(node.items()):
+                stack.append((item, value))
+                stack.append((key, key_specs))
+        elif type_ == 'integer-key':
+            # Keys are strings in the JSON form.
+            write_integer(buffer, int(node))
+        elif type_ == 'tuple':
+            items = specs['items']
+            if len(items) == 0:
+                buffer.append(0)
+            for index in range(len(items) - 1, -1, -1):
+                stack.append((node[index], items[index]))
+        elif type_ == 'union':
+            discriminator = specs['discriminator']
+            variants = specs['variants']
+            name = node[discriminator]
+            write_varint(buffer, list(variants.keys()).index(name))
+            for key, field in reversed(variants[name]['fields'].items()):
+                if key != discriminator:
+                    stack.append((node.get(key), field))
+
+    return bytes(buffer)
+
+def read_varint(data, position):
+    value = data[position]
+    if value < 0x80:
+        return value, position + 1
+
+    value &= 0x7f
+    shift = 7
+    position += 1
+    end = position + MAX_VARINT_SIZE - 1
+    while True:
+        if position == end:
+            raise InvalidBinary
+
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+def read_integer(data, position):
+    value, position = read_varint(data, position)
+    value = (value >> 1) if value & 1 == 0 else -((value + 1) >> 1)
+    if not -MAX_INTEGER < value < MAX_INTEGER:
+        raise InvalidBinary
+    return value, position
+
+def read_count(data, position, width):
+    count, position = read_varint(data, position)
+    if count * width > len(data) - position:
+        raise InvalidBinary
+    return count, position
+
+def finalize_object_node(container, key, items):
+    container[key] = dict(zip(items[0::2], items[1::2]))
+
+def decode(data, specs):
+    # Return the JSON form of the document; the InvalidBinary exception is
+    # raised if the bytes are malformed. Tasks are (specs, container, key)
+    # tuples, or (function, args) tuples run after the children of a node
+    # are decoded.
+    root = [None]
+    tasks = [(specs, root, 0)]
+    position = 0
+
+    try:
+        while tasks:
+            task = tasks.pop()
+            if len(task) == 2:
+                task[0](*task[1])
+                continue
+
+            specs, container, key = task
+
+            if specs['option']:
+                byte = data[position]
+                position += 1
+                if byte == 0:
+                    container[key] = None
+                    continue
+                elif byte != 1:
+                    raise InvalidBinary
+
+            type_ = specs['type']
+            if type_ == 'string':
+                length, position = read_varint(data, position)
+                end = position + length
+                if end > len(data):
+                    raise InvalidBinary
+                container[key] = str(data[position:end], 'utf-8')
+                position = end
+            elif type_ == 'number':
+                if not specs['decimal']:
+                    container[key], position = read_integer(data, position)
+                else:
+                    tag = data[position]
+                    position += 1
+                    if tag == INTEGER_TAG:
+                        container[key], position = read_integer(data, position)
+                    elif tag == DOUBLE_TAG:
+                        end = position + DOUBLE.size
+                        if end > len(data):
+                            raise InvalidBinary
+                        container[key] = DOUBLE.unpack_from(data, position)[0]
+                        position = end
+                    else:
+                        raise InvalidBinary
+            elif type_ == 'flag':
+                byte = data[position]
+                position += 1
+                if byte > 1:
+                    raise InvalidBinary
+                container[key] = byte == 1
+            elif type_ == 'enum':
+                index, position = read_varint(data, position)
+                values = specs['values']
+                if index >= len(values):
+                    raise InvalidBinary
+                container[key] = values[index]
+            elif type_ == 'map':
+                fields = specs['fields']
+                if len(fields) == 0:
+                    if data[position] != 0:
+                        raise InvalidBinary
+                    position += 1
+
+                node = dict.fromkeys(fields.keys())
+                for field_key, field in reversed(fields.items()):
+                    tasks.append((field, node, field_key))
+                container[key] = node
+            elif type_ == 'array':
+                count, position = read_count(data, position, 1)
+                value = specs['value']
+
+                # Arrays of strings and integers are decoded at once.
+                if value['type'] == 'string' and not value['option']:
+                    node = []
+                    for _ in range(count):
+                        length, position = read_varint(data, position)
+                        end = position + length
+                        if end > len(data):
+                            raise InvalidBinary
+                        node.append(str(data[position:end], 'utf-8'))
+                        position = end
+                elif value['type'] == 'number' and not value['option'] and not value['decimal']:
+                    node = []
+                    for _ in range(count):
+                        integer, position = read_integer(data, position)
+                        node.append(integer)
+                else:
+                    node = [None] * count
+                    for index in range(count - 1, -1, -1):
+                        tasks.append((value, node, index))
+                container[key] = node
+            elif type_ == 'object':
+                count, position = read_count(data, position, 2)
+                items = [None] * (count * 2)
+                value = specs['value']
+                key_specs = INTEGER_KEY_SPECS if specs['key'] == 'integer' else STRING_KEY_SPECS
+                tasks.append((finalize_object_node, (container, key, items)))
+                for index in range(count * 2 - 2, -1, -2):
+                    tasks.append((value, items, index + 1))
+                    tasks.append((key_specs, items, index))
+            elif type_ == 'integer-key':
+                # Keys are strings in the JSON form.
+                integer, position = read_integer(data, position)
+                container[key] = str(integer)
+            elif type_ == 'tuple':
+                items = specs['items']
+                if len(items) == 0:
+                    if data[position] != 0:
+                        raise InvalidBinary
+                    position += 1
+
+                node = [None] * len(items)
+                for index in range(len(items) - 1, -1, -1):
+                    tasks.append((items[index], node, index))
+                container[key] = node
+            elif type_ == 'union':
+                index, position = read_varint(data, position)
+                variants = specs['variants']
+                if index >= len(variants):
+                    raise InvalidBinary
+
+                discriminator = specs['discriminator']
+                name = list(variants.keys())[index]
+                fields = variants[name]['fields']
+
+                node = dict.fromkeys(fields.keys())
+                node[discriminator] = name
+                for field_key, field in reversed(fields.items()):
+                    if field_key != discriminator:
+                        tasks.append((field, node, field_key))
+                container[key] = node
+    except (IndexError, UnicodeDecodeError):
+        raise InvalidBinary
+
+    if position != len(data):
+        raise InvalidBinary
+
+    return root[0]
+
+def object_to_binary(object, specs, errors=None, warnings=None):
+    """ Convert a Python object to its binary form.
+
+    The object is checked like object_to_document() does; the binary form can
+    only be decoded with the same specs (see binary_to_object()).
+
+    To aggregate the errors rather than collecting them all, pass an
+    ErrorSummary object as the errors parameter.
+    """
+
+    # Specs are used in their canonical form (see normalize_specs()).
+    specs = normalize_specs(specs)
+
+    assert errors is None or errors == [] or (type(errors) is ErrorSummary and len(errors) == 0), \
+        "if the errors parameter is set, it must be an empty list or an empty summary"
+    assert warnings is None or warnings == [], "if the warnings parameter is set, it must be an empty list"
+
+    # We detect if users want lazy validation when they pass an empty list as
+    # the errors parameters.
+    lazy_validation = False
+    if errors is None:
+        errors = []
+    else:
+        lazy_validation = True
+
+    if warnings is None:
+        warnings = []
+
+    node = traverse(object, specs, object_node_map, errors, warnings)
+
+    # If we're not lazy-validating, we raise the first error that occurred.
+    if len(errors) > 0:
+        if not lazy_validation:
+            raise errors[0].to_exception()
+        return
+
+    return encode(node, specs)
+
+def binary_to_object(buffer, specs, errors=None, warnings=None,
+                     max_bytes=None, max_depth=None, max_nodes=None,
+                     max_string_length=None):
+    """ Convert the binary form of a document to its Python equivalent.
+
+    The document is checked like document_to_object() does, and the same
+    limits can be set.
+
+    To aggregate the errors rather than collecting them all, pass an
+    ErrorSummary object as the errors parameter.
+    """
+
+    # Specs are used in their canonical form (see normalize_specs()).
+    specs = normalize_specs(specs)
+
+    assert errors is None or errors == [] or (type(errors) is ErrorSummary and len(errors) == 0), \
+        "if the errors parameter is set, it must be an empty list or an empty summary"
+    assert warnings is None or warnings == [], "if the warnings parameter is set, it must be an empty list"
+
+    # We detect if users want lazy validation when they pass an empty list as
+    # the errors parameters.
+    lazy_validation = False
+    if errors is None:
+        errors = []
+    else:
+        lazy_validation = True
+
+    if warnings is None:
+        warnings = []
+
+    limits = None
+    if max_depth is not None or max_nodes is not None or max_string_length is not None:
+        limits = Limits(max_depth, max_nodes, max_string_length)
+
+    adjusted_object = None
+    try:
+        if max_bytes is not None:
+            check_document_size(buffer, max_bytes)
+
+        node = decode(buffer, specs)
+        adjusted_object = traverse(node, specs, document_node_map, errors, warnings, limits, finalize_node_map)
+    except InvalidBinary:
+        errors.append(ErrorRecord(ROOT_PATH, ErrorCode.BINARY))
+    except LimitExceeded as exception:
+        # A limit was exceeded and the conversion was aborted.
+        errors.append(exception.record)
+
+    # If we're not lazy-validating, we raise the first error that occurred.
+    if not lazy_validation and len(errors) > 0:
+        raise errors[0].to_exception()
+
+    return adjusted_object
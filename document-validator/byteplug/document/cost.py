@@ -0,0 +1,264 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+from byteplug.document.specs import normalize_specs
+from byteplug.document.pattern import LinearPattern, BacktrackingPattern, Re2Pattern
+
+# Notes:
+# - This module estimates the worst-case cost of converting a document with
+#   given specs; the number of nodes, the number of operations and the memory
+#   used by the Python object. It's meant to detect specs that allow
+#   documents to burn CPU (for instance, an array without a maximum length).
+# - An operation is the processing of a node, or the processing of a
+#   character of a string by a pattern; for patterns evaluated by the
+#   linear-time engine (see the 'pattern' module), processing a character
+#   costs an operation per character of the pattern. Patterns evaluated by
+#   the backtracking engine have an exponential cost (they're only evaluated
+#   on strings of a valid length, which bounds it).
+# - The memory is an approximation based on the size of CPython objects on
+#   64-bit platforms (including the reference held by the container).
+# - Values are infinite (float('inf')) when unbounded. The limits accepted by
+#   the converters bound the total; the size of the document bounds the
+#   number of nodes and the length of strings, and the depth excludes the
+#   nodes of the specs that can't be reached.
+
+__all__ = ['CostEstimate', 'estimate_cost']
+
+INFINITY = float('inf')
+
+# Approximate memory (in bytes) of Python values.
+REFERENCE_SIZE = 8
+NUMBER_SIZE = 32
+STRING_SIZE = 49
+LIST_SIZE = 56
+DICT_SIZE = 64
+DICT_ITEM_SIZE = 40
+
+class CostEstimate:
+    """ Worst-case cost of converting a document.
+
+    The 'nodes', 'operations' and 'memory' (in bytes) attributes are infinite
+    if unbounded; the 'unbounded' attribute is a list of (path, reason)
+    tuples of the nodes of the specs allowing unbounded work (regardless of
+    the limits).
+    """
+
+    __slots__ = ('nodes', 'operations', 'memory', 'unbounded')
+
+    def __init__(self, nodes, operations, memory, unbounded):
+        self.nodes = nodes
+        self.operations = operations
+        self.memory = memory
+        self.unbounded = unbounded
+
+    @property
+    def is_bounded(self):
+        return self.operations != INFINITY
+
+    def to_dict(self):
+        return {
+            'nodes': self.nodes,
+            'operations': self.operations,
+            'memory': self.memory,
+            'unbounded': [{'path': path, 'reason': reason} for path, reason in self.unbounded]
+        }
+
+def read_maximum_length(length):
+    if length is None:
+        return INFINITY
+    elif type(length) is int:
+        return length
+    elif length[1] is None:
+        return INFINITY
+    else:
+        return length[1]
+
+# Above this length, the cost of a vulnerable pattern is considered infinite.
+MAXIMUM_BACKTRACKING_LENGTH = 64
+
+def pattern_operations(pattern, length):
+    # Number of operations to match a string of the given length.
+    if pattern is None:
+        return 0
+    elif type(pattern) is BacktrackingPattern:
+        return 2 ** length if length <= MAXIMUM_BACKTRACKING_LENGTH else INFINITY
+    elif type(pattern) in (LinearPattern, Re2Pattern):
+        return length * len(pattern.pattern)
+    else:
+        return length
+
+def estimate_cost(specs, records=None, max_bytes=None, max_depth=None, max_nodes=None, max_string_length=None):
+    """ Estimate the worst-case cost of converting a document.
+
+    The records are the ones referenced by the specs (see normalize_specs())
+    and the limits are the ones accepted by document_to_object(). A
+    CostEstimate object is returned.
+    """
+
+    # Specs are used in their canonical form (see normalize_specs()).
+    specs = normalize_specs(specs, records)
+
+    maximum_string_length = INFINITY
+    if max_string_length is not None:
+        maximum_string_length = max_string_length
+    if max_bytes is not None:
+        maximum_string_length = min(maximum_string_length, max_bytes)
+
+    # Nodes allowing unbounded work are reported once (blocks of recursive
+    # records are visited at several depths).
+    unbounded = []
+    reported = set()
+
+    def report(block, path, reason):
+        if (id(block), reason) not in reported:
+            reported.add((id(block), reason))
+            unbounded.append((path, reason))
+
+    # The maximum cost and memory of a single node; with a limit on the number
+    # of nodes, the total is bounded by those.
+    maximum_operations = 1
+    maximum_memory = REFERENCE_SIZE
+
+    # Blocks are processed in post-order using an explicit stack; each entry
+    # is (specs, path, depth, ancestors, is_processed) and the (nodes,
+    # operations, memory) estimates of processed blocks are pushed on the
+    # results stack. Specs referencing recursive records are cyclic; without
+    # a maximum depth, a block that is its own ancestor is unbounded,
+    # otherwise the estimate of a block at a given depth is computed once.
+    results = []
+    estimates = {}
+    stack = [(specs, [], 0, frozenset(), False)]
+    while stack:
+        block, path, depth, ancestors, is_processed = stack.pop()
+
+        # Nodes deeper than the maximum depth abort the conversion.
+        if max_depth is not None and depth > max_depth:
+            results.append((0, 0, 0))
+            continue
+
+        type_ = block['type']
+        if not is_processed:
+            if (id(block), depth) in estimates:
+                results.append(estimates[(id(block), depth)])
+                continue
+
+            if id(block) in ancestors:
+                report(block, path, "record is recursive")
+                results.append((INFINITY, INFINITY, INFINITY))
+                continue
+
+            stack.append((block, path, depth, ancestors, True))
+
+            # Nodes allowing unbounded work are reported in pre-order.
+            if type_ in ('array', 'object') and read_maximum_length(block['length']) == INFINITY:
+                report(block, path, "length has no maximum")
+            elif type_ == 'string' and block['pattern'] is not None and read_maximum_length(block['length']) == INFINITY:
+                if type(block['pattern']) is BacktrackingPattern:
+                    report(block, path, "pattern is subject to catastrophic backtracking")
+                else:
+                    report(block, path, "pattern is evaluated on strings of unbounded length")
+
+            # Only the blocks of containers can be their own ancestor.
+            if max_depth is None and type_ in ('array', 'object', 'tuple', 'map', 'union'):
+                ancestors = ancestors | {id(block)}
+
+            if type_ == 'array':
+                stack.append((block['value'], path + ['[]'], depth + 1, ancestors, False))
+            elif type_ == 'object':
+                stack.append((block['value'], path + ['{}'], depth + 1, ancestors, False))
+            elif type_ == 'tuple':
+                for index in range(len(block['items']) - 1, -1, -1):
+                    stack.append((block['items'][index], path + ['<' + str(index) + '>'], depth + 1, ancestors, False))
+            elif type_ == 'map':
+                for key in reversed(block['fields'].keys()):
+                    stack.append((block['fields'][key], path + ['$' + key], depth + 1, ancestors, False))
+            elif type_ == 'union':
+                # Variants are the same node of the document.
+                for key in reversed(block['variants'].keys()):
+                    stack.append((block['variants'][key], path + ['@' + key], depth, ancestors, False))
+
+            continue
+
+        if type_ == 'flag':
+            nodes, operations, memory = 1, 1, REFERENCE_SIZE
+
+        elif type_ in ('number', 'enum'):
+            nodes, operations, memory = 1, 1, REFERENCE_SIZE + NUMBER_SIZE
+
+        elif type_ == 'string':
+            length = min(read_maximum_length(block['length']), maximum_string_length)
+
+            nodes = 1
+            operations = 1 + pattern_operations(block['pattern'], length)
+            memory = REFERENCE_SIZE + STRING_SIZE + length
+
+        elif type_ in ('array', 'object'):
+            child_nodes, child_operations, child_memory = results.pop()
+
+            count = read_maximum_length(block['length'])
+            if count == 0:
+                # Children are never converted (and 0 * INFINITY is NaN).
+                child_nodes, child_operations, child_memory = 0, 0, 0
+
+            nodes = 1 + count * child_nodes
+            if type_ == 'array':
+                operations = 1 + count * child_operations
+                memory = REFERENCE_SIZE + LIST_SIZE + count * child_memory
+            else:
+                # Keys are checked and stored as well.
+                key_memory = STRING_SIZE + maximum_string_length if block['key'] == 'string' else NUMBER_SIZE
+                operations = 1 + count * (1 + child_operations)
+                memory = REFERENCE_SIZE + DICT_SIZE + count * (DICT_ITEM_SIZE + key_memory + child_memory)
+
+        elif type_ == 'union':
+            # The worst case is the most expensive variant (which is looked
+            # up in constant time).
+            count = len(block['variants'])
+            children = results[len(results) - count:]
+            del results[len(results) - count:]
+
+            nodes = max(child[0] for child in children)
+            operations = 1 + max(child[1] for child in children)
+            memory = max(child[2] for child in children)
+
+        else:
+            count = len(block['items']) if type_ == 'tuple' else len(block['fields'])
+            children = results[len(results) - count:]
+            del results[len(results) - count:]
+
+            nodes = 1 + sum(child[0] for child in children)
+            operations = 1 + count + sum(child[1] for child in children)
+            if type_ == 'tuple':
+                memory = REFERENCE_SIZE + LIST_SIZE + sum(child[2] for child in children)
+            else:
+                memory = REFERENCE_SIZE + DICT_SIZE + count * DICT_ITEM_SIZE + sum(child[2] for child in children)
+
+        # Only the own cost of the node matters here (the cost of its
+        # children is accounted for separately).
+        if type_ == 'string':
+            maximum_operations = max(maximum_operations, operations)
+            maximum_memory = max(maximum_memory, memory)
+        elif type_ == 'map':
+            maximum_operations = max(maximum_operations, 1 + count)
+            maximum_memory = max(maximum_memory, DICT_SIZE + count * DICT_ITEM_SIZE)
+
+        estimates[(id(block), depth)] = (nodes, operations, memory)
+        results.append((nodes, operations, memory))
+
+    nodes, operations, memory = results.pop()
+
+    # Each node of a document takes at least a byte.
+    if max_bytes is not None:
+        max_nodes = min(max_nodes, max_bytes) if max_nodes is not None else max_bytes
+
+    if max_nodes is not None:
+        nodes = min(nodes, max_nodes)
+        operations = min(operations, max_nodes * maximum_operations)
+        memory = min(memory, max_nodes * maximum_memory)
+
+    return CostEstimate(nodes, operations, memory, unbounded)
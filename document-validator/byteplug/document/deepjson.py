@@ -0,0 +1,218 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import re
+from json import JSONDecodeError
+from json.decoder import scanstring
+from json.encoder import encode_basestring_ascii
+from json.scanner import NUMBER_RE
+from byteplug.document.limits import LimitExceeded
+from byteplug.document.traversal import ROOT_PATH
+from byteplug.document.exception import ErrorCode, ErrorRecord
+
+# Notes:
+# - The 'json' module is recursive (even its C implementation) and it raises
+#   RecursionError when a document is nested deeper than the Python recursion
+#   limit. This module implements an iterative parser and serializer, much
+#   slower, which are used as a fallback for such documents.
+# - The output is the same as json.loads() and json.dumps() with their default
+#   parameters.
+
+__all__ = ['loads', 'dumps']
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+CONSTANTS = {
+    'null'     : None,
+    'true'     : True,
+    'false'    : False,
+    'NaN'      : float('nan'),
+    'Infinity' : float('inf'),
+    '-Infinity': float('-inf')
+}
+
+def parse_key(document, index):
+    if not document.startswith('"', index):
+        raise JSONDecodeError("Expecting property name enclosed in double quotes", document, index)
+
+    key, index = scanstring(document, index + 1)
+    index = WHITESPACE.match(document, index).end()
+
+    if not document.startswith(':', index):
+        raise JSONDecodeError("Expecting ':' delimiter", document, index)
+
+    return key, WHITESPACE.match(document, index + 1).end()
+
+def parse_value(document, index):
+    character = document[index:index + 1]
+    if character == '"':
+        return scanstring(document, index + 1)
+
+    match = NUMBER_RE.match(document, index)
+    if match is not None:
+        integer, fraction, exponent = match.groups()
+        if fraction or exponent:
+            value = float(integer + (fraction or '') + (exponent or ''))
+        else:
+            value = int(integer)
+        return value, match.end()
+
+    for name, value in CONSTANTS.items():
+        if document.startswith(name, index):
+            return value, index + len(name)
+
+    raise JSONDecodeError("Expecting value", document, index)
+
+def loads(document, max_depth=None):
+    """ Parse a JSON document without recursion.
+
+    If the maximum depth is set and exceeded, the LimitExceeded exception is
+    raised as soon as it's detected.
+    """
+
+    if type(document) is not str:
+        document = document.decode('utf-8')
+
+    # Each entry of the stack is a container being built; for JSON objects,
+    # the key of the value being parsed is kept along.
+    stack = []
+    index = WHITESPACE.match(document, 0).end()
+
+    while True:
+        # Parse the value starting at the current index; opening a container
+        # pushes it on the stack and parses its first value.
+        character = document[index:index + 1]
+        if character == '{' or character == '[':
+            if max_depth is not None and len(stack) > max_depth:
+                raise LimitExceeded(ErrorRecord(ROOT_PATH, ErrorCode.DEPTH, max_depth))
+
+            index = WHITESPACE.match(document, index + 1).end()
+            if character == '{':
+                if document.startswith('}', index):
+                    value, index = {}, index + 1
+                else:
+                    key, index = parse_key(document, index)
+                    stack.append([{}, key])
+                    continue
+            else:
+                if document.startswith(']', index):
+                    value, index = [], index + 1
+                else:
+                    stack.append([[], None])
+                    continue
+        else:
+            value, index = parse_value(document, index)
+
+        # Add the value to its container; closing a container makes it the
+        # value to add to its own container.
+        while True:
+            index = WHITESPACE.match(document, index).end()
+            if not stack:
+                if index != len(document):
+                    raise JSONDecodeError("Extra data", document, index)
+                return value
+
+            entry = stack[-1]
+            container = entry[0]
+            if type(container) is list:
+                container.append(value)
+                closing = ']'
+            else:
+                container[entry[1]] = value
+                closing = '}'
+
+            if document.startswith(',', index):
+                index = WHITESPACE.match(document, index + 1).end()
+                if closing == '}':
+                    entry[1], index = parse_key(document, index)
+                break
+            elif document.startswith(closing, index):
+                stack.pop()
+                value, index = container, index + 1
+            else:
+                raise JSONDecodeError("Expecting ',' delimiter", document, index)
+
+def dump_scalar(value):
+    if type(value) is str:
+        return encode_basestring_ascii(value)
+    elif value is None:
+        return 'null'
+    elif value is True:
+        return 'true'
+    elif value is False:
+        return 'false'
+    elif type(value) is float:
+        if value != value:
+            return 'NaN'
+        elif value == float('inf'):
+            return 'Infinity'
+        elif value == float('-inf'):
+            return '-Infinity'
+        return float.__repr__(value)
+    elif type(value) is int:
+        return int.__repr__(value)
+
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dump_key(key):
+    if type(key) is str:
+        return encode_basestring_ascii(key)
+
+    return encode_basestring_ascii(dump_scalar(key))
+
+def dumps(object):
+    """ Serialize a Python object to a JSON document without recursion. """
+
+    chunks = []
+
+    # Each entry of the stack is a container being serialized; its closing
+    # character, an iterator over its items and whether it's a dict.
+    stack = []
+    value = object
+
+    while True:
+        if type(value) in (list, tuple):
+            if len(value) == 0:
+                chunks.append('[]')
+            else:
+                chunks.append('[')
+                stack.append([']', iter(value), False, True])
+        elif type(value) is dict:
+            if len(value) == 0:
+                chunks.append('{}')
+            else:
+                chunks.append('{')
+                stack.append(['}', iter(value.items()), True, True])
+        else:
+            chunks.append(dump_scalar(value))
+
+        # Move to the next value to serialize.
+        while stack:
+            entry = stack[-1]
+            closing, iterator, is_dict, is_first = entry
+
+            item = next(iterator, entry)
+            if item is entry:
+                chunks.append(closing)
+                stack.pop()
+                continue
+
+            if not is_first:
+                chunks.append(', ')
+            entry[3] = False
+
+            if is_dict:
+                key, value = item
+                chunks.append(dump_key(key))
+                chunks.append(': ')
+            else:
+                value = item
+
+            break
+        else:
+            return ''.join(chunks)
@@ -0,0 +1,141 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import json
+import zlib
+from byteplug.document.specs import normalize_specs
+from byteplug.document.limits import LimitExceeded
+from byteplug.document.traversal import ROOT_PATH
+from byteplug.document.exception import ErrorCode, ErrorRecord
+
+# Notes:
+# - This module derives a preset dictionary of the 'zlib' module from specs
+#   (see the 'zdict' parameter of zlib.compressobj()). Small JSON documents
+#   are mostly made of the names of the fields, the values of the enums and
+#   punctuation, which a compressor can't learn from the document itself;
+#   both sides derive the same dictionary from the same specs.
+# - The dictionary is made of fragments of JSON text as produced by the
+#   'json' module (with its default separators); the names of the fields
+#   along with their punctuation ('{"foo": ' and ', "foo": '), the values of
+#   the enums, the discriminators of the unions along with the names of
+#   their variants, and the JSON literals and punctuation.
+# - Matches are cheaper when they're closer to the end of the dictionary
+#   (and only its last 32KB are used); fragments of nodes that repeat (the
+#   ones nested in 'array' and 'object' nodes) are placed after the others,
+#   and the literals and punctuation are placed last.
+# - The stream of the 'zlib' format carries the checksum of the dictionary;
+#   decompressing with a dictionary derived from different specs fails.
+
+__all__ = ['make_dictionary', 'compress_document', 'decompress_document']
+
+# Only the last 32KB of a dictionary are used by the 'zlib' module.
+MAX_DICTIONARY_SIZE = 32768
+
+# Default maximum size (in bytes) of decompressed documents; a few hundred
+# kilobytes of compressed data can expand to hundreds of megabytes.
+MAX_DOCUMENT_SIZE = 16 * 1024 * 1024
+
+# Fragments of all JSON documents, placed at the end of the dictionary.
+PUNCTUATION = ['{}', '[]', '}, {', '}]', '], ', 'null', 'false', 'true']
+
+def make_dictionary(specs, records=None):
+    """ Derive a preset dictionary of the 'zlib' module from specs.
+
+    The records are the ones referenced by the specs (see normalize_specs()).
+    The same specs yield the same dictionary (bytes).
+    """
+
+    # Specs are used in their canonical form (see normalize_specs()).
+    specs = normalize_specs(specs, records)
+
+    # Fragments are mapped to the number of 'array' and 'object' nodes they're
+    # nested in (the highest one if they're found at several places); blocks
+    # are walked once using an explicit stack, specs referencing recursive
+    # records are cyclic.
+    fragments = {}
+
+    def add_fragment(fragment, repeats):
+        if fragments.get(fragment, -1) < repeats:
+            fragments[fragment] = repeats
+
+    visited = set()
+    stack = [(specs, 0)]
+    while stack:
+        block, repeats = stack.pop()
+
+        if id(block) in visited:
+            continue
+        visited.add(id(block))
+
+        type_ = block['type']
+        if type_ in ('array', 'object'):
+            stack.append((block['value'], repeats + 1))
+        elif type_ == 'tuple':
+            for item in block['items']:
+                stack.append((item, repeats))
+        elif type_ == 'map':
+            for index, (key, field) in enumerate(block['fields'].items()):
+                add_fragment(('{' if index == 0 else ', ') + json.dumps(key) + ': ', repeats)
+                stack.append((field, repeats))
+        elif type_ == 'enum':
+            for value in block['values']:
+                add_fragment(json.dumps(value), repeats)
+        elif type_ == 'union':
+            discriminator = json.dumps(block['discriminator'])
+            for key, variant in block['variants'].items():
+                add_fragment('{' + discriminator + ': ' + json.dumps(key), repeats)
+                stack.append((variant, repeats))
+
+    # Fragments that repeat the most are placed last; the order is otherwise
+    # the one of the specs (sorting is stable).
+    ordered_fragments = sorted(fragments.keys(), key=fragments.get)
+    ordered_fragments.extend(PUNCTUATION)
+
+    dictionary = ''.join(ordered_fragments).encode('utf-8')
+    return dictionary[-MAX_DICTIONARY_SIZE:]
+
+def compress_document(document, dictionary, level=zlib.Z_DEFAULT_COMPRESSION):
+    """ Compress a JSON document with a preset dictionary.
+
+    The document is a string or bytes, and the dictionary is the one
+    returned by make_dictionary(). The compressed document is returned
+    (bytes, in the 'zlib' format).
+    """
+
+    if type(document) is str:
+        document = document.encode('utf-8')
+
+    compressor = zlib.compressobj(level, zdict=dictionary)
+    return compressor.compress(document) + compressor.flush()
+
+def decompress_document(data, dictionary, max_bytes=MAX_DOCUMENT_SIZE):
+    """ Decompress a JSON document compressed with a preset dictionary.
+
+    The dictionary must be derived from the same specs as the one used to
+    compress the document. The document is returned (bytes) and the
+    ValueError exception is raised if the data is invalid. If the maximum
+    size (in bytes) of the document is exceeded (16MB by default), the
+    decompression is aborted and the LimitExceeded exception is raised.
+    """
+
+    assert max_bytes is not None, "the size of decompressed documents must be limited"
+
+    decompressor = zlib.decompressobj(zdict=dictionary)
+    try:
+        # One more byte is decompressed to detect documents exceeding the
+        # limit, without decompressing them entirely.
+        document = decompressor.decompress(data, max_bytes + 1)
+        if len(document) > max_bytes:
+            raise LimitExceeded(ErrorRecord(ROOT_PATH, ErrorCode.DOCUMENT_SIZE, max_bytes))
+    except zlib.error as exception:
+        raise ValueError(f"invalid compressed document ({exception})")
+
+    if not decompressor.eof or len(decompressor.unused_data) > 0:
+        raise ValueError("invalid compressed document (truncated or followed by extra data)")
+
+    return document
@@ -6,45 +6,52 @@
 #
 # Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
 
-import re
 import json
-from byteplug.document.node import Node
-from byteplug.document.utility import read_minimum_value, read_maximum_value
+from byteplug.document.specs import normalize_specs
 from byteplug.document.utility import check_length
-from byteplug.document.exception import ValidationError, ValidationWarning
+from byteplug.document.pattern import NAME_PATTERN
+from byteplug.document.pattern import BacktrackingPattern
+from byteplug.document.limits import Limits, LimitExceeded, check_document_size
+from byteplug.document.traversal import ROOT_PATH, traverse
+from byteplug.document.exception import ErrorCode, ErrorRecord
 
 # Notes:
 # - This module handles validation and conversion from JSON document to Python
 #   object. It must be kept in sync with the 'object' module.
 # - In all process_<type>_node(), it's about converting a JSON node (converted
 #   to a Python object as defined by the 'json' module) and adjusting its value
-#   based on the specs.
+#   based on the specs. Children of container nodes are adjusted later by the
+#   traversal engine (see the 'traversal' module).
 # - For each node type, we refer to the standard document that describes how
 #   the augmented type is implemented in its JSON form; we care about validity
 #   of its JSON form, its Python form is not defined by the standard.
+# - The modules of the optional features (the other formats, the deep JSON
+#   parser, summaries, profiling, lazy and projected conversions) are only
+#   imported when they're used; they'd slow down the start of applications
+#   that don't use them.
 
 __all__ = ['document_to_object']
 
-def process_flag_node(path, node, specs, errors, warnings):
+def process_flag_node(path, node, specs, errors, warnings, tasks):
     if type(node) is not bool:
-        error = ValidationError(path, "was expecting a JSON boolean")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a JSON boolean")
         errors.append(error)
         return
 
     return node
 
-def process_number_node(path, node, specs, errors, warnings):
-    decimal = specs.get('decimal', True)
-    minimum = read_minimum_value(specs)
-    maximum = read_maximum_value(specs)
+def process_number_node(path, node, specs, errors, warnings, tasks):
+    decimal = specs['decimal']
+    minimum = specs['minimum']
+    maximum = specs['maximum']
 
     if type(node) not in (int, float):
-        error = ValidationError(path, "was expecting a JSON number")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a JSON number")
         errors.append(error)
         return
 
     if decimal == False and type(node) is float:
-        error = ValidationError(path, "was expecting non-decimal number")
+        error = ErrorRecord(path, ErrorCode.DECIMAL_NUMBER)
         errors.append(error)
         return
 
@@ -55,11 +62,11 @@ def process_number_node(path, node, specs, errors, warnings):
 
         if is_exclusive:
             if not (node > value):
-                error = ValidationError(path, f"value must be strictly greater than {value}")
+                error = ErrorRecord(path, ErrorCode.EXCLUSIVE_MINIMUM, value)
                 node_errors.append(error)
         else:
             if not (node >= value):
-                error = ValidationError(path, f"value must be equal or greater than {value}")
+                error = ErrorRecord(path, ErrorCode.MINIMUM, value)
                 node_errors.append(error)
 
     if maximum:
@@ -67,11 +74,11 @@ def process_number_node(path, node, specs, errors, warnings):
 
         if is_exclusive:
             if not (node < value):
-                error = ValidationError(path, f"value must be strictly lower than {value}")
+                error = ErrorRecord(path, ErrorCode.EXCLUSIVE_MAXIMUM, value)
                 node_errors.append(error)
         else:
             if not (node <= value):
-                error = ValidationError(path, f"value must be equal or lower than {value}")
+                error = ErrorRecord(path, ErrorCode.MAXIMUM, value)
                 node_errors.append(error)
 
     if len(node_errors) > 0:
@@ -80,22 +87,29 @@ def process_number_node(path, node, specs, errors, warnings):
 
     return node
 
-def process_string_node(path, node, specs, errors, warnings):
+def process_string_node(path, node, specs, errors, warnings, tasks):
 
     if type(node) is not str:
-        error = ValidationError(path, "was expecting a JSON string")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a JSON string")
         errors.append(error)
         return
 
     node_errors = []
 
-    length = specs.get('length')
-    check_length(len(node), length, path, errors, warnings)
+    errors_count = len(errors)
+    length = specs['length']
+    if length is not None:
+        check_length(len(node), length, path, errors)
 
-    pattern = specs.get('pattern')
+    pattern = specs['pattern']
     if pattern is not None:
-        if not re.match(pattern, node):
-            error = ValidationError(path, "value did not match the pattern")
+        # A vulnerable pattern evaluated by the backtracking engine is only
+        # evaluated against strings of a valid length (see the 'pattern'
+        # module).
+        if type(pattern) is BacktrackingPattern and len(errors) > errors_count:
+            pass
+        elif not pattern.match(node):
+            error = ErrorRecord(path, ErrorCode.PATTERN_MISMATCH)
             node_errors.append(error)
 
     if len(node_errors) > 0:
@@ -104,136 +118,193 @@ def process_string_node(path, node, specs, errors, warnings):
 
     return node
 
-def process_array_node(path, node, specs, errors, warnings):
+def process_array_node(path, node, specs, errors, warnings, tasks):
     value = specs['value']
 
     if type(node) is not list:
-        error = ValidationError(path, "was expecting a JSON array")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a JSON array")
         errors.append(error)
         return
 
-    length = specs.get('length')
-    check_length(len(node), length, path, errors, warnings)
+    length = specs['length']
+    if length is not None:
+        check_length(len(node), length, path, errors)
 
-    adjusted_node = []
-    for (index, item) in enumerate(node):
-        adjusted_item = adjust_node(path + ['[' + str(index) + ']'], item, value, errors, warnings)
-        adjusted_node.append(adjusted_item)
+    # Items are adjusted later (see the 'traversal' module).
+    depth = path[3] + 1
+    adjusted_node = [None] * len(node)
+    for index in range(len(node) - 1, -1, -1):
+        tasks.append(((path, '[', index, depth), node[index], value, adjusted_node, index))
 
     return adjusted_node
 
-def process_object_node(path, node, specs, errors, warnings):
+def process_object_node(path, node, specs, errors, warnings, tasks):
     key = specs['key']
     value = specs['value']
 
     if type(node) is not dict:
-        error = ValidationError(path, "was expecting a JSON object")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a JSON object")
         errors.append(error)
         return
 
-    length = specs.get('length')
-    check_length(len(node), length, path, errors, warnings)
+    length = specs['length']
+    if length is not None:
+        check_length(len(node), length, path, errors)
 
+    depth = path[3] + 1
     adjusted_node = {}
+    node_tasks = []
     for (index, item) in enumerate(node.items()):
         if key == 'integer':
             # JSON object does not support key being integer, they are expected
             # to be string, and thus must be converted to integer. If the
-            # conversation fails, the JSON document is invalid.
-            assert type(item[0]) is str
-
-            try:
-                # TODO; Dirty way to invalidate if string was a float.
-                assert item[0].find('.') == -1
-                node_key = int(item[0])
-            except:
-                error = ValidationError(path, f"key at index {index} is invalid; expected it to be an integer")
-                errors.append(error)
-                continue
+            # conversation fails, the JSON document is invalid. Keys are
+            # integers in the MessagePack and CBOR formats.
+            if type(item[0]) is int:
+                node_key = item[0]
+            else:
+                try:
+                    # TODO; Dirty way to invalidate if string was a float.
+                    assert item[0].find('.') == -1
+                    node_key = int(item[0])
+                except:
+                    error = ErrorRecord(path, ErrorCode.INTEGER_KEY, index)
+                    node_tasks.append((errors.append, (error,)))
+                    continue
 
         elif key == 'string':
             # Keys are restricted by a given pattern; check value against it.
             # If it doesn't pass the test, the JSON document is invalid.
-            if not re.match(r"^[a-zA-Z0-9\-\_]+$", item[0]):
-                error = ValidationError(path, f"key at index {index} is invalid; expected to match the pattern")
-                errors.append(error)
+            if type(item[0]) is not str or not NAME_PATTERN.match(item[0]):
+                error = ErrorRecord(path, ErrorCode.STRING_KEY, index)
+                node_tasks.append((errors.append, (error,)))
                 continue
 
             node_key = item[0]
 
-        adjusted_value = adjust_node(path + ['{' + str(item[0]) + '}'], item[1], value, errors, warnings)
-        adjusted_node[node_key] = adjusted_value
+        adjusted_node[node_key] = None
+        node_tasks.append(((path, '{', item[0], depth), item[1], value, adjusted_node, node_key))
+
+    node_tasks.reverse()
+    tasks.extend(node_tasks)
 
     return adjusted_node
 
-def process_tuple_node(path, node, specs, errors, warnings):
+def process_tuple_node(path, node, specs, errors, warnings, tasks):
     items = specs['items']
 
     if type(node) is not list:
-        error = ValidationError(path, "was expecting a JSON array")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a JSON array")
         errors.append(error)
         return
 
     if len(node) != len(items):
-        error = ValidationError(path, f"length of the array must be {len(items)}")
+        error = ErrorRecord(path, ErrorCode.ARRAY_LENGTH, len(items))
         errors.append(error)
         return
 
-    adjusted_node = []
-    for (index, item) in enumerate(node):
-        adjusted_item = adjust_node(path + ['<' + str(index) + '>'], item, items[index], errors, warnings)
-        adjusted_node.append(adjusted_item)
+    # The list is turned into a tuple once its items are adjusted (see the
+    # 'finalize_node_map' dict).
+    depth = path[3] + 1
+    adjusted_node = [None] * len(node)
+    for index in range(len(node) - 1, -1, -1):
+        tasks.append(((path, '<', index, depth), node[index], items[index], adjusted_node, index))
 
-    return tuple(adjusted_node)
+    return adjusted_node
 
-def process_map_node(path, node, specs, errors, warnings):
+def process_map_node(path, node, specs, errors, warnings, tasks):
     fields = specs['fields']
 
     if type(node) is not dict:
-        error = ValidationError(path, "was expecting a JSON object")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a JSON object")
         errors.append(error)
         return
 
-    node_errors = []
-
+    # A valid node is checked in one pass; its fields are counted and the
+    # missing ones are only looked for when the counts don't match (see the
+    # tables of the map specs in normalize_specs()).
+    required = specs['required']
+    depth = path[3] + 1
     adjusted_node = {}
+    node_tasks = []
+    fields_count = 0
+    required_count = 0
     for key, value in node.items():
-        if key in fields.keys():
-            adjusted_node[key] = adjust_node(path + ['$' + key], value, fields[key], errors, warnings)
-        else:
-            error = ValidationError(path, f"'{key}' field was unexpected")
-            errors.append(error)
-
-    missing_keys = set(fields.keys()) - set(adjusted_node.keys())
-    for key in missing_keys:
-        if not fields[key].get('option', False):
-            error = ValidationError(path, f"'{key}' field was missing")
-            errors.append(error)
-        else:
-            # We insert a 'null' value when the key is missing and the item is
-            # optional.
-            adjusted_node[key] = None
+        field = fields.get(key)
+        if field is not None:
+            fields_count += 1
+            if key in required:
+                required_count += 1
 
-    if len(node_errors) > 0:
-        errors.extend(node_errors)
-        return
+            adjusted_node[key] = None
+            node_tasks.append(((path, '$', key, depth), value, field, adjusted_node, key))
+        else:
+            error = ErrorRecord(path, ErrorCode.UNEXPECTED_FIELD, key)
+            node_tasks.append((errors.append, (error,)))
+
+    if fields_count < len(fields):
+        # Missing fields are reported after the errors of the fields,
+        # therefore they're reported by the last task of this node (which is
+        # pushed first).
+        if required_count < len(required):
+            missing_errors = []
+            for key in fields.keys():
+                if key in required and key not in node:
+                    error = ErrorRecord(path, ErrorCode.MISSING_FIELD, key)
+                    missing_errors.append(error)
+
+            tasks.append((errors.extend, (missing_errors,)))
+
+        # We insert a 'null' value when the key is missing and the item is
+        # optional.
+        for key in specs['optional']:
+            if key not in node:
+                adjusted_node[key] = None
+
+    node_tasks.reverse()
+    tasks.extend(node_tasks)
 
     return adjusted_node
 
-def process_enum_node(path, node, specs, errors, warnings):
+def process_enum_node(path, node, specs, errors, warnings, tasks):
     if type(node) is not str:
-        error = ValidationError(path, "was expecting a JSON string")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a JSON string")
         errors.append(error)
         return
 
     values = specs['values']
     if node not in values:
-        error = ValidationError(path, "enum value is invalid")
+        error = ErrorRecord(path, ErrorCode.ENUM_VALUE)
         errors.append(error)
         return
 
     return node
 
+def process_union_node(path, node, specs, errors, warnings, tasks):
+    discriminator = specs['discriminator']
+
+    if type(node) is not dict:
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a JSON object")
+        errors.append(error)
+        return
+
+    # The variant is looked up by the value of the discriminator field, then
+    # the node is processed by its 'map' node (which also checks the
+    # discriminator field).
+    value = node.get(discriminator)
+    if value is None:
+        error = ErrorRecord(path, ErrorCode.MISSING_FIELD, discriminator)
+        errors.append(error)
+        return
+
+    variant = specs['variants'].get(value) if type(value) is str else None
+    if variant is None:
+        error = ErrorRecord(path, ErrorCode.UNION_VARIANT, discriminator)
+        errors.append(error)
+        return
+
+    return process_map_node(path, node, variant, errors, warnings, tasks)
+
 adjust_node_map = {
     'flag'   : process_flag_node,
     'number' : process_number_node,
@@ -242,24 +313,138 @@ adjust_node_map = {
     'object' : process_object_node,
     'tuple'  : process_tuple_node,
     'map'    : process_map_node,
-    'enum'   : process_enum_node
+    'enum'   : process_enum_node,
+    'union'  : process_union_node
 }
 
-def adjust_node(path, node, specs, errors, warnings):
-    # We accept a None value if the type is marked as optional.
-    optional = specs.get('option', False)
-    if optional and node is None:
-        return None
+finalize_node_map = {
+    'tuple': tuple
+}
 
-    return adjust_node_map[specs['type']](path, node, specs, errors, warnings)
+# JSON type of the nodes checked shallowly (see process_projected_node()).
+shallow_types = {
+    'flag'   : ((bool,), "a JSON boolean"),
+    'number' : ((int, float), "a JSON number"),
+    'string' : ((str,), "a JSON string"),
+    'array'  : ((list,), "a JSON array"),
+    'object' : ((dict,), "a JSON object"),
+    'tuple'  : ((list,), "a JSON array"),
+    'map'    : ((dict,), "a JSON object"),
+    'enum'   : ((str,), "a JSON string"),
+    'union'  : ((dict,), "a JSON object")
+}
+
+def process_projected_node(path, node, specs, errors, warnings, tasks):
+    # The node is processed by the function of its type and only the tasks of
+    # the selected children are kept (see the 'projection' module).
+    from byteplug.document.projection import project_specs, make_segment
+
+    actual_specs = specs['specs']
+    tree = specs['tree']
+
+    node_errors = []
+    node_tasks = []
+    adjusted_node = adjust_node_map[actual_specs['type']](path, node, actual_specs, node_errors, warnings, node_tasks)
+
+    children_tasks = []
+    for task in reversed(node_tasks):
+        if len(task) == 2:
+            task[0](*task[1])
+            continue
+
+        child_path, child, child_specs, container, key = task
+        subtree = tree.get(make_segment(child_path))
+        if subtree is True:
+            children_tasks.append(task)
+        elif subtree is not None:
+            projected_specs = project_specs(child_specs, subtree, specs['check'], specs['projections'])
+            children_tasks.append((child_path, child, projected_specs, container, key))
+        elif specs['check'] and not (child is None and child_specs['option']):
+            # Unselected children are only checked shallowly.
+            types, message = shallow_types[child_specs['type']]
+            if type(child) not in types:
+                node_errors.append(ErrorRecord(child_path, ErrorCode.INVALID_TYPE, message))
+
+    if adjusted_node is not None:
+        # Unselected fields are omitted (including missing optional fields).
+        if actual_specs['type'] in ('map', 'union'):
+            for key in [key for key in adjusted_node.keys() if '$' + key not in tree]:
+                del adjusted_node[key]
+
+        # Errors about unselected fields are ignored if they're not checked.
+        if not specs['check']:
+            node_errors = [
+                error for error in node_errors
+                if error.code is not ErrorCode.UNEXPECTED_FIELD and
+                not (error.code is ErrorCode.MISSING_FIELD and '$' + error.parameter not in tree)
+            ]
+
+    errors.extend(node_errors)
+
+    children_tasks.reverse()
+    tasks.extend(children_tasks)
 
-def document_to_object(document, specs, errors=None, warnings=None):
-    """ Convert a JSON document to its Python equivalent. """
+    return adjusted_node
 
-    if type(specs) is Node:
-        specs = specs.to_object()
+projected_node_map = adjust_node_map | {
+    'projection': process_projected_node
+}
 
-    assert errors is None or errors == [], "if the errors parameter is set, it must be an empty list"
+def document_to_object(document, specs, errors=None, warnings=None,
+                       max_bytes=None, max_depth=None, max_nodes=None,
+                       max_string_length=None, profiler=None, lazy=False,
+                       select=None, check_unselected=False, format='json'):
+    """ Convert a JSON document to its Python equivalent.
+
+    The size of the document (in bytes), its depth (the root node is at depth
+    zero), its number of nodes, and the length of its strings (including the
+    keys of 'object' nodes) can be limited. Exceeding a limit aborts the
+    conversion.
+
+    Only the size is checked before the document is parsed. The document is
+    parsed entirely before the other limits are checked, except the depth
+    when the document is parsed by the pure-Python implementations (JSON
+    documents too deep for the 'json' module, and MessagePack and CBOR
+    documents without their native package). Rejecting a document exceeding
+    them still costs the time to parse it and the memory of its parsed form,
+    both proportional to its size; limit the size as well.
+
+    To aggregate the errors rather than collecting them all, pass an
+    ErrorSummary object as the errors parameter. To collect statistics about
+    the nodes of the specs, pass a Profiler object.
+
+    If the 'lazy' parameter is set, nodes of the 'array', 'object', 'map' and
+    'union' types are returned as LazyList and LazyDict objects; their
+    children are only checked and converted when they're accessed (the
+    ValidationError exception is raised if they're invalid). Call their
+    validate_all() method to check them entirely.
+
+    To only convert some parts of the document, pass the paths of the specs
+    to select (for instance, [['$foo'], ['$bar', '[]', '$quz']] or
+    ['$foo', '$bar.[].$quz']) as the 'select' parameter; a path selects its
+    node entirely. Nodes leading to the selected paths are checked (their
+    unselected fields are omitted, and the unselected items of tuples, for
+    instance '$foo.<0>', are None), the other nodes are skipped. If the
+    'check_unselected' parameter is set, the unselected fields are reported
+    if they're unexpected or missing, and their JSON type is checked. It can't
+    be combined with the 'lazy' parameter.
+
+    The document can also be a MessagePack or CBOR document (bytes), set the
+    'format' parameter to 'msgpack' or 'cbor'; the keys of 'object' nodes are
+    then integers if their specs says so.
+
+    The specs are used in their canonical form; on hot paths, normalize them
+    once (see normalize_specs()) and pass the result. Dict specs must not be
+    modified once they're passed.
+    """
+
+    # Specs are used in their canonical form (see normalize_specs()).
+    specs = normalize_specs(specs)
+
+    if errors is not None and type(errors) is not list:
+        from byteplug.document.summary import ErrorSummary
+        assert type(errors) is ErrorSummary, "if the errors parameter is set, it must be a list or a summary"
+    assert errors is None or len(errors) == 0, "if the errors parameter is set, it must be an empty list or an empty summary"
     assert warnings is None or warnings == [], "if the warnings parameter is set, it must be an empty list"
 
     # We detect if users want lazy validation when they pass an empty list as
@@ -273,11 +458,57 @@ def document_to_object(document, specs, errors=None, warnings=None):
     if warnings is None:
         warnings = []
 
-    object = json.loads(document)
-    adjusted_object = adjust_node([], object, specs, errors, warnings)
+    if format != 'json':
+        from byteplug.document import formats
+        assert format in formats.FORMATS, f"format must be one of {', '.join(formats.FORMATS)}"
+
+    assert not (lazy and profiler is not None), "lazy conversion can't be profiled"
+    assert not (select is not None and profiler is not None), "projected conversion can't be profiled"
+    assert not (select is not None and lazy), "projected conversion can't be lazy"
+
+    node_map = adjust_node_map
+    if select is not None:
+        from byteplug.document.projection import make_selection_tree, project_specs
+
+        tree = make_selection_tree(specs, select)
+        specs = project_specs(specs, tree, check_unselected, {})
+        node_map = projected_node_map
+
+    limits = None
+    if max_depth is not None or max_nodes is not None or max_string_length is not None:
+        limits = Limits(max_depth, max_nodes, max_string_length)
+
+    adjusted_object = None
+    try:
+        if max_bytes is not None:
+            check_document_size(document, max_bytes)
+
+        if format != 'json':
+            object = formats.loads(document, format, max_depth)
+        else:
+            try:
+                object = json.loads(document)
+            except RecursionError:
+                # The document is too deep for the 'json' module.
+                from byteplug.document import deepjson
+                object = deepjson.loads(document, max_depth)
+
+        if lazy:
+            from byteplug.document.lazy import adjust_lazy_node
+
+            context = (node_map, finalize_node_map, limits)
+            adjusted_object = adjust_lazy_node(ROOT_PATH, object, specs, errors, context)
+        elif profiler is None:
+            adjusted_object = traverse(object, specs, node_map, errors, warnings, limits, finalize_node_map)
+        else:
+            from byteplug.document.profiler import traverse_profiled
+            adjusted_object = traverse_profiled(object, specs, adjust_node_map, errors, warnings, profiler, limits, finalize_node_map)
+    except LimitExceeded as exception:
+        # A limit was exceeded and the conversion was aborted.
+        errors.append(exception.record)
 
     # If we're not lazy-validating, we raise the first error that occurred.
     if not lazy_validation and len(errors) > 0:
-        raise errors[0]
+        raise errors[0].to_exception()
 
     return adjusted_object
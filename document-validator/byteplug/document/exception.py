@@ -6,12 +6,90 @@
 #
 # Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
 
+from enum import Enum
+from byteplug.document.traversal import expand_path
+
+# Notes:
+# - Converters report errors with ErrorRecord objects rather than with
+#   ValidationError exceptions; a document may have a large number of errors
+#   and building an exception and its message for each of them is expensive.
+#   A record only stores the (non-expanded) path, the code of the error and
+#   its parameter; the path and the message are built when they're accessed.
+# - Errors and warnings about specs loaded from a YAML file also have the
+#   line and column of the value they refer to (see the 'loader' module).
+# - The value of an error code is the template of its message.
+
+__all__ = ['ValidationError', 'ValidationWarning', 'ErrorCode', 'ErrorRecord']
+
 class ValidationError(Exception):
-    def __init__(self, path, message):
+    def __init__(self, path, message, code=None, line=None, column=None):
         self.path = path
         self.message = message
+        self.code = code
+        self.line = line
+        self.column = column
 
 class ValidationWarning(Warning):
-    def __init__(self, path, message):
+    def __init__(self, path, message, line=None, column=None):
         self.path = path
         self.message = message
+        self.line = line
+        self.column = column
+
+class ErrorCode(Enum):
+    INVALID_TYPE = "was expecting {}"
+    DECIMAL_NUMBER = "was expecting non-decimal number"
+    EXCLUSIVE_MINIMUM = "value must be strictly greater than {}"
+    MINIMUM = "value must be equal or greater than {}"
+    EXCLUSIVE_MAXIMUM = "value must be strictly lower than {}"
+    MAXIMUM = "value must be equal or lower than {}"
+    LENGTH = "length must be equal to {}"
+    MINIMUM_LENGTH = "length must be equal or greater than {}"
+    MAXIMUM_LENGTH = "length must be equal or lower than {}"
+    PATTERN_MISMATCH = "value did not match the pattern"
+    INTEGER_KEY = "key at index {} is invalid; expected it to be an integer"
+    STRING_KEY = "key at index {} is invalid; expected to match the pattern"
+    NON_STRING_KEYS = "keys of the dict must be string exclusively"
+    ARRAY_LENGTH = "length of the array must be {}"
+    TUPLE_LENGTH = "length of the tuple must be {}"
+    UNEXPECTED_FIELD = "'{}' field was unexpected"
+    MISSING_FIELD = "'{}' field was missing"
+    ENUM_VALUE = "enum value is invalid"
+    UNION_VARIANT = "'{}' field must identify a variant"
+    DOCUMENT_SIZE = "document size must be equal or lower than {} bytes"
+    DEPTH = "depth must be equal or lower than {}"
+    NODES = "number of nodes must be equal or lower than {}"
+    STRING_LENGTH = "string length must be equal or lower than {}"
+    BINARY = "binary document is invalid"
+
+class ErrorRecord:
+    """ Error reported by a converter.
+
+    It has the same 'path' and 'message' attributes as the ValidationError
+    exception (they're built on demand), its 'code' attribute is an ErrorCode
+    value and its 'parameter' attribute is the value used in the message (if
+    any).
+    """
+
+    __slots__ = ('location', 'code', 'parameter')
+
+    def __init__(self, location, code, parameter=None):
+        self.location = location
+        self.code = code
+        self.parameter = parameter
+
+    @property
+    def path(self):
+        return expand_path(self.location)
+
+    @property
+    def message(self):
+        return self.code.value.format(self.parameter)
+
+    def to_exception(self):
+        """ Return the ValidationError exception equivalent to this record. """
+
+        return ValidationError(self.path, self.message, self.code)
+
+    def __repr__(self):
+        return f"ErrorRecord({self.path!r}, {self.message!r})"
@@ -0,0 +1,457 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import importlib
+from struct import Struct, error as StructError
+from byteplug.document.limits import LimitExceeded
+from byteplug.document.traversal import ROOT_PATH
+from byteplug.document.exception import ErrorCode, ErrorRecord
+
+# Notes:
+# - This module implements the MessagePack and CBOR formats of the documents
+#   (see the 'format' parameter of document_to_object() and
+#   object_to_document()). Documents are the same values as the ones of the
+#   'json' module, except the keys of 'object' nodes which can be integers.
+# - The native package of MessagePack ('msgpack') is used when it's
+#   installed (it's imported on first use), otherwise the pure-Python
+#   implementations of this module are used; they're slower but they have no
+#   dependencies. Like the 'deepjson' module, they're iterative and they're
+#   also used when a document is nested too deeply for the native package.
+# - The pure-Python implementations only support the values of the documents;
+#   extension types of MessagePack, and tags (except bignums), simple values
+#   (except booleans and null) and indefinite-length items of CBOR are
+#   rejected. Malformed documents raise the ValueError exception, like the
+#   'json' module does.
+# - Documents must be accepted and rejected the same way whether the native
+#   package is installed or not. Its errors are turned into the ValueError
+#   exception and its extension types are rejected; timestamps (the -1
+#   extension type) are decoded regardless of its hooks, therefore documents
+#   which may contain one are decoded by the pure-Python implementation.
+# - CBOR has no native package; the 'cbor2' package can't be told to reject
+#   tags, simple values and indefinite-length items, and it crashes the
+#   interpreter when serializing deeply nested documents.
+
+__all__ = ['FORMATS', 'loads', 'dumps']
+
+FORMATS = ('json', 'msgpack', 'cbor')
+
+# Name of the native package of the formats.
+NATIVE_PACKAGES = {
+    'msgpack': 'msgpack'
+}
+
+# Native packages already looked for (None if they're not installed).
+native_packages = {}
+
+UINT8 = Struct('>B')
+UINT16 = Struct('>H')
+UINT32 = Struct('>I')
+UINT64 = Struct('>Q')
+INT8 = Struct('>b')
+INT16 = Struct('>h')
+INT32 = Struct('>i')
+INT64 = Struct('>q')
+FLOAT16 = Struct('>e')
+FLOAT32 = Struct('>f')
+FLOAT64 = Struct('>d')
+
+# Kind of the items read by the decoders; containers are followed by their
+# items (the keys and values alternate in maps).
+SCALAR = 0
+ARRAY = 1
+MAP = 2
+
+MISSING = object()
+
+def find_native_package(format):
+    if format not in NATIVE_PACKAGES:
+        return None
+
+    if format not in native_packages:
+        try:
+            native_packages[format] = importlib.import_module(NATIVE_PACKAGES[format])
+        except ImportError:
+            native_packages[format] = None
+
+    return native_packages[format]
+
+def read_bytes(data, position, length):
+    end = position + length
+    if end > len(data):
+        raise ValueError("unexpected end of data")
+
+    return data[position:end], end
+
+def read_msgpack_item(data, position):
+    byte = data[position]
+    position += 1
+
+    if byte <= 0x7f:
+        return SCALAR, byte, position
+    elif byte >= 0xe0:
+        return SCALAR, byte - 0x100, position
+    elif byte >= 0xa0 and byte <= 0xbf:
+        value, position = read_bytes(data, position, byte & 0x1f)
+        return SCALAR, str(value, 'utf-8'), position
+    elif byte >= 0x90 and byte <= 0x9f:
+        return ARRAY, byte & 0x0f, position
+    elif byte >= 0x80 and byte <= 0x8f:
+        return MAP, byte & 0x0f, position
+    elif byte == 0xc0:
+        return SCALAR, None, position
+    elif byte == 0xc2:
+        return SCALAR, False, position
+    elif byte == 0xc3:
+        return SCALAR, True, position
+
+    item = MSGPACK_ITEMS.get(byte)
+    if item is None:
+        raise ValueError(f"unsupported MessagePack type (0x{byte:02x})")
+
+    kind, struct = item
+    if kind == 'bytes' or kind == 'str':
+        length = struct.unpack_from(data, position)[0]
+        value, position = read_bytes(data, position + struct.size, length)
+        return SCALAR, str(value, 'utf-8') if kind == 'str' else bytes(value), position
+
+    value = struct.unpack_from(data, position)[0]
+    position += struct.size
+
+    if kind == 'array':
+        return ARRAY, value, position
+    elif kind == 'map':
+        return MAP, value, position
+    else:
+        return SCALAR, value, position
+
+MSGPACK_ITEMS = {
+    0xc4: ('bytes', UINT8),
+    0xc5: ('bytes', UINT16),
+    0xc6: ('bytes', UINT32),
+    0xca: ('scalar', FLOAT32),
+    0xcb: ('scalar', FLOAT64),
+    0xcc: ('scalar', UINT8),
+    0xcd: ('scalar', UINT16),
+    0xce: ('scalar', UINT32),
+    0xcf: ('scalar', UINT64),
+    0xd0: ('scalar', INT8),
+    0xd1: ('scalar', INT16),
+    0xd2: ('scalar', INT32),
+    0xd3: ('scalar', INT64),
+    0xd9: ('str', UINT8),
+    0xda: ('str', UINT16),
+    0xdb: ('str', UINT32),
+    0xdc: ('array', UINT16),
+    0xdd: ('array', UINT32),
+    0xde: ('map', UINT16),
+    0xdf: ('map', UINT32)
+}
+
+def read_cbor_argument(data, position, info):
+    if info < 24:
+        return info, position
+    elif info == 24:
+        return data[position], position + 1
+    elif info == 25:
+        return UINT16.unpack_from(data, position)[0], position + 2
+    elif info == 26:
+        return UINT32.unpack_from(data, position)[0], position + 4
+    elif info == 27:
+        return UINT64.unpack_from(data, position)[0], position + 8
+    else:
+        raise ValueError("unsupported CBOR argument (indefinite-length items are not supported)")
+
+def read_cbor_item(data, position):
+    byte = data[position]
+    position += 1
+
+    major = byte >> 5
+    info = byte & 0x1f
+
+    if major == 7:
+        if info == 20:
+            return SCALAR, False, position
+        elif info == 21:
+            return SCALAR, True, position
+        elif info == 22:
+            return SCALAR, None, position
+        elif info == 25:
+            return SCALAR, FLOAT16.unpack_from(data, position)[0], position + 2
+        elif info == 26:
+            return SCALAR, FLOAT32.unpack_from(data, position)[0], position + 4
+        elif info == 27:
+            return SCALAR, FLOAT64.unpack_from(data, position)[0], position + 8
+        else:
+            raise ValueError(f"unsupported CBOR simple value ({info})")
+
+    argument, position = read_cbor_argument(data, position, info)
+    if major == 0:
+        return SCALAR, argument, position
+    elif major == 1:
+        return SCALAR, -1 - argument, position
+    elif major == 2:
+        value, position = read_bytes(data, position, argument)
+        return SCALAR, bytes(value), position
+    elif major == 3:
+        value, position = read_bytes(data, position, argument)
+        return SCALAR, str(value, 'utf-8'), position
+    elif major == 4:
+        return ARRAY, argument, position
+    elif major == 5:
+        return MAP, argument, position
+
+    # Bignums are a tag followed by a byte string.
+    if argument not in (2, 3) or data[position] >> 5 != 2:
+        raise ValueError(f"unsupported CBOR tag ({argument})")
+
+    length, position = read_cbor_argument(data, position + 1, data[position] & 0x1f)
+    value, position = read_bytes(data, position, length)
+    value = int.from_bytes(value, 'big')
+
+    return SCALAR, value if argument == 2 else -1 - value, position
+
+def decode(data, read_item, max_depth=None):
+    # Containers being read are [container, count, key] lists, where count is
+    # the number of remaining items (keys and values are counted separately).
+    root = MISSING
+    stack = []
+    position = 0
+
+    try:
+        while True:
+            kind, value, position = read_item(data, position)
+
+            if kind == SCALAR:
+                node = value
+                count = 0
+            else:
+                node = [] if kind == ARRAY else {}
+                count = value if kind == ARRAY else value * 2
+
+                # Each item takes at least one byte; a count exceeding the
+                # remaining bytes is rejected before anything is allocated.
+                if count > len(data) - position:
+                    raise ValueError("unexpected end of data")
+
+            if len(stack) == 0:
+                root = node
+            else:
+                frame = stack[-1]
+                container = frame[0]
+                if type(container) is list:
+                    container.append(node)
+                elif frame[2] is MISSING:
+                    if kind != SCALAR:
+                        raise ValueError("keys must be scalar values")
+                    frame[2] = node
+                else:
+                    container[frame[2]] = node
+                    frame[2] = MISSING
+                frame[1] -= 1
+
+            if count > 0:
+                stack.append([node, count, MISSING])
+                if max_depth is not None and len(stack) > max_depth:
+                    raise LimitExceeded(ErrorRecord(ROOT_PATH, ErrorCode.DEPTH, max_depth))
+
+            while len(stack) > 0 and stack[-1][1] == 0:
+                stack.pop()
+
+            if len(stack) == 0:
+                break
+    except (IndexError, StructError):
+        raise ValueError("unexpected end of data")
+
+    if position != len(data):
+        raise ValueError("extra data")
+
+    return root
+
+def write_msgpack_value(buffer, value):
+    if value is None:
+        buffer.append(0xc0)
+    elif value is True:
+        buffer.append(0xc3)
+    elif value is False:
+        buffer.append(0xc2)
+    elif type(value) is int:
+        if 0 <= value <= 0x7f or -32 <= value < 0:
+            buffer += INT8.pack(value) if value < 0 else UINT8.pack(value)
+        elif value > 0:
+            for marker, struct in ((0xcc, UINT8), (0xcd, UINT16), (0xce, UINT32), (0xcf, UINT64)):
+                if value < 1 << (struct.size * 8):
+                    buffer.append(marker)
+                    buffer += struct.pack(value)
+                    break
+            else:
+                raise OverflowError("Integer value out of range")
+        else:
+            for marker, struct in ((0xd0, INT8), (0xd1, INT16), (0xd2, INT32), (0xd3, INT64)):
+                if value >= -(1 << (struct.size * 8 - 1)):
+                    buffer.append(marker)
+                    buffer += struct.pack(value)
+                    break
+            else:
+                raise OverflowError("Integer value out of range")
+    elif type(value) is float:
+        buffer.append(0xcb)
+        buffer += FLOAT64.pack(value)
+    elif type(value) is str:
+        data = value.encode('utf-8')
+        write_msgpack_header(buffer, len(data), 0xa0, 32, (0xd9, 0xda, 0xdb))
+        buffer += data
+    elif type(value) is bytes:
+        write_msgpack_header(buffer, len(value), None, 0, (0xc4, 0xc5, 0xc6))
+        buffer += value
+    elif type(value) in (list, tuple):
+        write_msgpack_header(buffer, len(value), 0x90, 16, (None, 0xdc, 0xdd))
+    elif type(value) is dict:
+        write_msgpack_header(buffer, len(value), 0x80, 16, (None, 0xde, 0xdf))
+    else:
+        raise TypeError(f"can not serialize '{type(value).__name__}' object")
+
+def write_msgpack_header(buffer, length, fixed_marker, fixed_limit, markers):
+    if length < fixed_limit:
+        buffer.append(fixed_marker | length)
+    elif length <= 0xff and markers[0] is not None:
+        buffer.append(markers[0])
+        buffer += UINT8.pack(length)
+    elif length <= 0xffff:
+        buffer.append(markers[1])
+        buffer += UINT16.pack(length)
+    else:
+        buffer.append(markers[2])
+        buffer += UINT32.pack(length)
+
+def write_cbor_argument(buffer, major, argument):
+    major <<= 5
+    if argument < 24:
+        buffer.append(major | argument)
+    elif argument <= 0xff:
+        buffer.append(major | 24)
+        buffer.append(argument)
+    elif argument <= 0xffff:
+        buffer.append(major | 25)
+        buffer += UINT16.pack(argument)
+    elif argument <= 0xffffffff:
+        buffer.append(major | 26)
+        buffer += UINT32.pack(argument)
+    else:
+        buffer.append(major | 27)
+        buffer += UINT64.pack(argument)
+
+def write_cbor_value(buffer, value):
+    if value is None:
+        buffer.append(0xf6)
+    elif value is True:
+        buffer.append(0xf5)
+    elif value is False:
+        buffer.append(0xf4)
+    elif type(value) is int:
+        major = 0 if value >= 0 else 1
+        argument = value if value >= 0 else -1 - value
+        if argument <= 0xffffffffffffffff:
+            write_cbor_argument(buffer, major, argument)
+        else:
+            # Bignums (tags 2 and 3).
+            data = argument.to_bytes((argument.bit_length() + 7) // 8, 'big')
+            write_cbor_argument(buffer, 6, 2 + major)
+            write_cbor_argument(buffer, 2, len(data))
+            buffer += data
+    elif type(value) is float:
+        buffer.append(0xfb)
+        buffer += FLOAT64.pack(value)
+    elif type(value) is str:
+        data = value.encode('utf-8')
+        write_cbor_argument(buffer, 3, len(data))
+        buffer += data
+    elif type(value) is bytes:
+        write_cbor_argument(buffer, 2, len(value))
+        buffer += value
+    elif type(value) in (list, tuple):
+        write_cbor_argument(buffer, 4, len(value))
+    elif type(value) is dict:
+        write_cbor_argument(buffer, 5, len(value))
+    else:
+        raise TypeError(f"can not serialize '{type(value).__name__}' object")
+
+def encode(document, write_value):
+    # Containers are written by their header, followed by their items.
+    buffer = bytearray()
+
+    stack = [document]
+    while stack:
+        value = stack.pop()
+        write_value(buffer, value)
+
+        if type(value) in (list, tuple):
+            stack.extend(reversed(value))
+        elif type(value) is dict:
+            for key, item in reversed(value.items()):
+                stack.append(item)
+                stack.append(key)
+
+    return bytes(buffer)
+
+READERS = {
+    'msgpack': read_msgpack_item,
+    'cbor': read_cbor_item
+}
+
+WRITERS = {
+    'msgpack': write_msgpack_value,
+    'cbor': write_cbor_value
+}
+
+def reject_extension_type(code, data):
+    raise ValueError(f"unsupported MessagePack extension type ({code})")
+
+# Headers of the timestamps in MessagePack documents (fixext 4, fixext 8 and
+# ext 8 with a length of 12).
+MSGPACK_TIMESTAMPS = (b'\xd6\xff', b'\xd7\xff', b'\xc7\x0c\xff')
+
+def loads(document, format, max_depth=None):
+    """ Parse a MessagePack or CBOR document.
+
+    If the document is parsed by the pure-Python implementation and the
+    maximum depth is set and exceeded, the LimitExceeded exception is raised
+    as soon as it's detected.
+    """
+
+    package = find_native_package(format)
+
+    # The bytes of a timestamp header may also be found inside a value; the
+    # pure-Python implementation then decodes the document, it's slower but
+    # correct.
+    if package is not None and not any(header in document for header in MSGPACK_TIMESTAMPS):
+        try:
+            return package.unpackb(document, raw=False, strict_map_key=False, ext_hook=reject_extension_type)
+        except RecursionError:
+            # The document is too deep for the native package.
+            pass
+        except ValueError as exception:
+            if type(exception).__name__ != 'StackError':
+                raise ValueError(str(exception) or "invalid MessagePack document") from exception
+        except TypeError as exception:
+            # Keys of maps can't be containers.
+            raise ValueError(str(exception)) from exception
+
+    return decode(memoryview(document).cast('B'), READERS[format], max_depth)
+
+def dumps(document, format):
+    """ Serialize a document to MessagePack or CBOR. """
+
+    package = find_native_package(format)
+    if package is not None:
+        try:
+            return package.packb(document, use_bin_type=True)
+        except (RecursionError, ValueError):
+            # The document is too deep for the native package.
+            pass
+
+    return encode(document, WRITERS[format])
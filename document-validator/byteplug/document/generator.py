@@ -0,0 +1,515 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import json
+import math
+import random
+from byteplug.document.specs import normalize_specs
+from byteplug.document.utility import remember
+from byteplug.document.pattern import sre_parse, set_characters
+from byteplug.document.pattern import LITERAL, NOT_LITERAL, ANY, IN, RANGE
+from byteplug.document.pattern import AT, BRANCH, SUBPATTERN, ASSERT, ASSERT_NOT
+from byteplug.document.pattern import MAXREPEAT, REPEATS, POSSESSIVE_REPEAT
+from byteplug.document.pattern import ATOMIC_GROUP
+
+# Notes:
+# - This module generates random JSON documents from specs, for load tests,
+#   benchmarks and fuzzing. Generation is deterministic for a given seed.
+# - A document is generated in its Python form (as defined by the 'json'
+#   module) then dumped. An invalid document is a valid document where one
+#   randomly picked node is replaced by an invalid one; the violation targets
+#   a constraint of the node (bounds, length, pattern, arity, missing or
+#   unexpected field, etc.) or its type.
+# - Unbounded values are kept small (for instance, arrays without a maximum
+#   length have at most a few items) so documents have a realistic size.
+# - Strings of a 'string' node with a pattern are generated from the parsed
+#   pattern; lookarounds and anchors are ignored while generating, therefore
+#   the generated string is checked against the pattern and generation is
+#   retried a few times. The ValueError exception is raised if the specs
+#   don't allow any value (for instance, a pattern that can't be satisfied
+#   within the length bounds).
+# - Generation is recursive; specs nested deeper than the Python recursion
+#   limit are not supported. Specs referencing recursive records are cyclic;
+#   beyond a given depth, documents are kept as small as possible (optional
+#   nodes are null, optional fields are omitted and containers have their
+#   minimum length) and the ValueError exception is raised if the specs
+#   don't allow documents of a finite depth.
+
+__all__ = ['generate_documents']
+
+# Probability of a null value for optional nodes, and of an optional field of
+# a 'map' node being present.
+NONE_RATIO = 0.1
+OPTIONAL_FIELD_RATIO = 0.5
+
+# Default bounds of unbounded values.
+NUMBER_RANGE = 1000
+STRING_LENGTH = 16
+CONTAINER_LENGTH = 4
+REPEAT_COUNT = 4
+
+# Depth beyond which documents are kept as small as possible.
+NESTING_DEPTH = 8
+
+ATTEMPTS = 100
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+NAME_CHARACTERS = 'abcdefghijklmnopqrstuvwxyz0123456789-_'
+PRINTABLE_CHARACTERS = [chr(character) for character in range(32, 127)]
+
+def pick_integer(rng, low, high):
+    # Faster than rng.randint(), and uniform enough to generate documents.
+    return low + int(rng.random() * (high - low + 1))
+
+def read_length_bounds(length, default):
+    # Return the (minimum, maximum) bounds of a normalized length.
+    if length is None:
+        return (0, default)
+    elif type(length) is int:
+        return (length, length)
+    else:
+        minimum, maximum = length
+        if minimum is None:
+            minimum = 0
+        if maximum is None:
+            maximum = minimum + default
+
+        return (minimum, maximum)
+
+# Patterns are compiled into plans; a plan is a list of steps, each step is
+# either a string (literal characters), a list of characters (one of them is
+# picked), a (minimum, maximum, plan) tuple for repetitions, or a tuple of
+# plans for alternatives. Plans are cached (the cache is bounded).
+plans = {}
+
+def compile_set(items):
+    characters, _ = set_characters(items)
+    alphabet = [chr(character) for character in sorted(characters) if 32 <= character < 127]
+
+    # The set may only contain non-ASCII characters.
+    if len(alphabet) == 0:
+        for op, av in items:
+            if op is LITERAL:
+                alphabet.append(chr(av))
+            elif op is RANGE:
+                alphabet.append(chr(av[0]))
+
+    if len(alphabet) == 0:
+        raise ValueError("unable to generate a character of a set of the pattern")
+
+    return alphabet
+
+def compile_plan(items):
+    plan = []
+    for op, av in items:
+        if op is LITERAL:
+            if len(plan) > 0 and type(plan[-1]) is str:
+                plan[-1] += chr(av)
+            else:
+                plan.append(chr(av))
+        elif op is NOT_LITERAL:
+            plan.append([character for character in LETTERS if ord(character) != av])
+        elif op is ANY:
+            plan.append(list(LETTERS))
+        elif op is IN:
+            plan.append(compile_set(av))
+        elif op in REPEATS or op is POSSESSIVE_REPEAT:
+            minimum, maximum, body = av
+            if maximum is MAXREPEAT or maximum > minimum + REPEAT_COUNT:
+                maximum = minimum + REPEAT_COUNT
+            plan.append((minimum, maximum, compile_plan(body)))
+        elif op is SUBPATTERN:
+            plan.extend(compile_plan(av[-1]))
+        elif op is ATOMIC_GROUP:
+            plan.extend(compile_plan(av))
+        elif op is BRANCH:
+            plan.append(tuple(compile_plan(alternative) for alternative in av[1]))
+        elif op in (AT, ASSERT, ASSERT_NOT):
+            pass
+        else:
+            raise ValueError(f"unable to generate a string for the pattern (unsupported '{op}' construct)")
+
+    return plan
+
+def compile_pattern_plan(pattern):
+    plan = plans.get(pattern)
+    if plan is None:
+        plan = compile_plan(sre_parse.parse(pattern))
+        remember(plans, pattern, plan)
+
+    return plan
+
+def execute_plan(plan, random, chunks):
+    for step in plan:
+        step_type = type(step)
+        if step_type is str:
+            chunks.append(step)
+        elif step_type is list:
+            chunks.append(step[int(random() * len(step))])
+        elif len(step) == 3 and type(step[0]) is int:
+            minimum, maximum, body = step
+            for _ in range(minimum + int(random() * (maximum - minimum + 1))):
+                execute_plan(body, random, chunks)
+        else:
+            execute_plan(step[int(random() * len(step))], random, chunks)
+
+def generate_string(specs, rng):
+    minimum, maximum = read_length_bounds(specs['length'], STRING_LENGTH)
+    pattern = specs['pattern']
+
+    if pattern is None:
+        return ''.join(rng.choices(LETTERS, k=pick_integer(rng, minimum, maximum)))
+
+    plan = compile_pattern_plan(pattern.pattern)
+    for _ in range(ATTEMPTS):
+        chunks = []
+        execute_plan(plan, rng.random, chunks)
+        value = ''.join(chunks)
+
+        if minimum <= len(value) <= maximum and pattern.match(value):
+            return value
+
+    raise ValueError(f"unable to generate a string matching '{pattern.pattern}' within the length bounds")
+
+def read_number_bounds(specs):
+    # Return the (low, high) bounds of valid numbers and whether they're
+    # exclusive.
+    minimum = specs['minimum']
+    maximum = specs['maximum']
+
+    low, low_exclusive = (minimum[1], minimum[0]) if minimum else (None, False)
+    high, high_exclusive = (maximum[1], maximum[0]) if maximum else (None, False)
+
+    if low is None and high is None:
+        low, high = -NUMBER_RANGE, NUMBER_RANGE
+    elif low is None:
+        low = high - NUMBER_RANGE
+    elif high is None:
+        high = low + NUMBER_RANGE
+
+    return low, low_exclusive, high, high_exclusive
+
+def generate_flag(specs, rng, candidates, depth):
+    return rng.random() < 0.5
+
+def generate_number(specs, rng, candidates, depth):
+    low, low_exclusive, high, high_exclusive = read_number_bounds(specs)
+
+    # Integers are generated for non-decimal numbers, and half of the time
+    # for decimal numbers (when there is an integer within the bounds).
+    integer_low = math.ceil(low)
+    if low_exclusive and integer_low == low:
+        integer_low += 1
+
+    integer_high = math.floor(high)
+    if high_exclusive and integer_high == high:
+        integer_high -= 1
+
+    if not specs['decimal'] or (integer_low <= integer_high and rng.random() < 0.5):
+        if integer_low > integer_high:
+            raise ValueError("unable to generate an integer within the bounds")
+
+        return pick_integer(rng, integer_low, integer_high)
+
+    value = rng.uniform(low, high)
+    if (low_exclusive and value <= low) or (high_exclusive and value >= high):
+        value = (low + high) / 2
+        if value <= low or value >= high:
+            raise ValueError("unable to generate a number within the bounds")
+
+    return value
+
+def generate_string_node(specs, rng, candidates, depth):
+    return generate_string(specs, rng)
+
+def generate_array(specs, rng, candidates, depth):
+    minimum, maximum = read_length_bounds(specs['length'], CONTAINER_LENGTH)
+    if depth > NESTING_DEPTH:
+        maximum = minimum
+
+    value = specs['value']
+    node = [None] * pick_integer(rng, minimum, maximum)
+    for index in range(len(node)):
+        node[index] = generate_node(value, rng, candidates, depth + 1)
+        if candidates is not None:
+            candidates.append((node, index, value))
+
+    return node
+
+def generate_key(key, rng, node):
+    while True:
+        if key == 'integer':
+            name = str(pick_integer(rng, 0, 1000000))
+        else:
+            name = ''.join(rng.choices(NAME_CHARACTERS, k=pick_integer(rng, 1, 12)))
+
+        if name not in node:
+            return name
+
+def generate_object(specs, rng, candidates, depth):
+    minimum, maximum = read_length_bounds(specs['length'], CONTAINER_LENGTH)
+    if depth > NESTING_DEPTH:
+        maximum = minimum
+
+    key = specs['key']
+    value = specs['value']
+    node = {}
+    for _ in range(pick_integer(rng, minimum, maximum)):
+        name = generate_key(key, rng, node)
+        node[name] = generate_node(value, rng, candidates, depth + 1)
+        if candidates is not None:
+            candidates.append((node, name, value))
+
+    return node
+
+def generate_tuple(specs, rng, candidates, depth):
+    items = specs['items']
+    node = [None] * len(items)
+    for index, item in enumerate(items):
+        node[index] = generate_node(item, rng, candidates, depth + 1)
+        if candidates is not None:
+            candidates.append((node, index, item))
+
+    return node
+
+def generate_map(specs, rng, candidates, depth):
+    required = specs['required']
+    node = {}
+    for name, field in specs['fields'].items():
+        if name in required or (depth <= NESTING_DEPTH and rng.random() < OPTIONAL_FIELD_RATIO):
+            node[name] = generate_node(field, rng, candidates, depth + 1)
+            if candidates is not None:
+                candidates.append((node, name, field))
+
+    return node
+
+def generate_enum(specs, rng, candidates, depth):
+    return rng.choice(specs['values'])
+
+def generate_union(specs, rng, candidates, depth):
+    variant = rng.choice(tuple(specs['variants'].values()))
+    return generate_map(variant, rng, candidates, depth)
+
+generators = {
+    'flag'   : generate_flag,
+    'number' : generate_number,
+    'string' : generate_string_node,
+    'array'  : generate_array,
+    'object' : generate_object,
+    'tuple'  : generate_tuple,
+    'map'    : generate_map,
+    'enum'   : generate_enum,
+    'union'  : generate_union
+}
+
+def generate_node(specs, rng, candidates, depth=0):
+    if specs['option'] and (depth > NESTING_DEPTH or rng.random() < NONE_RATIO):
+        return None
+
+    return generators[specs['type']](specs, rng, candidates, depth)
+
+# Values of a different JSON type for each type of node.
+WRONG_TYPE_VALUES = {
+    'flag'   : 42,
+    'number' : "foo",
+    'string' : 42,
+    'array'  : {},
+    'object' : [],
+    'tuple'  : {},
+    'map'    : [],
+    'enum'   : 42,
+    'union'  : []
+}
+
+def invalidate_number(node, specs, rng):
+    variants = []
+
+    minimum = specs['minimum']
+    if minimum:
+        exclusive, value = minimum
+        variants.append(value if exclusive else value - 1)
+
+    maximum = specs['maximum']
+    if maximum:
+        exclusive, value = maximum
+        variants.append(value if exclusive else value + 1)
+
+    if not specs['decimal']:
+        variants.append(node + 0.5)
+
+    return variants
+
+def invalidate_string(node, specs, rng):
+    variants = []
+
+    minimum, maximum = read_length_bounds(specs['length'], STRING_LENGTH)
+    if minimum > 0:
+        variants.append(''.join(rng.choices(LETTERS, k=minimum - 1)))
+    if specs['length'] is not None and (type(specs['length']) is int or specs['length'][1] is not None):
+        variants.append(''.join(rng.choices(LETTERS, k=maximum + 1)))
+
+    pattern = specs['pattern']
+    if pattern is not None:
+        for _ in range(ATTEMPTS):
+            value = ''.join(rng.choices(PRINTABLE_CHARACTERS, k=rng.randint(minimum, maximum)))
+            if not pattern.match(value):
+                variants.append(value)
+                break
+
+    return variants
+
+def invalidate_container(node, specs, rng):
+    # Variants of arrays and objects violating their length.
+    variants = []
+
+    length = specs['length']
+    if length is None:
+        return variants
+
+    minimum, maximum = read_length_bounds(length, CONTAINER_LENGTH)
+    if minimum > 0:
+        if specs['type'] == 'array':
+            variants.append([None] * (minimum - 1))
+        else:
+            variants.append({})
+
+    if type(length) is int or length[1] is not None:
+        if specs['type'] == 'array':
+            variants.append([generate_node(specs['value'], rng, None) for _ in range(maximum + 1)])
+        else:
+            variant = {}
+            for _ in range(maximum + 1):
+                variant[generate_key(specs['key'], rng, variant)] = generate_node(specs['value'], rng, None)
+            variants.append(variant)
+
+    return variants
+
+def invalidate_object(node, specs, rng):
+    variants = invalidate_container(node, specs, rng)
+
+    # Keys of the object must be integers or must match the name pattern.
+    variant = dict(node)
+    variant['foo' if specs['key'] == 'integer' else '@foo'] = generate_node(specs['value'], rng, None)
+    variants.append(variant)
+
+    return variants
+
+def invalidate_tuple(node, specs, rng):
+    variants = [node + [None]]
+    if len(node) > 0:
+        variants.append(node[:-1])
+
+    return variants
+
+def invalidate_map(node, specs, rng):
+    variants = []
+
+    required = [name for name in specs['fields'].keys() if name in specs['required']]
+    if len(required) > 0:
+        variant = dict(node)
+        del variant[rng.choice(required)]
+        variants.append(variant)
+
+    name = 'unexpected'
+    while name in specs['fields']:
+        name += '-field'
+
+    variant = dict(node)
+    variant[name] = True
+    variants.append(variant)
+
+    return variants
+
+def invalidate_enum(node, specs, rng):
+    value = 'invalid'
+    while value in specs['values']:
+        value += '-value'
+
+    return [value]
+
+def invalidate_union(node, specs, rng):
+    discriminator = specs['discriminator']
+
+    variants = []
+
+    variant = dict(node)
+    del variant[discriminator]
+    variants.append(variant)
+
+    value = 'invalid'
+    while value in specs['variants']:
+        value += '-variant'
+
+    variant = dict(node)
+    variant[discriminator] = value
+    variants.append(variant)
+
+    variants.extend(invalidate_map(node, specs['variants'][node[discriminator]], rng))
+
+    return variants
+
+invalidators = {
+    'flag'   : None,
+    'number' : invalidate_number,
+    'string' : invalidate_string,
+    'array'  : invalidate_container,
+    'object' : invalidate_object,
+    'tuple'  : invalidate_tuple,
+    'map'    : invalidate_map,
+    'enum'   : invalidate_enum,
+    'union'  : invalidate_union
+}
+
+def invalidate_node(node, specs, rng):
+    # Return an invalid variant of a node; it violates a constraint of the
+    # node, or its type when it has no constraint (or the node is null).
+    variants = []
+
+    invalidator = invalidators[specs['type']]
+    if node is not None and invalidator is not None:
+        variants = invalidator(node, specs, rng)
+
+    if len(variants) == 0:
+        return WRONG_TYPE_VALUES[specs['type']]
+
+    return rng.choice(variants)
+
+def generate_document(specs, rng, invalid):
+    try:
+        if invalid:
+            root = [None]
+            candidates = [(root, 0, specs)]
+            root[0] = generate_node(specs, rng, candidates)
+
+            container, key, node_specs = rng.choice(candidates)
+            container[key] = invalidate_node(container[key], node_specs, rng)
+
+            return root[0]
+        else:
+            return generate_node(specs, rng, None)
+    except RecursionError:
+        raise ValueError("unable to generate a document of a finite depth")
+
+def generate_documents(specs, n, seed=None, invalid_ratio=0.0, records=None):
+    """ Generate random JSON documents for the specs.
+
+    This is a generator yielding 'n' documents. The same seed yields the same
+    documents. The ratio of invalid documents can be set; an invalid document
+    has exactly one invalid node. The records are the ones referenced by the
+    specs (see normalize_specs()).
+    """
+
+    assert 0.0 <= invalid_ratio <= 1.0, "invalid ratio must be between 0 and 1"
+
+    # Specs are used in their canonical form (see normalize_specs()).
+    specs = normalize_specs(specs, records)
+
+    rng = random.Random(seed)
+    for _ in range(n):
+        invalid = invalid_ratio > 0.0 and rng.random() < invalid_ratio
+        yield json.dumps(generate_document(specs, rng, invalid))
@@ -0,0 +1,195 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+from operator import index as to_index
+from collections.abc import Mapping, Sequence
+from byteplug.document.limits import Limits, LimitExceeded
+from byteplug.document.traversal import traverse
+
+# Notes:
+# - This module implements the lazy conversion of documents (see the 'lazy'
+#   parameter of document_to_object()). Nodes of the 'array', 'object', 'map'
+#   and 'union' types are converted to LazyList and LazyDict objects over the
+#   parsed JSON; only the node itself is checked when the proxy is created
+#   (its type, its length, its fields, etc.), its children are converted
+#   when they're accessed for the first time and then cached. Children of
+#   other types are converted at once, like document_to_object() does.
+# - Checking a node is done by the process_<type>_node() functions of the
+#   'document' module, like the traversal engine does; the tasks they push
+#   for the children are kept and processed on access, the tasks reporting
+#   errors are processed immediately.
+# - Errors found while accessing a child are raised (the ValidationError
+#   exception), the access can't return a partially converted value.
+#   Limits are shared by all the proxies of a document; the nodes are counted
+#   as they're converted.
+
+__all__ = ['LazyDict', 'LazyList', 'adjust_lazy_node']
+
+LAZY_TYPES = ('array', 'object', 'map', 'union')
+
+def adjust_lazy_node(path, node, specs, errors, context):
+    """ Return the adjusted node, or a proxy over it if it's a container.
+
+    The context is a (adjust_node_map, finalize_node_map, limits) tuple (see
+    the traverse() function). Errors are appended to the 'errors' list; the
+    LimitExceeded exception is raised if a limit is exceeded.
+    """
+
+    adjust_node_map, finalize_node_map, limits = context
+
+    if node is None and specs['option']:
+        return None
+
+    if specs['type'] not in LAZY_TYPES:
+        return traverse(node, specs, adjust_node_map, errors, [], limits, finalize_node_map, path)
+
+    if limits is not None:
+        limits.check_node(path, node, specs)
+
+    tasks = []
+    adjusted_node = adjust_node_map[specs['type']](path, node, specs, errors, [], tasks)
+
+    # Tasks are processed in the order of the traversal engine (they're
+    # pushed in reverse order).
+    pending = {}
+    for task in reversed(tasks):
+        if len(task) == 2:
+            task[0](*task[1])
+        else:
+            pending[task[4]] = task
+
+    if adjusted_node is None:
+        return None
+    elif type(adjusted_node) is list:
+        return LazyList(path, node, specs, context, adjusted_node, pending)
+    else:
+        return LazyDict(path, node, specs, context, adjusted_node, pending)
+
+def adjust_pending_node(task, context):
+    path, node, specs, _, _ = task
+
+    errors = []
+    try:
+        adjusted_node = adjust_lazy_node(path, node, specs, errors, context)
+    except LimitExceeded as exception:
+        errors.append(exception.record)
+
+    if len(errors) > 0:
+        raise errors[0].to_exception()
+
+    return adjusted_node
+
+class LazyNode:
+    __slots__ = ('path', 'node', 'specs', 'context', 'values', 'pending')
+
+    def __init__(self, path, node, specs, context, values, pending):
+        self.path = path
+        self.node = node
+        self.specs = specs
+        self.context = context
+        self.values = values
+        self.pending = pending
+
+    def load(self, key):
+        task = self.pending.get(key)
+        if task is not None:
+            self.values[key] = adjust_pending_node(task, self.context)
+            del self.pending[key]
+
+        return self.values[key]
+
+    def validate_all(self, errors=None):
+        """ Check the entire node, including the children not accessed yet.
+
+        To lazy-validate the node, pass an empty list (or an empty
+        ErrorSummary object) as the errors parameter, otherwise the first
+        error is raised (the ValidationError exception). The children not
+        accessed yet are converted at once and cached.
+        """
+
+        lazy_validation = errors is not None
+        if errors is None:
+            errors = []
+
+        adjust_node_map, finalize_node_map, limits = self.context
+
+        # The nodes of this node are counted again; they're counted from
+        # zero.
+        if limits is not None:
+            limits = Limits(limits.max_depth, limits.max_nodes, limits.max_string_length)
+
+        adjusted_node = None
+        try:
+            adjusted_node = traverse(self.node, self.specs, adjust_node_map, errors, [], limits, finalize_node_map, self.path)
+        except LimitExceeded as exception:
+            errors.append(exception.record)
+
+        if len(errors) > 0:
+            if not lazy_validation:
+                raise errors[0].to_exception()
+            return
+
+        for key in self.pending:
+            self.values[key] = adjusted_node[key]
+        self.pending.clear()
+
+class LazyDict(LazyNode, Mapping):
+    """ Read-only dict over a JSON object, converted on access.
+
+    It's returned by document_to_object() for 'object', 'map' and 'union'
+    nodes when the 'lazy' parameter is set.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        return self.load(key)
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return f"LazyDict({list(self.values.keys())!r})"
+
+class LazyList(LazyNode, Sequence):
+    """ Read-only list over a JSON array, converted on access.
+
+    It's returned by document_to_object() for 'array' nodes when the 'lazy'
+    parameter is set.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, index):
+        if type(index) is slice:
+            return [self.load(item) for item in range(*index.indices(len(self.values)))]
+
+        index = to_index(index)
+        if index < 0:
+            index += len(self.values)
+        if not 0 <= index < len(self.values):
+            raise IndexError("list index out of range")
+
+        return self.load(index)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, LazyList)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"LazyList(<{len(self.values)} items>)"
@@ -0,0 +1,69 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+from byteplug.document.traversal import ROOT_PATH
+from byteplug.document.exception import ErrorCode, ErrorRecord
+
+# Notes:
+# - Documents are untrusted input; those limits bound the work (and memory)
+#   spent on a single document regardless of the specs. They're checked as
+#   early as possible; the size of the document before it's parsed, and the
+#   depth, the number of nodes and the length of strings (including keys of
+#   'object' nodes) before a node is processed.
+# - Unlike other errors, exceeding a limit aborts the conversion; the
+#   LimitExceeded exception is raised by the checking functions and it's up to
+#   the caller to catch it and to report its error record.
+
+__all__ = ['Limits', 'LimitExceeded', 'check_document_size']
+
+class LimitExceeded(Exception):
+    def __init__(self, record):
+        self.record = record
+
+def check_document_size(document, max_bytes):
+    # Counting the bytes of a string requires encoding it; it's avoided when
+    # the number of characters is enough to conclude.
+    size = len(document)
+    if type(document) is str and size <= max_bytes < size * 4:
+        size = len(document.encode('utf-8'))
+
+    if size > max_bytes:
+        raise LimitExceeded(ErrorRecord(ROOT_PATH, ErrorCode.DOCUMENT_SIZE, max_bytes))
+
+class Limits:
+    """ Limits enforced while walking a document.
+
+    The depth of the root node is zero. The object keeps track of the number
+    of nodes that were visited, it must not be reused for another document.
+    """
+
+    __slots__ = ('max_depth', 'max_nodes', 'max_string_length', 'nodes')
+
+    def __init__(self, max_depth=None, max_nodes=None, max_string_length=None):
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_string_length = max_string_length
+        self.nodes = 0
+
+    def check_node(self, path, node, specs):
+        if self.max_depth is not None and path[3] > self.max_depth:
+            raise LimitExceeded(ErrorRecord(path, ErrorCode.DEPTH, self.max_depth))
+
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise LimitExceeded(ErrorRecord(path, ErrorCode.NODES, self.max_nodes))
+
+        max_string_length = self.max_string_length
+        if max_string_length is not None:
+            if type(node) is str:
+                if len(node) > max_string_length:
+                    raise LimitExceeded(ErrorRecord(path, ErrorCode.STRING_LENGTH, max_string_length))
+            elif type(node) is dict and specs['type'] == 'object':
+                for key in node.keys():
+                    if type(key) is str and len(key) > max_string_length:
+                        raise LimitExceeded(ErrorRecord(path, ErrorCode.STRING_LENGTH, max_string_length))
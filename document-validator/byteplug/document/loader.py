@@ -0,0 +1,254 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import os
+import sys
+import pickle
+import hashlib
+import tempfile
+import importlib.metadata
+import yaml
+from byteplug.document.specs import validate_specs, normalize_specs, serialize_specs
+from byteplug.document.pickling import pickle_specs
+from byteplug.document.exception import ValidationError, ValidationWarning
+
+# Notes:
+# - YAML files are parsed with the libyaml bindings of PyYAML when they're
+#   available (they're an order of magnitude faster than the pure-Python
+#   parser). The file is composed into a tree of YAML nodes first; the
+#   position of each value is read from it, then the nodes are constructed
+#   into Python objects and validated like any other specs.
+# - Errors and warnings have a path in the specs (for instance, ['$foo',
+#   '[]', 'length']); it's translated back to the path of the value in the
+#   YAML file (['fields', 'foo', 'value', 'length']) to find its position.
+#   If the value doesn't exist (for instance, a missing property), the
+#   position of the closest existing parent is used.
+# - The normalized specs (including their compiled patterns) and their
+#   warnings are cached on disk, in a pickle file named after the hash of
+#   the content of the YAML file, the records (their serialized form, see
+#   serialize_specs()), the version of the library and the version of
+#   Python. Specs loaded with records that can't be serialized aren't
+#   cached. Cached specs are never invalidated, a new file is written
+#   instead. Patterns are pickled as their source and compiled again when
+#   they're loaded (see compile_pattern()).
+# - Loading a pickle file executes arbitrary code; the cache directory must
+#   only be writable by trusted users.
+# - The cache is an optimization; if it can't be read (for instance, a
+#   corrupted file) or written (for instance, a read-only directory), the
+#   YAML file is parsed and validated as if there was no cache.
+
+__all__ = ['load_specs']
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# Computed on first use (see read_library_version()).
+library_version = None
+
+def read_library_version():
+    global library_version
+
+    if library_version is None:
+        try:
+            library_version = importlib.metadata.version('byteplug-document')
+        except importlib.metadata.PackageNotFoundError:
+            # Not installed (for instance, used from a checkout); the source
+            # files identify the version instead.
+            digest = hashlib.sha256()
+            directory = os.path.dirname(__file__)
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.py'):
+                    with open(os.path.join(directory, name), 'rb') as file:
+                        digest.update(file.read())
+
+            library_version = digest.hexdigest()
+
+    return library_version
+
+def make_cache_path(directory, content, serialized_records=b''):
+    digest = hashlib.sha256(content)
+    digest.update(hashlib.sha256(serialized_records).digest())
+    digest.update(read_library_version().encode('utf-8'))
+    digest.update(sys.version.encode('utf-8'))
+
+    return os.path.join(directory, f"specs-{digest.hexdigest()}.pickle")
+
+def read_cache(path):
+    # Unpickling a corrupted file can raise about any exception.
+    try:
+        with open(path, 'rb') as file:
+            specs, warnings = pickle.load(file)
+    except Exception:
+        return None
+
+    return specs, warnings
+
+def write_cache(path, cache):
+    # The file is written under a temporary name and renamed once complete,
+    # therefore concurrent processes never read a partial file.
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            pickle_specs(cache, file)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+def read_yaml(content):
+    # Return the document and a dict mapping the path of each value to its
+    # (line, column) position.
+    loader = SafeLoader(content)
+    try:
+        root = loader.get_single_node()
+        if root is None:
+            return None, {}
+
+        document = loader.construct_document(root)
+    finally:
+        loader.dispose()
+
+    # Aliased nodes are only visited once (they may be recursive).
+    positions = {}
+    visited = set()
+    stack = [((), root)]
+    while stack:
+        path, node = stack.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+
+        positions[path] = (node.start_mark.line + 1, node.start_mark.column + 1)
+        if type(node) is yaml.MappingNode:
+            for key, value in node.value:
+                stack.append((path + (key.value,), value))
+        elif type(node) is yaml.SequenceNode:
+            for index, item in enumerate(node.value):
+                stack.append((path + (index,), item))
+
+    return document, positions
+
+def locate(path, positions):
+    yaml_path = []
+    for key in path:
+        if type(key) is not str:
+            yaml_path.append(key)
+        elif key in ('[]', '{}'):
+            yaml_path.append('value')
+        elif key.startswith('$'):
+            yaml_path.extend(['fields', key[1:]])
+        elif key.startswith('@'):
+            yaml_path.extend(['variants', key[1:]])
+        elif key.startswith('<') and key.endswith('>'):
+            yaml_path.extend(['items', int(key[1:-1])])
+        else:
+            yaml_path.append(key)
+
+    while yaml_path and tuple(yaml_path) not in positions:
+        yaml_path.pop()
+
+    return positions.get(tuple(yaml_path), (None, None))
+
+def load_specs(path, errors=None, warnings=None, cache_directory=None, records=None):
+    """ Load specs from a YAML file.
+
+    The specs are validated (see validate_specs()) and their normalized form
+    is returned (see normalize_specs()). Errors and warnings have 'line' and
+    'column' attributes (starting at 1) locating the value they refer to in
+    the file. If the specs are invalid and the errors are lazy-validated,
+    None is returned.
+
+    Specs referencing named records (see the 'reference' type) are loaded
+    with the 'records' parameter (a dict of record specs, expected to be
+    valid already); references are checked and resolved like with
+    validate_specs() and normalize_specs().
+
+    If the 'cache_directory' parameter is set, the normalized specs are
+    cached in this directory and loading the same file again (with the same
+    version of the library, and the same records) doesn't parse nor validate
+    it. The directory must only be writable by trusted users. If the cache
+    can't be read or written, the file is loaded without it (specs loaded
+    with records that can't be serialized aren't cached).
+
+    In addition to the messages of validate_specs(), this error message is
+    possible.
+
+    - YAML is invalid
+    """
+
+    assert errors is None or errors == [], "if the errors parameter is set, it must be an empty list"
+    assert warnings is None or warnings == [], "if the warnings parameter is set, it must be an empty list"
+
+    # We detect if users want lazy validation when they pass an empty list as
+    # the errors parameters.
+    lazy_validation = False
+    if errors is None:
+        errors = []
+    else:
+        lazy_validation = True
+
+    if warnings is None:
+        warnings = []
+
+    with open(path, 'rb') as file:
+        content = file.read()
+
+    # Specs are cached along with their records, which must be serializable.
+    serialized_records = serialize_specs(records) if records is not None else b''
+
+    cache_path = None
+    if cache_directory is not None and serialized_records is not None:
+        cache_path = make_cache_path(cache_directory, content, serialized_records)
+
+        cache = read_cache(cache_path)
+        if cache is not None:
+            specs, cached_warnings = cache
+            for warning_path, message, line, column in cached_warnings:
+                warnings.append(ValidationWarning(list(warning_path), message, line, column))
+
+            return specs
+
+    try:
+        document, positions = read_yaml(content)
+    except yaml.YAMLError as error:
+        mark = getattr(error, 'problem_mark', None)
+        if mark is not None:
+            errors.append(ValidationError([], "YAML is invalid", line=mark.line + 1, column=mark.column + 1))
+        else:
+            errors.append(ValidationError([], "YAML is invalid"))
+    else:
+        validate_specs(document, errors=errors, warnings=warnings, records=records)
+
+        for item in errors + warnings:
+            item.line, item.column = locate(item.path, positions)
+
+    # If we're not lazy-validating the specs, we raise the first error that
+    # occurred.
+    if len(errors) > 0:
+        if not lazy_validation:
+            raise errors[0]
+
+        return None
+
+    specs = normalize_specs(document, records)
+
+    if cache_path is not None:
+        try:
+            write_cache(cache_path, (specs, [
+                (tuple(warning.path), warning.message, warning.line, warning.column)
+                for warning in warnings
+            ]))
+        except (OSError, pickle.PicklingError):
+            pass
+
+    return specs
@@ -6,7 +6,16 @@
 #
 # Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
 
-import re
+from byteplug.document.pattern import NAME_PATTERN
+
+# Notes:
+# - Nodes are immutable; calling a node returns a new node with the updated
+#   properties. Their object form is built once, when they're created, and it
+#   shares the object form of the children (the object form of a tree is
+#   built in linear time and no subtree is copied). It must not be modified.
+# - Nodes are hashable and compared structurally; their hash is computed
+#   once from the hashes of their children. The canonical form of a node
+#   (see normalize_specs()) is cached as well.
 
 PROPERTIES = {
     'flag'   : [],
@@ -16,26 +25,65 @@ PROPERTIES = {
     'object' : ['key', 'value', 'length'],
     'tuple'  : ['items'],
     'map'    : ['fields'],
-    'enum'   : ['values']
+    'enum'   : ['values'],
+    'union'  : ['discriminator', 'variants'],
+    'reference': ['record']
 }
 
+def freeze(value):
+    # Return a hashable equivalent of the value of a property.
+    if type(value) in (list, tuple):
+        return tuple(freeze(item) for item in value)
+    elif type(value) is dict:
+        return frozenset((key, freeze(item)) for key, item in value.items())
+    else:
+        return value
+
 class Node:
+    __slots__ = ('type_', 'arguments', 'properties', 'object', 'hash', 'normalized_specs')
+
     def __init__(self, type_, **properties) -> None:
         assert type_ in PROPERTIES.keys(), "type is invalid"
 
-        self.type_ = type_
-        self.properties = {}
+        set_attribute = object.__setattr__
+        set_attribute(self, 'type_', type_)
+        set_attribute(self, 'arguments', properties)
+        set_attribute(self, 'properties', {})
 
         self.update_properties(properties)
 
+        set_attribute(self, 'object', {'type': type_} | self.properties)
+        set_attribute(self, 'hash', hash((type_, freeze(properties))))
+        set_attribute(self, 'normalized_specs', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("nodes are immutable")
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+
+        if type(other) is not Node or self.hash != other.hash:
+            return False
+
+        return self.object == other.object
+
     def __call__(self, **properties):
-        self.update_properties(properties)
-        return self
+        return Node(self.type_, **(self.arguments | properties))
+
+    def __reduce__(self):
+        return (make_node, (self.type_, self.arguments))
 
     def to_object(self):
         # TODO; Implement a parameter to remove optional fields when they have
         #       default value (e.g: `option: false`)
-        return {'type': self.type_} | self.properties
+        return self.object
+
+    def cache_normalized_specs(self, normalized_specs):
+        object.__setattr__(self, 'normalized_specs', normalized_specs)
 
     def update_properties(self, properties):
         for key, value in properties.items():
@@ -64,6 +112,12 @@ class Node:
                     self.update_map_fields(value)
                 elif key == 'values':
                     self.update_enum_values(value)
+                elif key == 'discriminator':
+                    self.update_union_discriminator(value)
+                elif key == 'variants':
+                    self.update_union_variants(value)
+                elif key == 'record':
+                    self.update_reference_record(value)
             elif key == 'option':
                 assert type(value) is bool, "value of 'option' property must be a boolean"
                 self.properties[key] = value
@@ -136,7 +190,7 @@ class Node:
         assert type(fields) is dict, "fields must be a dict"
         for key, value in fields.items():
             assert type(key) is str, "keys must be string"
-            assert re.match(r"^[a-zA-Z0-9\-\_]+$", key), "keys must match the regex"
+            assert NAME_PATTERN.match(key), "keys must match the regex"
             assert type(value) is Node, "value must be another node"
 
         self.properties['fields'] = {key: value.to_object() for key, value in fields.items()}
@@ -144,6 +198,29 @@ class Node:
     def update_enum_values(self, values):
         for value in values:
             assert type(value) is str, "values must be string"
-            assert re.match(r"^[a-zA-Z0-9\-\_]+$", value), "values must match the regex"
+            assert NAME_PATTERN.match(value), "values must match the regex"
 
         self.properties['values'] = list(values)
+
+    def update_union_discriminator(self, value):
+        assert type(value) is str, "discriminator must be a string"
+        assert NAME_PATTERN.match(value), "discriminator must match the regex"
+        self.properties['discriminator'] = value
+
+    def update_union_variants(self, variants):
+        assert type(variants) is dict, "variants must be a dict"
+        for key, value in variants.items():
+            assert type(key) is str, "keys must be string"
+            assert NAME_PATTERN.match(key), "keys must match the regex"
+            assert type(value) is Node and value.type_ == 'map', "value must be a map node"
+
+        self.properties['variants'] = {key: value.to_object() for key, value in variants.items()}
+
+    def update_reference_record(self, value):
+        assert type(value) is str, "record must be a string"
+        assert NAME_PATTERN.match(value), "record must match the regex"
+        self.properties['record'] = value
+
+def make_node(type_, arguments):
+    # Used to unpickle nodes (see Node.__reduce__()).
+    return Node(type_, **arguments)
@@ -6,45 +6,50 @@
 #
 # Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
 
-import re
 import json
-from byteplug.document.node import Node
-from byteplug.document.utility import read_minimum_value, read_maximum_value
+from byteplug.document.specs import normalize_specs
 from byteplug.document.utility import check_length
-from byteplug.document.exception import ValidationError
+from byteplug.document.pattern import NAME_PATTERN
+from byteplug.document.pattern import BacktrackingPattern
+from byteplug.document.traversal import traverse
+from byteplug.document.exception import ErrorCode, ErrorRecord
 
 # Notes:
 # - This module handles validation and conversion from Python object to JSON
 #   document. It must be kept in sync with the 'document' module.
 # - In all process_<type>_node(), it's about converting and adjusting a Python
 #   node/value so it gets converted to the right JSON type later (see the
-#   'json' module).
+#   'json' module). Children of container nodes are adjusted later by the
+#   traversal engine (see the 'traversal' module).
 # - For each node type, we refer to the standard document that describes how
 #   the augmented type is implemented in its JSON form; we care about validity
 #   of its JSON form, its Python form is not defined by the standard.
+# - The modules of the optional features (the other formats, the deep JSON
+#   serializer, summaries and profiling) are only imported when they're used
+#   (see the 'document' module).
 
 __all__ = ['object_to_document']
 
-def process_flag_node(path, node, specs, errors, warnings):
+def process_flag_node(path, node, specs, errors, warnings, tasks):
     if type(node) is not bool:
-        error = ValidationError(path, "was expecting a boolean")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a boolean")
         errors.append(error)
         return
 
     return node
 
-def process_number_node(path, node, specs, errors, warnings):
-    decimal = specs.get('decimal', True)
-    minimum = read_minimum_value(specs)
-    maximum = read_maximum_value(specs)
+def process_number_node(path, node, specs, errors, warnings, tasks):
+    decimal = specs['decimal']
+    minimum = specs['minimum']
+    maximum = specs['maximum']
 
     if type(node) not in (int, float):
-        error = ValidationError(path, "was expecting an integer or float")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "an integer or float")
         errors.append(error)
         return
 
     if decimal == False and type(node) is float:
-        error = ValidationError(path, "was expecting non-decimal number")
+        error = ErrorRecord(path, ErrorCode.DECIMAL_NUMBER)
         errors.append(error)
         return
 
@@ -55,11 +60,11 @@ def process_number_node(path, node, specs, errors, warnings):
 
         if is_exclusive:
             if not (node > value):
-                error = ValidationError(path, f"value must be strictly greater than {value}")
+                error = ErrorRecord(path, ErrorCode.EXCLUSIVE_MINIMUM, value)
                 node_errors.append(error)
         else:
             if not (node >= value):
-                error = ValidationError(path, f"value must be equal or greater than {value}")
+                error = ErrorRecord(path, ErrorCode.MINIMUM, value)
                 node_errors.append(error)
 
     if maximum:
@@ -67,11 +72,11 @@ def process_number_node(path, node, specs, errors, warnings):
 
         if is_exclusive:
             if not (node < value):
-                error = ValidationError(path, f"value must be strictly lower than {value}")
+                error = ErrorRecord(path, ErrorCode.EXCLUSIVE_MAXIMUM, value)
                 node_errors.append(error)
         else:
             if not (node <= value):
-                error = ValidationError(path, f"value must be equal or lower than {value}")
+                error = ErrorRecord(path, ErrorCode.MAXIMUM, value)
                 node_errors.append(error)
 
     if len(node_errors) > 0:
@@ -80,21 +85,28 @@ def process_number_node(path, node, specs, errors, warnings):
 
     return node
 
-def process_string_node(path, node, specs, errors, warnings):
+def process_string_node(path, node, specs, errors, warnings, tasks):
     if type(node) is not str:
-        error = ValidationError(path, "was expecting a string")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a string")
         errors.append(error)
         return
 
     node_errors = []
 
-    length = specs.get('length')
-    check_length(len(node), length, path, errors, warnings)
+    errors_count = len(errors)
+    length = specs['length']
+    if length is not None:
+        check_length(len(node), length, path, errors)
 
-    pattern = specs.get('pattern')
+    pattern = specs['pattern']
     if pattern is not None:
-        if not re.match(pattern, node):
-            error = ValidationError(path, "value did not match the pattern")
+        # A vulnerable pattern evaluated by the backtracking engine is only
+        # evaluated against strings of a valid length (see the 'pattern'
+        # module).
+        if type(pattern) is BacktrackingPattern and len(errors) > errors_count:
+            pass
+        elif not pattern.match(node):
+            error = ErrorRecord(path, ErrorCode.PATTERN_MISMATCH)
             node_errors.append(error)
 
     if len(node_errors) > 0:
@@ -103,136 +115,188 @@ def process_string_node(path, node, specs, errors, warnings):
 
     return node
 
-def process_array_node(path, node, specs, errors, warnings):
+def process_array_node(path, node, specs, errors, warnings, tasks):
     value = specs['value']
 
     if type(node) is not list:
-        error = ValidationError(path, "was expecting a list")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a list")
         errors.append(error)
         return
 
-    length = specs.get('length')
-    check_length(len(node), length, path, errors, warnings)
+    length = specs['length']
+    if length is not None:
+        check_length(len(node), length, path, errors)
 
-    adjusted_node = []
-    for (index, item) in enumerate(node):
-        adjusted_item = adjust_node(path + ['[' + str(index) + ']'], item, value, errors, warnings)
-        adjusted_node.append(adjusted_item)
+    # Items are adjusted later (see the 'traversal' module).
+    depth = path[3] + 1
+    adjusted_node = [None] * len(node)
+    for index in range(len(node) - 1, -1, -1):
+        tasks.append(((path, '[', index, depth), node[index], value, adjusted_node, index))
 
     return adjusted_node
 
-def process_object_node(path, node, specs, errors, warnings):
+def process_object_node(path, node, specs, errors, warnings, tasks, native_keys=False):
     key = specs['key']
     value = specs['value']
 
     if type(node) is not dict:
-        error = ValidationError(path, "was expecting a dict")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a dict")
         errors.append(error)
         return
 
-    length = specs.get('length')
-    check_length(len(node), length, path, errors, warnings)
+    length = specs['length']
+    if length is not None:
+        check_length(len(node), length, path, errors)
 
+    depth = path[3] + 1
     adjusted_node = {}
+    node_tasks = []
     for (index, item) in enumerate(node.items()):
         if key == 'integer':
             if type(item[0]) is not int:
-                error = ValidationError(path, f"key at index {index} is invalid; expected it to be an integer")
-                errors.append(error)
+                error = ErrorRecord(path, ErrorCode.INTEGER_KEY, index)
+                node_tasks.append((errors.append, (error,)))
                 continue
 
-            node_key = str(item[0])
+            # Keys remain integers in the MessagePack and CBOR formats.
+            node_key = item[0] if native_keys else str(item[0])
 
         elif key == 'string':
             # Keys are restricted by a given pattern; check value against it.
             # If it doesn't pass the test, the JSON document is invalid.
-            if not re.match(r"^[a-zA-Z0-9\-\_]+$", item[0]):
-                error = ValidationError(path, f"key at index {index} is invalid; expected to match the pattern")
-                errors.append(error)
+            if not NAME_PATTERN.match(item[0]):
+                error = ErrorRecord(path, ErrorCode.STRING_KEY, index)
+                node_tasks.append((errors.append, (error,)))
                 continue
 
             node_key = item[0]
 
-        adjusted_value = adjust_node(path + ['{' + str(item[0]) + '}'], item[1], value, errors, warnings)
-        adjusted_node[node_key] = adjusted_value
+        adjusted_node[node_key] = None
+        node_tasks.append(((path, '{', item[0], depth), item[1], value, adjusted_node, node_key))
+
+    node_tasks.reverse()
+    tasks.extend(node_tasks)
 
     return adjusted_node
 
-def process_tuple_node(path, node, specs, errors, warnings):
+def process_tuple_node(path, node, specs, errors, warnings, tasks):
     items = specs['items']
 
     if type(node) is not tuple:
-        error = ValidationError(path, "was expecting a tuple")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a tuple")
         errors.append(error)
         return
 
     if len(node) != len(items):
-        error = ValidationError(path, f"length of the tuple must be {len(items)}")
+        error = ErrorRecord(path, ErrorCode.TUPLE_LENGTH, len(items))
         errors.append(error)
         return
 
-    adjusted_node = []
-    for (index, item) in enumerate(node):
-        adjusted_item = adjust_node(path + ['<' + str(index) + '>'], item, items[index], errors, warnings)
-        adjusted_node.append(adjusted_item)
+    depth = path[3] + 1
+    adjusted_node = [None] * len(node)
+    for index in range(len(node) - 1, -1, -1):
+        tasks.append(((path, '<', index, depth), node[index], items[index], adjusted_node, index))
 
     return adjusted_node
 
-def process_map_node(path, node, specs, errors, warnings):
+def process_map_node(path, node, specs, errors, warnings, tasks):
     fields = specs['fields']
 
     if type(node) is not dict:
-        error = ValidationError(path, "was expecting a dict")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a dict")
         errors.append(error)
         return
 
-    for key in node.keys():
+    # A valid node is checked in one pass; its fields are counted and the
+    # missing ones are only looked for when the counts don't match (see the
+    # tables of the map specs in normalize_specs()).
+    required = specs['required']
+    depth = path[3] + 1
+    adjusted_node = {}
+    node_tasks = []
+    fields_count = 0
+    required_count = 0
+    for key, value in node.items():
         if type(key) is not str:
-            error = ValidationError(path, "keys of the dict must be string exclusively")
+            error = ErrorRecord(path, ErrorCode.NON_STRING_KEYS)
             errors.append(error)
             return
 
-    node_errors = []
-
-    adjusted_node = {}
-    for key, value in node.items():
-        if key in fields.keys():
-            adjusted_node[key] = adjust_node(path + ['$' + key], value, fields[key], errors, warnings)
-        else:
-            error = ValidationError(path, f"'{key}' field was unexpected")
-            errors.append(error)
+        field = fields.get(key)
+        if field is not None:
+            fields_count += 1
+            if key in required:
+                required_count += 1
 
-    missing_keys = set(fields.keys()) - set(adjusted_node.keys())
-    for key in missing_keys:
-        if not fields[key].get('option', False):
-            error = ValidationError(path, f"'{key}' field was missing")
-            errors.append(error)
-        else:
-            # We insert a 'null' value when the key is missing and the item is
-            # optional.
             adjusted_node[key] = None
-
-
-    if len(node_errors) > 0:
-        errors.extend(node_errors)
-        return
+            node_tasks.append(((path, '$', key, depth), value, field, adjusted_node, key))
+        else:
+            error = ErrorRecord(path, ErrorCode.UNEXPECTED_FIELD, key)
+            node_tasks.append((errors.append, (error,)))
+
+    if fields_count < len(fields):
+        # Missing fields are reported after the errors of the fields,
+        # therefore they're reported by the last task of this node (which is
+        # pushed first).
+        if required_count < len(required):
+            missing_errors = []
+            for key in fields.keys():
+                if key in required and key not in node:
+                    error = ErrorRecord(path, ErrorCode.MISSING_FIELD, key)
+                    missing_errors.append(error)
+
+            tasks.append((errors.extend, (missing_errors,)))
+
+        # We insert a 'null' value when the key is missing and the item is
+        # optional.
+        for key in specs['optional']:
+            if key not in node:
+                adjusted_node[key] = None
+
+    node_tasks.reverse()
+    tasks.extend(node_tasks)
 
     return adjusted_node
 
-def process_enum_node(path, node, specs, errors, warnings):
+def process_enum_node(path, node, specs, errors, warnings, tasks):
     if type(node) is not str:
-        error = ValidationError(path, "was expecting a string")
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a string")
         errors.append(error)
         return
 
     values = specs['values']
     if node not in values:
-        error = ValidationError(path, "enum value is invalid")
+        error = ErrorRecord(path, ErrorCode.ENUM_VALUE)
         errors.append(error)
         return
 
     return node
 
+def process_union_node(path, node, specs, errors, warnings, tasks):
+    discriminator = specs['discriminator']
+
+    if type(node) is not dict:
+        error = ErrorRecord(path, ErrorCode.INVALID_TYPE, "a dict")
+        errors.append(error)
+        return
+
+    # The variant is looked up by the value of the discriminator field, then
+    # the node is processed by its 'map' node (which also checks the
+    # discriminator field).
+    value = node.get(discriminator)
+    if value is None:
+        error = ErrorRecord(path, ErrorCode.MISSING_FIELD, discriminator)
+        errors.append(error)
+        return
+
+    variant = specs['variants'].get(value) if type(value) is str else None
+    if variant is None:
+        error = ErrorRecord(path, ErrorCode.UNION_VARIANT, discriminator)
+        errors.append(error)
+        return
+
+    return process_map_node(path, node, variant, errors, warnings, tasks)
+
 adjust_node_map = {
     'flag'   : process_flag_node,
     'number' : process_number_node,
@@ -241,26 +305,43 @@ adjust_node_map = {
     'object' : process_object_node,
     'tuple'  : process_tuple_node,
     'map'    : process_map_node,
-    'enum'   : process_enum_node
+    'enum'   : process_enum_node,
+    'union'  : process_union_node
 }
 
-def adjust_node(path, node, specs, errors, warnings):
-    # We accept a None value if the type is marked as optional.
-    optional = specs.get('option', False)
-    if optional and node is None:
-        return None
+def process_native_object_node(path, node, specs, errors, warnings, tasks):
+    return process_object_node(path, node, specs, errors, warnings, tasks, True)
 
-    return adjust_node_map[specs['type']](path, node, specs, errors, warnings)
+# The MessagePack and CBOR formats support integer keys.
+native_node_map = adjust_node_map | {
+    'object': process_native_object_node
+}
+
+def object_to_document(object, specs, errors=None, warnings=None, no_dump=False, profiler=None, format='json'):
+    """ Convert Python object to its JSON equivalent.
+
+    To aggregate the errors rather than collecting them all, pass an
+    ErrorSummary object as the errors parameter. To collect statistics about
+    the nodes of the specs, pass a Profiler object.
 
-def object_to_document(object, specs, errors=None, warnings=None, no_dump=False):
-    """ Convert Python object to its JSON equivalent. """
+    To produce a MessagePack or CBOR document (bytes), set the 'format'
+    parameter to 'msgpack' or 'cbor'; the keys of 'object' nodes are kept
+    as integers if their specs says so.
 
-    if type(specs) is Node:
-        specs = specs.to_object()
+    The specs are used in their canonical form; on hot paths, normalize them
+    once (see normalize_specs()) and pass the result. Dict specs must not be
+    modified once they're passed.
+    """
+
+    # Specs are used in their canonical form (see normalize_specs()).
+    specs = normalize_specs(specs)
 
     # Assume specs is valid (Python object form)
 
-    assert errors is None or errors == [], "if the errors parameter is set, it must be an empty list"
+    if errors is not None and type(errors) is not list:
+        from byteplug.document.summary import ErrorSummary
+        assert type(errors) is ErrorSummary, "if the errors parameter is set, it must be a list or a summary"
+    assert errors is None or len(errors) == 0, "if the errors parameter is set, it must be an empty list or an empty summary"
     assert warnings is None or warnings == [], "if the warnings parameter is set, it must be an empty list"
 
     # We detect if users want lazy validation when they pass an empty list as
@@ -274,13 +355,33 @@ def object_to_document(object, specs, errors=None, warnings=None, no_dump=False)
     if warnings is None:
         warnings = []
 
-    document = adjust_node([], object, specs, errors, warnings)
-    dumped_document = json.dumps(document)
+    if format != 'json':
+        from byteplug.document import formats
+        assert format in formats.FORMATS, f"format must be one of {', '.join(formats.FORMATS)}"
+
+    node_map = adjust_node_map if format == 'json' else native_node_map
+    if profiler is None:
+        document = traverse(object, specs, node_map, errors, warnings)
+    else:
+        from byteplug.document.profiler import traverse_profiled
+        document = traverse_profiled(object, specs, node_map, errors, warnings, profiler)
+
+    if no_dump:
+        dumped_document = None
+    elif format != 'json':
+        dumped_document = formats.dumps(document, format)
+    else:
+        try:
+            dumped_document = json.dumps(document)
+        except RecursionError:
+            # The document is too deep for the 'json' module.
+            from byteplug.document import deepjson
+            dumped_document = deepjson.dumps(document)
 
     # If we're not lazy-validating the specs, we raise the first error that
     # occurred.
     if not lazy_validation and len(errors) > 0:
-        raise errors[0]
+        raise errors[0].to_exception()
 
     if no_dump:
         return document
@@ -0,0 +1,664 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import re
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+from byteplug.document.utility import remember
+
+# Notes:
+# - This module keeps the compiled form of the regexes used during the
+#   validation of specs and documents so they're compiled only once. Relying
+#   on the 're' module internal cache isn't enough; it's limited to a few
+#   hundred entries and starts thrashing when an application defines more
+#   patterns than that. The cache is bounded as well, but much larger (see
+#   the MEMO_SIZE constant of the 'utility' module).
+# - Patterns are compiled when the specs are validated (see the 'specs'
+#   module), therefore converting a document never compiles a pattern unless
+#   the specs were not validated beforehand.
+# - Patterns are user-supplied and evaluated against untrusted strings, and
+#   the 're' module is a backtracking engine; some patterns (for instance
+#   '^(a+)+$') take exponential time on crafted input. To bound the time spent
+#   matching, the patterns detected as vulnerable are evaluated by the
+#   linear-time engine implemented in this module, as long as they only use
+#   the subset of the syntax it supports. Other patterns are always evaluated
+#   by the 're' module.
+# - The 're2' module (if installed) evaluates vulnerable patterns faster than
+#   the linear-time engine, but it doesn't interpret all constructs like the
+#   're' module does (for instance, '\d' and '\w' only match ASCII characters
+#   and '$' doesn't match before a trailing newline). It's only used for the
+#   patterns made of constructs both modules interpret the same way (a
+#   trailing '$' is translated), so the matching semantics don't depend on
+#   whether it's installed.
+# - The detection of vulnerable patterns is a heuristic; it looks for
+#   repetitions whose iterations can be split in more than one way (nested
+#   quantifiers, overlapping alternatives) and it's not exhaustive.
+
+__all__ = [
+    'NAME_PATTERN',
+    'compile_pattern',
+    'is_vulnerable_pattern',
+    'LinearPattern',
+    'BacktrackingPattern',
+    'Re2Pattern'
+]
+
+# Pattern that keys of 'map' and 'object' nodes, and values of 'enum' nodes,
+# must match.
+NAME_PATTERN = re.compile(r"^[a-zA-Z0-9\-\_]+$")
+
+LITERAL = sre_constants.LITERAL
+NOT_LITERAL = sre_constants.NOT_LITERAL
+ANY = sre_constants.ANY
+IN = sre_constants.IN
+RANGE = sre_constants.RANGE
+NEGATE = sre_constants.NEGATE
+CATEGORY = sre_constants.CATEGORY
+AT = sre_constants.AT
+BRANCH = sre_constants.BRANCH
+SUBPATTERN = sre_constants.SUBPATTERN
+MAX_REPEAT = sre_constants.MAX_REPEAT
+MIN_REPEAT = sre_constants.MIN_REPEAT
+ASSERT = sre_constants.ASSERT
+ASSERT_NOT = sre_constants.ASSERT_NOT
+MAXREPEAT = sre_constants.MAXREPEAT
+
+# Those two operators were added in Python 3.11.
+POSSESSIVE_REPEAT = getattr(sre_constants, 'POSSESSIVE_REPEAT', None)
+ATOMIC_GROUP = getattr(sre_constants, 'ATOMIC_GROUP', None)
+
+REPEATS = (MAX_REPEAT, MIN_REPEAT)
+
+def is_word_character(character):
+    return character.isalnum() or character == '_'
+
+CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT    : (str.isdecimal, False),
+    sre_constants.CATEGORY_NOT_DIGIT: (str.isdecimal, True),
+    sre_constants.CATEGORY_SPACE    : (str.isspace, False),
+    sre_constants.CATEGORY_NOT_SPACE: (str.isspace, True),
+    sre_constants.CATEGORY_WORD     : (is_word_character, False),
+    sre_constants.CATEGORY_NOT_WORD : (is_word_character, True)
+}
+
+class UnsupportedPattern(Exception):
+    pass
+
+# Character sets are approximated by the set of ASCII characters they contain
+# and a flag telling whether they contain non-ASCII characters; it's enough to
+# tell whether two sets overlap.
+ASCII_CHARACTERS = frozenset(range(128))
+NO_CHARACTERS = (frozenset(), False)
+ALL_CHARACTERS = (ASCII_CHARACTERS, True)
+
+def category_characters(category):
+    function, negated = CATEGORIES[category]
+    characters = frozenset(c for c in range(128) if function(chr(c)))
+    if negated:
+        characters = ASCII_CHARACTERS - characters
+
+    return (characters, True)
+
+def set_characters(items):
+    ascii, non_ascii, negated = set(), False, False
+    for op, av in items:
+        if op is NEGATE:
+            negated = True
+        elif op is LITERAL:
+            if av < 128:
+                ascii.add(av)
+            else:
+                non_ascii = True
+        elif op is RANGE:
+            ascii.update(range(av[0], min(av[1], 127) + 1))
+            non_ascii = non_ascii or av[1] >= 128
+        elif op is CATEGORY and av in CATEGORIES:
+            characters = category_characters(av)
+            ascii.update(characters[0])
+            non_ascii = non_ascii or characters[1]
+        else:
+            return ALL_CHARACTERS
+
+    if negated:
+        return (ASCII_CHARACTERS - ascii, True)
+
+    return (frozenset(ascii), non_ascii)
+
+def union_characters(a, b):
+    return (a[0] | b[0], a[1] or b[1])
+
+def overlap_characters(a, b):
+    return bool(a[0] & b[0]) or (a[1] and b[1])
+
+def item_characters(op, av):
+    # Return all characters the item can possibly consume.
+    if op is LITERAL:
+        return (frozenset([av]), False) if av < 128 else (frozenset(), True)
+    elif op is NOT_LITERAL:
+        return (ASCII_CHARACTERS - {av}, True)
+    elif op is ANY:
+        return ALL_CHARACTERS
+    elif op is IN:
+        return set_characters(av)
+    elif op in REPEATS or op is POSSESSIVE_REPEAT:
+        return sequence_characters(av[2])
+    elif op is SUBPATTERN:
+        return sequence_characters(av[-1])
+    elif op is ATOMIC_GROUP:
+        return sequence_characters(av)
+    elif op is BRANCH:
+        characters = NO_CHARACTERS
+        for alternative in av[1]:
+            characters = union_characters(characters, sequence_characters(alternative))
+        return characters
+    elif op in (AT, ASSERT, ASSERT_NOT):
+        return NO_CHARACTERS
+    else:
+        return ALL_CHARACTERS
+
+def sequence_characters(items):
+    characters = NO_CHARACTERS
+    for op, av in items:
+        characters = union_characters(characters, item_characters(op, av))
+
+    return characters
+
+def sequence_width(items):
+    minimum, maximum = 0, 0
+    for op, av in items:
+        item_minimum, item_maximum = item_width(op, av)
+        minimum += item_minimum
+        maximum = min(maximum + item_maximum, MAXREPEAT)
+
+    return (minimum, maximum)
+
+def item_width(op, av):
+    if op in (LITERAL, NOT_LITERAL, ANY, IN):
+        return (1, 1)
+    elif op in REPEATS or op is POSSESSIVE_REPEAT:
+        minimum, maximum = sequence_width(av[2])
+        return (av[0] * minimum, min(av[1] * maximum, MAXREPEAT))
+    elif op is SUBPATTERN:
+        return sequence_width(av[-1])
+    elif op is ATOMIC_GROUP:
+        return sequence_width(av)
+    elif op is BRANCH:
+        widths = [sequence_width(alternative) for alternative in av[1]]
+        return (min(w[0] for w in widths), max(w[1] for w in widths))
+    elif op in (AT, ASSERT, ASSERT_NOT):
+        return (0, 0)
+    else:
+        return (0, MAXREPEAT)
+
+def sequence_first_characters(items, reverse=False):
+    # Return the characters the sequence can start (or end) with.
+    characters = NO_CHARACTERS
+    for op, av in (reversed(items) if reverse else items):
+        if op in REPEATS or op is POSSESSIVE_REPEAT:
+            item_characters_ = sequence_first_characters(av[2], reverse)
+        elif op is SUBPATTERN:
+            item_characters_ = sequence_first_characters(av[-1], reverse)
+        elif op is BRANCH:
+            item_characters_ = NO_CHARACTERS
+            for alternative in av[1]:
+                alternative_characters = sequence_first_characters(alternative, reverse)
+                item_characters_ = union_characters(item_characters_, alternative_characters)
+        else:
+            item_characters_ = item_characters(op, av)
+
+        characters = union_characters(characters, item_characters_)
+        if item_width(op, av)[0] > 0:
+            break
+
+    return characters
+
+def unwrap_group(items):
+    while len(items) == 1 and items[0][0] is SUBPATTERN:
+        items = items[0][1][-1]
+
+    return items
+
+def is_ambiguous_repeat(body):
+    items = unwrap_group(list(body))
+
+    # An iteration of the repeat whose width varies is ambiguous unless it's
+    # delimited by a mandatory item that can't consume the same characters
+    # as the variable part (for instance, '(-[a-z]+)*' is safe but '(a+)+'
+    # and '(\w+\s?)*' are not).
+    for op, av in items:
+        minimum, maximum = item_width(op, av)
+        if minimum == maximum:
+            continue
+
+        characters = item_characters(op, av)
+
+        is_delimited = False
+        for op_, av_ in items:
+            if item_width(op_, av_)[0] == 0:
+                continue
+
+            if not overlap_characters(item_characters(op_, av_), characters):
+                is_delimited = True
+                break
+
+        if not is_delimited:
+            return True
+
+    # Alternatives that can start and end with the same characters can
+    # typically match the same substrings (for instance, '(\w\d|\d\w)*').
+    for op, av in items:
+        if op is not BRANCH:
+            continue
+
+        alternatives = av[1]
+        for index, a in enumerate(alternatives):
+            for b in alternatives[index + 1:]:
+                first_overlap = overlap_characters(
+                    sequence_first_characters(a),
+                    sequence_first_characters(b)
+                )
+                last_overlap = overlap_characters(
+                    sequence_first_characters(a, reverse=True),
+                    sequence_first_characters(b, reverse=True)
+                )
+                if first_overlap and last_overlap:
+                    return True
+
+    return False
+
+def has_vulnerable_repeat(items):
+    for op, av in items:
+        if op in REPEATS:
+            if av[1] > 1 and is_ambiguous_repeat(av[2]):
+                return True
+            if has_vulnerable_repeat(av[2]):
+                return True
+        elif op is POSSESSIVE_REPEAT:
+            # Possessive repeats never backtrack into their iterations.
+            if has_vulnerable_repeat(av[2]):
+                return True
+        elif op is SUBPATTERN:
+            if has_vulnerable_repeat(av[-1]):
+                return True
+        elif op is BRANCH:
+            for alternative in av[1]:
+                if has_vulnerable_repeat(alternative):
+                    return True
+        elif op in (ASSERT, ASSERT_NOT):
+            if has_vulnerable_repeat(av[1]):
+                return True
+
+    return False
+
+def is_vulnerable_pattern(pattern):
+    """ Tell whether a pattern is subject to catastrophic backtracking.
+
+    The pattern is assumed to be a valid regex.
+    """
+
+    return has_vulnerable_repeat(sre_parse.parse(pattern))
+
+# The linear-time engine compiles the parsed pattern into a program which is
+# executed by simulating all possible threads in lockstep (as described by
+# Ken Thompson), thus never backtracking. Instructions are tuples whose first
+# element is the opcode.
+CHARACTER = 0
+SPLIT = 1
+JUMP = 2
+ASSERTION = 3
+MATCH = 4
+
+# Counted repetitions are expanded; this bounds the size of the program.
+MAXIMUM_EXPANSION = 100
+
+def compile_set(items):
+    characters = set()
+    ranges = []
+    categories = []
+    negated = False
+
+    for op, av in items:
+        if op is NEGATE:
+            negated = True
+        elif op is LITERAL:
+            characters.add(chr(av))
+        elif op is RANGE:
+            ranges.append(av)
+        elif op is CATEGORY and av in CATEGORIES:
+            categories.append(CATEGORIES[av])
+        else:
+            raise UnsupportedPattern
+
+    def predicate(character):
+        if character in characters:
+            return not negated
+
+        if ranges:
+            code = ord(character)
+            for low, high in ranges:
+                if low <= code <= high:
+                    return not negated
+
+        for function, negated_ in categories:
+            if function(character) != negated_:
+                return not negated
+
+        return negated
+
+    return predicate
+
+def compile_items(items, program):
+    for op, av in items:
+        if op is LITERAL:
+            character = chr(av)
+            program.append((CHARACTER, character.__eq__))
+        elif op is NOT_LITERAL:
+            character = chr(av)
+            program.append((CHARACTER, character.__ne__))
+        elif op is ANY:
+            program.append((CHARACTER, '\n'.__ne__))
+        elif op is IN:
+            program.append((CHARACTER, compile_set(av)))
+        elif op is AT:
+            program.append((ASSERTION, av))
+        elif op is SUBPATTERN:
+            if av[1] or av[2]:
+                # Local flags are not supported.
+                raise UnsupportedPattern
+            compile_items(av[-1], program)
+        elif op is BRANCH:
+            # split L1, L2; L1: a; jump END; L2: split L2', L3; ...
+            jumps = []
+            alternatives = av[1]
+            for index, alternative in enumerate(alternatives):
+                if index < len(alternatives) - 1:
+                    split = len(program)
+                    program.append(None)
+                    compile_items(alternative, program)
+                    jumps.append(len(program))
+                    program.append(None)
+                    program[split] = (SPLIT, split + 1, len(program))
+                else:
+                    compile_items(alternative, program)
+
+            for jump in jumps:
+                program[jump] = (JUMP, len(program))
+
+        elif op in REPEATS:
+            # Laziness doesn't change whether the string matches.
+            minimum, maximum, body = av
+            if minimum > MAXIMUM_EXPANSION:
+                raise UnsupportedPattern
+
+            for _ in range(minimum):
+                compile_items(body, program)
+
+            if maximum == MAXREPEAT:
+                split = len(program)
+                program.append(None)
+                compile_items(body, program)
+                program.append((JUMP, split))
+                program[split] = (SPLIT, split + 1, len(program))
+            else:
+                if maximum - minimum > MAXIMUM_EXPANSION:
+                    raise UnsupportedPattern
+
+                splits = []
+                for _ in range(maximum - minimum):
+                    splits.append(len(program))
+                    program.append(None)
+                    compile_items(body, program)
+
+                for split in splits:
+                    program[split] = (SPLIT, split + 1, len(program))
+        else:
+            # Back-references, lookarounds, atomic groups and possessive
+            # repeats can't be evaluated by this engine.
+            raise UnsupportedPattern
+
+def check_assertion(kind, string, index):
+    if kind is sre_constants.AT_BEGINNING or kind is sre_constants.AT_BEGINNING_STRING:
+        return index == 0
+    elif kind is sre_constants.AT_END:
+        return index == len(string) or (index == len(string) - 1 and string[index] == '\n')
+    elif kind is sre_constants.AT_END_STRING:
+        return index == len(string)
+    elif kind is sre_constants.AT_BOUNDARY or kind is sre_constants.AT_NON_BOUNDARY:
+        before = index > 0 and is_word_character(string[index - 1])
+        after = index < len(string) and is_word_character(string[index])
+        return (before != after) == (kind is sre_constants.AT_BOUNDARY)
+    else:
+        raise UnsupportedPattern
+
+class LinearPattern:
+    """ Pattern evaluated in linear time.
+
+    Only a subset of the regex syntax is supported; back-references,
+    lookarounds, atomic groups, possessive repeats and flags are not. The
+    UnsupportedPattern exception is raised if the pattern uses them.
+    """
+
+    __slots__ = ('pattern', 'program')
+
+    def __init__(self, pattern):
+        flags = re.compile(pattern).flags
+        if flags & ~re.UNICODE:
+            raise UnsupportedPattern
+
+        program = []
+        compile_items(sre_parse.parse(pattern), program)
+        program.append((MATCH,))
+
+        self.pattern = pattern
+        self.program = program
+
+        # Make sure all assertions are supported now rather than while
+        # matching.
+        for instruction in program:
+            if instruction[0] == ASSERTION:
+                check_assertion(instruction[1], "", 0)
+
+    def __reduce__(self):
+        # The program has closures; it's compiled again instead.
+        return (compile_pattern, (self.pattern,))
+
+    def add_thread(self, threads, pc, string, index):
+        # Follow all the instructions that don't consume a character, the
+        # resulting threads are all waiting on a character (or matched).
+        program = self.program
+        stack = [pc]
+        while stack:
+            pc = stack.pop()
+            if pc in threads:
+                continue
+            threads[pc] = None
+
+            instruction = program[pc]
+            opcode = instruction[0]
+            if opcode == JUMP:
+                stack.append(instruction[1])
+            elif opcode == SPLIT:
+                stack.append(instruction[2])
+                stack.append(instruction[1])
+            elif opcode == ASSERTION:
+                if check_assertion(instruction[1], string, index):
+                    stack.append(pc + 1)
+
+    def match(self, string):
+        """ Tell whether the beginning of the string matches the pattern. """
+
+        program = self.program
+
+        threads = {}
+        self.add_thread(threads, 0, string, 0)
+
+        for index, character in enumerate(string):
+            next_threads = {}
+            for pc in threads:
+                instruction = program[pc]
+                if instruction[0] == MATCH:
+                    return True
+                elif instruction[0] == CHARACTER and instruction[1](character):
+                    self.add_thread(next_threads, pc + 1, string, index + 1)
+
+            if not next_threads:
+                return False
+
+            threads = next_threads
+
+        for pc in threads:
+            if program[pc][0] == MATCH:
+                return True
+
+        return False
+
+class BacktrackingPattern:
+    """ Vulnerable pattern evaluated by the backtracking engine.
+
+    It's used when a pattern detected as vulnerable can't be evaluated in
+    linear time; converters must not evaluate it if the length of the string
+    is already invalid.
+    """
+
+    __slots__ = ('pattern', 'match')
+
+    def __init__(self, compiled_pattern):
+        self.pattern = compiled_pattern.pattern
+        self.match = compiled_pattern.match
+
+    def __reduce__(self):
+        return (compile_pattern, (self.pattern,))
+
+# Unlike the 're' module, the 're2' module doesn't support lone surrogates;
+# such strings are evaluated by the fallback pattern (a LinearPattern).
+class Re2Pattern:
+    """ Vulnerable pattern evaluated by the 're2' module. """
+
+    __slots__ = ('pattern', 'compiled_pattern', 'fallback_pattern')
+
+    def __init__(self, pattern, compiled_pattern, fallback_pattern):
+        self.pattern = pattern
+        self.compiled_pattern = compiled_pattern
+        self.fallback_pattern = fallback_pattern
+
+    def __reduce__(self):
+        return (compile_pattern, (self.pattern,))
+
+    def match(self, string):
+        """ Tell whether the beginning of the string matches the pattern. """
+
+        try:
+            return self.compiled_pattern.match(string) is not None
+        except UnicodeEncodeError:
+            return self.fallback_pattern.match(string)
+
+# Assertions both the 're' and 're2' modules interpret the same way; word
+# boundaries depend on the definition of word characters, and '$' also
+# matches before a trailing newline in the 're' module.
+PORTABLE_ASSERTIONS = (sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING)
+
+def is_portable_sequence(items):
+    for op, av in items:
+        if op in (LITERAL, NOT_LITERAL, ANY):
+            continue
+        elif op is IN:
+            if any(op_ not in (LITERAL, RANGE, NEGATE) for op_, _ in av):
+                return False
+        elif op in REPEATS:
+            if not is_portable_sequence(av[2]):
+                return False
+        elif op is SUBPATTERN:
+            # Flags set or cleared in the group.
+            if av[1] or av[2] or not is_portable_sequence(av[-1]):
+                return False
+        elif op is BRANCH:
+            for alternative in av[1]:
+                if not is_portable_sequence(alternative):
+                    return False
+        elif op is AT:
+            if av not in PORTABLE_ASSERTIONS:
+                return False
+        else:
+            return False
+
+    return True
+
+def translate_pattern(pattern):
+    """ Translate a pattern for the 're2' module.
+
+    None is returned if the pattern uses constructs the 're2' module
+    interprets differently. The pattern is assumed to be a valid regex.
+    """
+
+    parsed_pattern = sre_parse.parse(pattern)
+    if parsed_pattern.state.flags & ~sre_constants.SRE_FLAG_UNICODE:
+        return None
+
+    items = list(parsed_pattern)
+
+    # A trailing '$' matches at the end, or before a trailing newline.
+    suffix = ''
+    if items and items[-1] == (AT, sre_constants.AT_END) and pattern.endswith('$'):
+        items.pop()
+        pattern = pattern[:-1]
+        suffix = r'\n?\z'
+
+    if not is_portable_sequence(items):
+        return None
+
+    return pattern + suffix
+
+compiled_patterns = {}
+
+def compile_pattern(pattern):
+    """ Return the compiled form of a pattern.
+
+    The pattern is compiled on first use and cached (the oldest patterns are
+    evicted when the cache is full). The re.error exception is raised if the
+    pattern is invalid.
+
+    The returned object has a match() method like compiled patterns of the
+    're' module. Vulnerable patterns are compiled for the linear-time engine,
+    or they're wrapped into a BacktrackingPattern object if they use an
+    unsupported construct. If the 're2' module is installed, vulnerable
+    patterns it interprets like the 're' module are compiled with it instead
+    (see Re2Pattern).
+    """
+
+    compiled_pattern = compiled_patterns.get(pattern)
+    if compiled_pattern is None:
+        compiled_pattern = re.compile(pattern)
+
+        if is_vulnerable_pattern(pattern):
+            try:
+                compiled_pattern = LinearPattern(pattern)
+            except UnsupportedPattern:
+                compiled_pattern = BacktrackingPattern(compiled_pattern)
+
+            if re2 is not None and type(compiled_pattern) is LinearPattern:
+                translated_pattern = translate_pattern(pattern)
+                if translated_pattern is not None:
+                    try:
+                        compiled_pattern = Re2Pattern(pattern, re2.compile(translated_pattern), compiled_pattern)
+                    except Exception:
+                        pass
+
+        remember(compiled_patterns, pattern, compiled_pattern)
+
+    return compiled_pattern
@@ -0,0 +1,110 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import io
+import pickle
+from types import MappingProxyType
+from byteplug.document.pattern import compile_pattern
+
+# Notes:
+# - Normalized specs can be pickled with pickle_specs() (for instance, to send
+#   them to the workers of a ProcessPoolExecutor) and unpickled with the
+#   'pickle' module. The MappingProxyType type isn't registered with the
+#   'copyreg' module (that would change how all proxies of the process are
+#   pickled), the SpecsPickler class reduces them instead. Therefore only
+#   pickle_specs() can pickle them; pickle.dumps() raises TypeError, and so
+#   do ProcessPoolExecutor and multiprocessing when normalized specs are
+#   passed to the workers as is. The pickle module
+#   is recursive and specs may be nested deeper than the recursion limit,
+#   therefore a proxy is pickled as a flat table of the dicts reachable from
+#   it, in which proxies are replaced by their index in the table (shared
+#   subtrees and the cycles of recursive records are preserved).
+
+__all__ = ['pickle_specs']
+
+def flatten_mapping(mapping):
+    # Return a list of (items, links) tuples, one for each proxy reachable
+    # from the mapping (starting with it); values that are proxies (or tuples
+    # of proxies) are replaced by None in the items and are listed in the
+    # links as (key, index) tuples (the index of a tuple of proxies is a
+    # tuple of indexes).
+    indexes = {id(mapping): 0}
+    proxies = [mapping]
+
+    def link(proxy):
+        if id(proxy) not in indexes:
+            indexes[id(proxy)] = len(proxies)
+            proxies.append(proxy)
+        return indexes[id(proxy)]
+
+    table = []
+    for proxy in proxies:
+        items, links = {}, []
+        for key, value in proxy.items():
+            if type(value) is MappingProxyType:
+                items[key] = None
+                links.append((key, link(value)))
+            elif type(value) is tuple and len(value) > 0 and type(value[0]) is MappingProxyType:
+                items[key] = None
+                links.append((key, tuple(link(item) for item in value)))
+            else:
+                items[key] = value
+
+        table.append((items, links))
+
+    return table
+
+def unflatten_mapping(table):
+    proxies = [MappingProxyType(items) for items, _ in table]
+    for items, links in table:
+        for key, index in links:
+            if type(index) is tuple:
+                items[key] = tuple(proxies[item] for item in index)
+            else:
+                items[key] = proxies[index]
+
+    return proxies[0]
+
+def reduce_mapping(mapping):
+    return (unflatten_mapping, (flatten_mapping(mapping),))
+
+class SpecsPickler(pickle.Pickler):
+    """ Pickler of normalized specs (see pickle_specs()). """
+
+    def reducer_override(self, value):
+        # Compiled patterns of the 're' module are compiled again
+        # by compile_pattern() as well, so it caches them.
+        if type(value) is MappingProxyType:
+            return reduce_mapping(value)
+        elif hasattr(value, 'match') and hasattr(value, 'pattern'):
+            return (compile_pattern, (value.pattern,))
+        else:
+            return NotImplemented
+
+def pickle_specs(specs, file=None):
+    """ Pickle normalized specs.
+
+    The pickled specs (bytes) are returned, or written to the file if it's
+    set; they're unpickled with the 'pickle' module (for instance,
+    pickle.loads()). Values of the specs other than the normalized specs are
+    pickled as usual.
+
+    Only this function can pickle normalized specs, pickle.dumps() raises
+    TypeError. It's also the case for ProcessPoolExecutor and the
+    'multiprocessing' module, which pickle the arguments of the workers with
+    the 'pickle' module; pass them the bytes returned by this function (and
+    call pickle.loads() in the workers), or the specs before normalization.
+    """
+
+    if file is not None:
+        SpecsPickler(file, pickle.HIGHEST_PROTOCOL).dump(specs)
+        return
+
+    buffer = io.BytesIO()
+    SpecsPickler(buffer, pickle.HIGHEST_PROTOCOL).dump(specs)
+    return buffer.getvalue()
@@ -0,0 +1,187 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+from time import perf_counter
+from byteplug.document.traversal import ROOT_PATH, normalize_location
+from byteplug.document.traversal import traverse
+
+# Notes:
+# - A Profiler object can be passed to the converters to find out which nodes
+#   of the specs are costly. Nodes are identified by their normalized path
+#   (where indexes of arrays and keys of objects are replaced by '*'), and
+#   statistics are accumulated over all conversions using the profiler.
+# - When a profiler is passed, the document is walked by traverse_profiled()
+#   which passes the process_node() method of the profiler as the hook of the
+#   traversal engine (see the 'traversal' module).
+# - The time of a node is the time spent processing the node itself; its
+#   children are processed later by the engine. The cumulative time of a node
+#   includes the time of its descendants.
+# - Failures are attributed to the node the error refers to (for instance,
+#   missing fields are failures of the 'map' node).
+
+__all__ = ['Profiler', 'traverse_profiled']
+
+class NodeStatistics:
+    __slots__ = ('calls', 'time', 'failures', 'sizes', 'total_size', 'minimum_size', 'maximum_size')
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self.failures = 0
+        self.sizes = 0
+        self.total_size = 0
+        self.minimum_size = None
+        self.maximum_size = None
+
+    def add_size(self, size):
+        self.sizes += 1
+        self.total_size += size
+
+        if self.minimum_size is None or size < self.minimum_size:
+            self.minimum_size = size
+        if self.maximum_size is None or size > self.maximum_size:
+            self.maximum_size = size
+
+class ProfiledErrors:
+    # Wrap the list of errors (or the error summary) to count the failures of
+    # the nodes.
+    __slots__ = ('errors', 'profiler')
+
+    def __init__(self, errors, profiler):
+        self.errors = errors
+        self.profiler = profiler
+
+    def append(self, record):
+        self.profiler.statistics(record.location).failures += 1
+        self.errors.append(record)
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return len(self.errors)
+
+class Profiler:
+    """ Collect statistics about the nodes of the specs during conversions.
+
+    For each node, the number of times it was processed (calls), the time
+    spent processing it, the number of errors (failures) and the sizes (length
+    of strings, arrays and objects) seen are recorded.
+    """
+
+    __slots__ = ('nodes',)
+
+    def __init__(self):
+        self.nodes = {}
+
+    def statistics(self, location):
+        path = normalize_location(location)
+
+        statistics = self.nodes.get(path)
+        if statistics is None:
+            statistics = NodeStatistics()
+            self.nodes[path] = statistics
+
+        return statistics
+
+    def process_node(self, function, path, node, specs, errors, warnings, tasks):
+        # Hook of the traversal engine (see traverse_profiled()).
+        statistics = self.statistics(path)
+        statistics.calls += 1
+
+        if function is None:
+            return
+
+        if type(node) in SIZED_TYPES:
+            statistics.add_size(len(node))
+
+        start = perf_counter()
+        adjusted_node = function(path, node, specs, errors, warnings, tasks)
+        statistics.time += perf_counter() - start
+
+        return adjusted_node
+
+    def cumulative_times(self):
+        times = {}
+        for path, statistics in self.nodes.items():
+            for index in range(len(path) + 1):
+                ancestor = path[:index]
+                times[ancestor] = times.get(ancestor, 0.0) + statistics.time
+
+        return times
+
+    def to_dict(self):
+        """ Return the statistics as a dict indexed by the paths of the nodes
+        (in their string form, for instance '$items.[*].$price').
+        """
+
+        cumulative_times = self.cumulative_times()
+
+        nodes = {}
+        for path, statistics in self.nodes.items():
+            nodes['.'.join(path)] = {
+                'calls': statistics.calls,
+                'time': statistics.time,
+                'cumulative_time': cumulative_times[path],
+                'failures': statistics.failures,
+                'sizes': {
+                    'count': statistics.sizes,
+                    'total': statistics.total_size,
+                    'minimum': statistics.minimum_size,
+                    'maximum': statistics.maximum_size
+                }
+            }
+
+        return nodes
+
+    def to_text(self, sort='cumulative_time'):
+        """ Return the statistics as a table similar to the output of the
+        'pstats' module, sorted by the given key of to_dict() entries.
+        """
+
+        nodes = self.to_dict()
+        paths = sorted(nodes.keys(), key=lambda path: nodes[path][sort], reverse=True)
+
+        lines = [f"{'calls':>9} {'tottime':>9} {'cumtime':>9} {'failures':>9} {'avgsize':>9} {'maxsize':>9}  path"]
+        for path in paths:
+            node = nodes[path]
+
+            sizes = node['sizes']
+            average_size = f"{sizes['total'] / sizes['count']:.1f}" if sizes['count'] > 0 else '-'
+            maximum_size = sizes['maximum'] if sizes['maximum'] is not None else '-'
+
+            lines.append(
+                f"{node['calls']:>9} {node['time']:>9.6f} {node['cumulative_time']:>9.6f} "
+                f"{node['failures']:>9} {average_size:>9} {maximum_size:>9}  {path or '<root>'}"
+            )
+
+        return '\n'.join(lines) + '\n'
+
+    def to_collapsed(self):
+        """ Return the statistics in the collapsed stack format (one line per
+        node with its frames separated by ';' and its time in microseconds),
+        which is the input format of flamegraph tools.
+        """
+
+        lines = []
+        for path, statistics in self.nodes.items():
+            frames = ';'.join(('<root>',) + path)
+            lines.append(f"{frames} {round(statistics.time * 1000000)}")
+
+        return '\n'.join(lines) + '\n'
+
+SIZED_TYPES = (str, list, tuple, dict)
+
+def traverse_profiled(node, specs, adjust_node_map, errors, warnings, profiler, limits=None, finalize_node_map={}, path=ROOT_PATH):
+    """ Same as traverse() of the 'traversal' module but records statistics
+    of the nodes in the profiler.
+    """
+
+    errors = ProfiledErrors(errors, profiler)
+    return traverse(node, specs, adjust_node_map, errors, warnings, limits, finalize_node_map, path, profiler.process_node)
@@ -0,0 +1,113 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+# Notes:
+# - This module implements the projection of specs on the paths selected by
+#   the caller (see the 'select' parameter of document_to_object()). Paths
+#   are the ones of the specs (for instance, ['$foo', '[]', '$bar'] or
+#   ['$foo', '<0>'] for the first item of a tuple) and they're merged into a
+#   selection tree; a dict mapping the segments to the tree of the child, or
+#   to True if the child is selected entirely.
+# - A projected node has the 'projection' type and its specs are a
+#   {'type', 'option', 'specs', 'tree', 'check', 'projections'} dict; 'specs'
+#   are the specs of the node and 'tree' its selection tree. The node is
+#   processed by the function of its actual type, then only the tasks of the
+#   selected children are kept (see process_projected_node() of the
+#   'document' module). The specs of projected children are created on
+#   demand and shared through the 'projections' dict (a node can have
+#   several specs, for instance, the fields of the variants of a union).
+
+__all__ = ['make_selection_tree', 'project_specs', 'make_segment']
+
+def read_path(path):
+    # Paths are lists of segments or their string form (for instance,
+    # '$foo.[].$bar').
+    segments = path.split('.') if type(path) is str else list(path)
+    assert len(segments) > 0, "path must not be empty"
+
+    return segments
+
+def find_children_specs(specs, segment):
+    type_ = specs['type']
+    if type_ == 'map' and segment[:1] == '$' and segment[1:] in specs['fields']:
+        return [specs['fields'][segment[1:]]]
+    elif type_ == 'union' and segment[:1] == '$':
+        return [
+            variant['fields'][segment[1:]]
+            for variant in specs['variants'].values()
+            if segment[1:] in variant['fields']
+        ]
+    elif (type_ == 'array' and segment == '[]') or (type_ == 'object' and segment == '{}'):
+        return [specs['value']]
+    elif type_ == 'tuple' and segment[:1] == '<' and segment[-1:] == '>' and segment[1:-1].isdecimal():
+        index = int(segment[1:-1])
+        return [specs['items'][index]] if index < len(specs['items']) else []
+    else:
+        return []
+
+def make_selection_tree(specs, select):
+    """ Return the selection tree of the paths (the specs must be
+    normalized). """
+
+    tree = {}
+    for path in select:
+        segments = read_path(path)
+
+        # A path selects its node entirely, including the paths selecting
+        # its children.
+        node = tree
+        for segment in segments[:-1]:
+            node = node.setdefault(segment, {})
+            if node is True:
+                break
+        else:
+            node[segments[-1]] = True
+
+    # Make sure all segments exist in the specs (unions have several specs
+    # for the same segment).
+    stack = [(specs, tree, [])]
+    while stack:
+        node_specs, node, path = stack.pop()
+        for segment, subtree in node.items():
+            children_specs = find_children_specs(node_specs, segment)
+            assert len(children_specs) > 0, f"'{'.'.join(path + [segment])}' path is incorrect"
+
+            if subtree is not True:
+                for child_specs in children_specs:
+                    stack.append((child_specs, subtree, path + [segment]))
+
+    return tree
+
+def project_specs(specs, tree, check, projections):
+    key = (id(specs), id(tree))
+    projected_specs = projections.get(key)
+    if projected_specs is None:
+        projected_specs = {
+            'type': 'projection',
+            'option': specs['option'],
+            'specs': specs,
+            'tree': tree,
+            'check': check,
+            'projections': projections
+        }
+        projections[key] = projected_specs
+
+    return projected_specs
+
+def make_segment(path):
+    # Return the segment of the specs matching the last segment of a path
+    # (see the 'traversal' module).
+    _, prefix, key, _ = path
+    if prefix == '$':
+        return '$' + key
+    elif prefix == '[':
+        return '[]'
+    elif prefix == '{':
+        return '{}'
+    else:
+        return '<' + str(key) + '>'
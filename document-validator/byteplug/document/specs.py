@@ -7,9 +7,16 @@
 # Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
 
 import re
+import marshal
+from types import MappingProxyType
+from byteplug.document.node import Node
+from byteplug.document.utility import read_minimum_value, read_maximum_value
+from byteplug.document.utility import read_length_value, remember
+from byteplug.document.pattern import NAME_PATTERN, compile_pattern
+from byteplug.document.pattern import is_vulnerable_pattern
 from byteplug.document.exception import ValidationError, ValidationWarning
 
-__all__ = ['validate_specs']
+__all__ = ['validate_specs', 'normalize_specs']
 
 # TODOs;
 # - Rework the entire implementation to be based on another generic validator
@@ -18,6 +25,38 @@ __all__ = ['validate_specs']
 #   emit more precise error/warning messages. Will also be faster.
 #
 
+# Notes:
+# - Valid specs are memoized; specs known to be valid are not validated
+#   again, only their warnings are reported. Specs are looked up by their
+#   serialized form (see the 'marshal' module), which is much faster to
+#   compute than validating them and distinguishes 1, 1.0 and True (unlike
+#   comparing them). Nodes are immutable and are looked up by their hash
+#   instead; the nodes of a tree are memoized as well, therefore a node
+#   shared by several trees (for instance, a record) is validated once. Only
+#   valid specs are memoized and the memos are bounded.
+# - Normalized specs are memoized as well (see normalize_specs()); dict specs
+#   without records are looked up by their serialized form, so converters
+#   called with the same dict specs don't normalize them on every call.
+# - Serializing specs is proportional to their size; dict specs are looked up
+#   by their identity first (the memos keep them alive, their id can't be
+#   reused). Therefore dict specs must not be modified once they're passed to
+#   validate_specs() or normalize_specs() (or to the converters).
+# - Normalized specs can only be pickled with pickle_specs(), the 'pickle'
+#   module rejects them (see the 'pickling' module).
+
+# Map valid specs (their serialized form) and valid nodes to the (path,
+# message) tuples of their warnings (relative to the node).
+validated_specs = {}
+validated_nodes = {}
+
+# Map specs (their serialized form) to their canonical form.
+normalized_specs_memo = {}
+
+# Map the id of valid dict specs to a (specs, warnings) tuple, and the id of
+# dict specs to a (specs, canonical form) tuple.
+validated_specs_ids = {}
+normalized_specs_ids = {}
+
 def validate_minimum_or_maximum_property(name, path, value, errors):
     # This function also returns the actual minimal (or maximum) value so the
     # caller can perform further checking easily.
@@ -113,11 +152,11 @@ def validate_length_property(path, value, errors, warnings):
         error = ValidationError(path, "value must be either a number or a dict")
         errors.append(error)
 
-def validate_flag_type(path, block, errors, warnings):
+def validate_flag_type(path, block, errors, warnings, nodes):
     # Nothing to do.
     pass
 
-def validate_number_type(path, block, errors, warnings):
+def validate_number_type(path, block, errors, warnings, nodes):
     decimal = block.get('decimal')
     if decimal is not None:
         if type(decimal) is not bool:
@@ -137,35 +176,48 @@ def validate_number_type(path, block, errors, warnings):
             error = ValidationError(path, "minimum must be lower than maximum")
             errors.append(error)
 
-def validate_string_type(path, block, errors, warnings):
+def validate_string_type(path, block, errors, warnings, nodes):
     if 'length' in block:
         validate_length_property(path, block['length'], errors, warnings)
 
-    # TODO; Check validity of the regex.
     pattern = block.get('pattern')
     if pattern != None:
         if type(pattern) is not str:
             error = ValidationError(path + ['pattern'], "value must be a string")
             errors.append(error)
+            return
+
+        # Compiling the pattern here also means it's already compiled (and
+        # cached) when documents are validated against the specs.
+        try:
+            compile_pattern(pattern)
+        except re.error:
+            error = ValidationError(path + ['pattern'], "value must be a valid regex")
+            errors.append(error)
+            return
 
-def validate_array_type(path, block, errors, warnings):
+        if is_vulnerable_pattern(pattern):
+            warning = ValidationWarning(path + ['pattern'], "pattern is subject to catastrophic backtracking")
+            warnings.append(warning)
+
+def validate_array_type(path, block, errors, warnings, nodes):
     value = block.get('value')
     if not value:
         error = ValidationError(path, "'value' property is missing")
         errors.append(error)
         return
 
-    validate_block(path + ['[]'], value, errors, warnings)
+    validate_block(path + ['[]'], value, errors, warnings, nodes)
 
     if 'length' in block:
         validate_length_property(path, block['length'], errors, warnings)
 
-def validate_object_type(path, block, errors, warnings):
+def validate_object_type(path, block, errors, warnings, nodes):
     key = block.get('key')
     value = block.get('value')
 
     if value is not None:
-        validate_block(path + ['{}'], value, errors, warnings)
+        validate_block(path + ['{}'], value, errors, warnings, nodes)
     else:
         error = ValidationError(path, "'value' property is missing")
         errors.append(error)
@@ -181,7 +233,7 @@ def validate_object_type(path, block, errors, warnings):
     if 'length' in block:
         validate_length_property(path, block['length'], errors, warnings)
 
-def validate_tuple_type(path, block, errors, warnings):
+def validate_tuple_type(path, block, errors, warnings, nodes):
     items = block.get('items')
     if items == None:
         error = ValidationError(path, "'items' property is missing")
@@ -199,9 +251,9 @@ def validate_tuple_type(path, block, errors, warnings):
         return
 
     for (index, value) in enumerate(items):
-        validate_block(path + ['<' + str(index) + '>'], value, errors, warnings)
+        validate_block(path + ['<' + str(index) + '>'], value, errors, warnings, nodes)
 
-def validate_map_type(path, block, errors, warnings):
+def validate_map_type(path, block, errors, warnings, nodes):
     fields = block.get("fields")
     if fields == None:
         error = ValidationError(path, "'fields' property is missing")
@@ -219,14 +271,14 @@ def validate_map_type(path, block, errors, warnings):
         return
 
     for key, value in fields.items():
-        if not re.match(r"^[a-zA-Z0-9\-\_]+$", key):
+        if not NAME_PATTERN.match(key):
             error = ValidationError(path + ['fields'], f"'{key}' is an incorrect key name")
             errors.append(error)
             continue
 
-        validate_block(path + ['$' + key], value, errors, warnings)
+        validate_block(path + ['$' + key], value, errors, warnings, nodes)
 
-def validate_enum_type(path, block, errors, warnings):
+def validate_enum_type(path, block, errors, warnings, nodes):
     values = block.get('values')
     if values is None:
         error = ValidationError(path, "'values' property is missing")
@@ -246,7 +298,7 @@ def validate_enum_type(path, block, errors, warnings):
     # Check for duplicates and check for validity of their value.
     processed_values = []
     for value in values:
-        if not re.match(r"^[a-zA-Z0-9\-\_]+$", value):
+        if not NAME_PATTERN.match(value):
             error = ValidationError(path + ['values'], f"'{value}' is an incorrect value")
             errors.append(error)
             continue
@@ -258,6 +310,74 @@ def validate_enum_type(path, block, errors, warnings):
         else:
             processed_values.append(value)
 
+def validate_union_type(path, block, errors, warnings, nodes):
+    discriminator = block.get('discriminator')
+    if discriminator is None:
+        error = ValidationError(path, "'discriminator' property is missing")
+        errors.append(error)
+    elif type(discriminator) is not str:
+        error = ValidationError(path + ['discriminator'], "value must be a string")
+        errors.append(error)
+        discriminator = None
+    elif not NAME_PATTERN.match(discriminator):
+        error = ValidationError(path + ['discriminator'], f"'{discriminator}' is an incorrect key name")
+        errors.append(error)
+        discriminator = None
+
+    variants = block.get('variants')
+    if variants is None:
+        error = ValidationError(path, "'variants' property is missing")
+        errors.append(error)
+        return
+
+    if type(variants) is not dict:
+        error = ValidationError(path + ['variants'], "value must be a dict")
+        errors.append(error)
+        return
+
+    if len(variants) == 0:
+        error = ValidationError(path + ['variants'], "must contain at least one variant")
+        errors.append(error)
+        return
+
+    # Variants are maps; the discriminator field is implicit and its value is
+    # the name of the variant.
+    for key, value in variants.items():
+        if not NAME_PATTERN.match(key):
+            error = ValidationError(path + ['variants'], f"'{key}' is an incorrect key name")
+            errors.append(error)
+            continue
+
+        errors_count = len(errors)
+        validate_block(path + ['@' + key], value, errors, warnings, nodes)
+        if len(errors) > errors_count:
+            continue
+
+        if value['type'] != 'map':
+            error = ValidationError(path + ['@' + key], "value of 'type' must be 'map'")
+            errors.append(error)
+            continue
+
+        if discriminator is not None and discriminator in value['fields']:
+            error = ValidationError(path + ['@' + key, 'fields'], f"'{discriminator}' field conflicts with the discriminator")
+            errors.append(error)
+
+def validate_reference_type(path, block, errors, warnings, nodes):
+    record = block.get('record')
+    if record is None:
+        error = ValidationError(path, "'record' property is missing")
+        errors.append(error)
+        return
+
+    if type(record) is not str:
+        error = ValidationError(path + ['record'], "value must be a string")
+        errors.append(error)
+        return
+
+    if not NAME_PATTERN.match(record):
+        error = ValidationError(path + ['record'], f"'{record}' is an incorrect record name")
+        errors.append(error)
+
 validators = {
     "flag"     : (validate_flag_type,     []),
     "number"   : (validate_number_type,   ['decimal', 'minimum', 'maximum']),
@@ -266,10 +386,35 @@ validators = {
     "object"   : (validate_object_type,   ['key', 'value', 'length']),
     "tuple"    : (validate_tuple_type,    ['items']),
     "map"      : (validate_map_type,      ['fields']),
-    "enum"     : (validate_enum_type,     ['values'])
+    "enum"     : (validate_enum_type,     ['values']),
+    "union"    : (validate_union_type,    ['discriminator', 'variants']),
+    "reference": (validate_reference_type, ['record'])
 }
 
-def validate_block(path, block, errors, warnings):
+def validate_block(path, block, errors, warnings, nodes):
+    # Blocks of nodes known to be valid are not validated again (see the
+    # 'validated_nodes' dict).
+    node = nodes.get(id(block))
+    if node is None:
+        check_block(path, block, errors, warnings, nodes)
+        return
+
+    known_warnings = validated_nodes.get(node)
+    if known_warnings is not None:
+        for relative_path, message in known_warnings:
+            warnings.append(ValidationWarning(path + list(relative_path), message))
+        return
+
+    errors_count = len(errors)
+    warnings_count = len(warnings)
+    check_block(path, block, errors, warnings, nodes)
+
+    if len(errors) == errors_count:
+        remember(validated_nodes, node, tuple(
+            (tuple(warning.path[len(path):]), warning.message) for warning in warnings[warnings_count:]
+        ))
+
+def check_block(path, block, errors, warnings, nodes):
     if type(block) is not dict:
         error = ValidationError(path, "value must be a dict")
         errors.append(error)
@@ -298,7 +443,7 @@ def validate_block(path, block, errors, warnings):
         error = ValidationError(path, f"'{property}' property is unexpected")
         errors.append(error)
 
-    validators[type_][0](path, block, errors, warnings)
+    validators[type_][0](path, block, errors, warnings, nodes)
 
     if 'name' in block and type(block['name']) is not str:
         error = ValidationError(path + ['name'], "value must be a string")
@@ -312,11 +457,101 @@ def validate_block(path, block, errors, warnings):
         error = ValidationError(path + ['option'], "value must be a bool")
         errors.append(error)
 
-def validate_specs(specs, errors=None, warnings=None):
+def map_nodes(node):
+    # Return a dict mapping the identity of the object form of the nodes of
+    # a tree to the nodes (the object form of a node is shared by its
+    # parents, see the 'node' module).
+    nodes = {}
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        if id(node.object) in nodes:
+            continue
+        nodes[id(node.object)] = node
+
+        for key, value in node.arguments.items():
+            if key == 'value':
+                pending.append(value)
+            elif key == 'items':
+                pending.extend(value)
+            elif key in ('fields', 'variants'):
+                pending.extend(value.values())
+
+    return nodes
+
+def serialize_specs(specs):
+    # Return the serialized form of the specs, or None if they can't be
+    # serialized (for instance, if they contain an unexpected value or if
+    # they're too deep).
+    try:
+        return marshal.dumps(specs)
+    except ValueError:
+        return None
+
+def find_references(specs):
+    # Return the (path, record) tuples of the 'reference' blocks of valid
+    # specs (records themselves are not walked).
+    references = []
+    tasks = [([], specs)]
+    while tasks:
+        path, block = tasks.pop()
+
+        type_ = block['type']
+        if type_ == 'reference':
+            references.append((path, block['record']))
+        elif type_ == 'array':
+            tasks.append((path + ['[]'], block['value']))
+        elif type_ == 'object':
+            tasks.append((path + ['{}'], block['value']))
+        elif type_ == 'tuple':
+            for index, item in enumerate(block['items']):
+                tasks.append((path + ['<' + str(index) + '>'], item))
+        elif type_ == 'map':
+            for key, field in block['fields'].items():
+                tasks.append((path + ['$' + key], field))
+        elif type_ == 'union':
+            for key, variant in block['variants'].items():
+                tasks.append((path + ['@' + key], variant))
+
+    references.reverse()
+    return references
+
+def find_undefined_record(record, records):
+    # Return the name of the first record that is undefined, looking at the
+    # record and at the records it references (directly or not).
+    visited = set()
+    pending = [record]
+    while pending:
+        record = pending.pop()
+        if record in visited:
+            continue
+        visited.add(record)
+
+        if record not in records:
+            return record
+
+        pending.extend(record for _, record in find_references(records[record]))
+
+def validate_specs(specs, errors=None, warnings=None, max_cost=None, limits=None, records=None, check_references=True):
     """ Validate the YAML specs.
 
     This function checks if the structure of the YAML specs is correct. If not,
-    the ValidatorError exception is raised.
+    the ValidatorError exception is raised. Nodes are accepted as well. Valid
+    specs are memoized, validating them again is cheap (dict specs are looked
+    up by identity first, they must not be modified once they're passed).
+
+    Specs can reference named records (see the 'reference' type) defined in
+    the 'records' parameter (a dict of record specs); references are checked
+    to be defined, including the ones of the referenced records. Records are
+    expected to be valid already. If the references are resolved later (for
+    instance, records referencing each other), the 'check_references'
+    parameter can be set to False.
+
+    If the 'max_cost' parameter is set, the worst-case cost of converting a
+    document is also estimated (see estimate_cost()) under the 'limits'
+    (a dict of the limits accepted by document_to_object()); specs allowing
+    more operations are rejected and the nodes allowing unbounded work are
+    reported as warnings.
 
     Possible error messages.
 
@@ -334,13 +569,24 @@ def validate_specs(specs, errors=None, warnings=None):
     - '<foo>' value is duplicated
     - must contain at least one field
     - '<foo>' is an incorrect key name
+    - value must be a valid regex
+    - must contain at least one variant
+    - value of 'type' must be 'map'
+    - '<foo>' field conflicts with the discriminator
+    - '<foo>' is an incorrect record name
+    - '<foo>' record is undefined
+    - estimated cost is unbounded
+    - estimated cost must be equal or lower than <max_cost>
 
     Possible warning messages.
 
     - should be an integer (got float)
+    - pattern is subject to catastrophic backtracking
+    - length has no maximum
+    - pattern is evaluated on strings of unbounded length
 
-    When validating the length property and when validating the minimum and
-    maximum property for integers.
+    The first one when validating the length property and when validating the
+    minimum and maximum property for integers.
     """
 
     assert errors is None or errors == [], "if the errors parameter is set, it must be an empty list"
@@ -357,9 +603,257 @@ def validate_specs(specs, errors=None, warnings=None):
     if warnings is None:
         warnings = []
 
-    validate_block([], specs, errors, warnings)
+    # Specs (or nodes) known to be valid are not validated again.
+    if type(specs) is Node:
+        node, specs = specs, specs.to_object()
+
+        # The nodes of the tree are only mapped if it's not known to be valid.
+        nodes = {id(specs): node} if node in validated_nodes else map_nodes(node)
+        validate_block([], specs, errors, warnings, nodes)
+    else:
+        known_specs, known_warnings = validated_specs_ids.get(id(specs), (None, None))
+        if known_specs is not specs:
+            serialized_specs = serialize_specs(specs)
+            known_warnings = validated_specs.get(serialized_specs) if serialized_specs is not None else None
+            if known_warnings is not None:
+                remember(validated_specs_ids, id(specs), (specs, known_warnings))
+
+        if known_warnings is not None:
+            for path, message in known_warnings:
+                warnings.append(ValidationWarning(list(path), message))
+        else:
+            validate_block([], specs, errors, warnings, {})
+
+            if serialized_specs is not None and len(errors) == 0:
+                known_warnings = tuple((tuple(warning.path), warning.message) for warning in warnings)
+                remember(validated_specs, serialized_specs, known_warnings)
+                remember(validated_specs_ids, id(specs), (specs, known_warnings))
+
+    if check_references and len(errors) == 0:
+        for path, record in find_references(specs):
+            undefined_record = find_undefined_record(record, records or {})
+            if undefined_record is not None:
+                error = ValidationError(path + ['record'], f"'{undefined_record}' record is undefined")
+                errors.append(error)
+
+    if max_cost is not None and len(errors) == 0:
+        # Imported here because the 'cost' module depends on this one.
+        from byteplug.document.cost import estimate_cost
+
+        estimate = estimate_cost(specs, records=records, **(limits or {}))
+        for path, reason in estimate.unbounded:
+            warnings.append(ValidationWarning(path, reason))
+
+        if not estimate.is_bounded:
+            errors.append(ValidationError([], "estimated cost is unbounded"))
+        elif estimate.operations > max_cost:
+            errors.append(ValidationError([], f"estimated cost must be equal or lower than {max_cost}"))
 
     # If we're not lazy-validating the specs, we raise the first error that
     # occurred.
     if not lazy_validation and len(errors) > 0:
         raise errors[0]
+
+def normalize_number_type(block, normalized, tasks):
+    normalized['decimal'] = block.get('decimal', True)
+    normalized['minimum'] = read_minimum_value(block)
+    normalized['maximum'] = read_maximum_value(block)
+
+def normalize_string_type(block, normalized, tasks):
+    normalized['length'] = read_length_value(block.get('length'))
+
+    pattern = block.get('pattern')
+    if pattern is not None:
+        pattern = compile_pattern(pattern)
+    normalized['pattern'] = pattern
+
+def normalize_array_type(block, normalized, tasks):
+    value = {}
+    tasks.append((block['value'], value))
+
+    normalized['value'] = MappingProxyType(value)
+    normalized['length'] = read_length_value(block.get('length'))
+
+def normalize_object_type(block, normalized, tasks):
+    value = {}
+    tasks.append((block['value'], value))
+
+    normalized['key'] = block['key']
+    normalized['value'] = MappingProxyType(value)
+    normalized['length'] = read_length_value(block.get('length'))
+
+def normalize_tuple_type(block, normalized, tasks):
+    items = []
+    for item in block['items']:
+        value = {}
+        tasks.append((item, value))
+        items.append(MappingProxyType(value))
+
+    normalized['items'] = tuple(items)
+
+def normalize_map_type(block, normalized, tasks):
+    fields = {}
+    required = []
+    optional = []
+    for key, field in block['fields'].items():
+        value = {}
+        tasks.append((field, value))
+        fields[key] = MappingProxyType(value)
+
+        if field.get('option', False):
+            optional.append(key)
+        else:
+            required.append(key)
+
+    normalized['fields'] = MappingProxyType(fields)
+    normalized['required'] = frozenset(required)
+    normalized['optional'] = tuple(optional)
+
+def normalize_enum_type(block, normalized, tasks):
+    normalized['values'] = tuple(block['values'])
+
+def normalize_union_type(block, normalized, tasks):
+    discriminator = block['discriminator']
+
+    # The discriminator field is added to the fields of each variant (as an
+    # 'enum' node whose only value is the name of the variant); a node is
+    # then processed by the 'map' node of its variant.
+    variants = {}
+    for key, variant in block['variants'].items():
+        value = {}
+        field = {'type': 'enum', 'values': [key]}
+        tasks.append((variant | {'fields': {discriminator: field} | variant['fields']}, value))
+        variants[key] = MappingProxyType(value)
+
+    normalized['discriminator'] = discriminator
+    normalized['variants'] = MappingProxyType(variants)
+
+normalizers = {
+    "flag"     : None,
+    "number"   : normalize_number_type,
+    "string"   : normalize_string_type,
+    "array"    : normalize_array_type,
+    "object"   : normalize_object_type,
+    "tuple"    : normalize_tuple_type,
+    "map"      : normalize_map_type,
+    "enum"     : normalize_enum_type,
+    "union"    : normalize_union_type
+}
+
+def normalize_specs(specs, records=None, normalized_records=None):
+    """ Return the canonical form of valid specs.
+
+    In the canonical form, all properties of a block are present (with their
+    default value if they were omitted), the 'minimum' and 'maximum'
+    properties are (exclusive, value) tuples, the 'length' property is either
+    an integer or a (minimum, maximum) tuple, and patterns are compiled. It's
+    made of read-only dicts (see MappingProxyType) and tuples. Blocks of the
+    'map' type also have a 'required' frozenset and an 'optional' tuple of
+    their field names, and the variants of blocks of the 'union' type have
+    their discriminator field.
+
+    Blocks of the 'reference' type are replaced by the normalized block of
+    their record, which is taken from the 'records' parameter (a dict of
+    record specs). A record is normalized once and its children are shared
+    by all its references, therefore the canonical form of recursive records
+    is cyclic. To share the normalized records between several specs, pass
+    the same dict as the 'normalized_records' parameter.
+
+    Converters run on this form; normalizing the specs once and passing the
+    result to them avoids normalizing them on every call, and it should be
+    done on hot paths. The canonical form of specs without records is
+    memoized (dict specs are looked up by identity, then by their serialized
+    form), therefore dict specs must not be modified once they're passed.
+    Normalized specs are returned unchanged, and they can only be pickled with
+    pickle_specs(), not with pickle.dumps() (see the 'pickling' module).
+    """
+
+    if type(specs) is MappingProxyType:
+        return specs
+
+    if type(specs) is Node:
+        # Nodes are immutable, their canonical form is computed once.
+        if records is None:
+            if specs.normalized_specs is None:
+                specs.cache_normalized_specs(normalize_specs(specs.to_object()))
+
+            return specs.normalized_specs
+
+        specs = specs.to_object()
+
+    # Specs normalized without records are memoized (references can't be
+    # resolved without them).
+    serialized_specs = None
+    if records is None and normalized_records is None:
+        known_specs, known_normalized_specs = normalized_specs_ids.get(id(specs), (None, None))
+        if known_specs is specs:
+            return known_normalized_specs
+
+        serialized_specs = serialize_specs(specs)
+        if serialized_specs is not None:
+            known_normalized_specs = normalized_specs_memo.get(serialized_specs)
+            if known_normalized_specs is not None:
+                remember(normalized_specs_ids, id(specs), (specs, known_normalized_specs))
+                return known_normalized_specs
+
+    if normalized_records is None:
+        normalized_records = {}
+
+    # Specs may be nested deeper than the Python recursion limit (like the
+    # documents they describe); blocks are normalized using an explicit stack
+    # of (block, normalized block) tuples.
+    normalized_specs = {}
+    tasks = [(specs, normalized_specs)]
+    references = []
+    while tasks:
+        block, normalized = tasks.pop()
+
+        type_ = block['type']
+        if type_ == 'reference':
+            # The block is filled with the normalized block of the record
+            # once all blocks are normalized (it may not be complete yet).
+            record = block['record']
+            assert records is not None and record in records, f"'{record}' record is undefined"
+
+            if record not in normalized_records:
+                normalized_records[record] = {}
+                tasks.append((records[record], normalized_records[record]))
+
+            references.append((block, normalized))
+            continue
+
+        normalized['type'] = type_
+        normalized['name'] = block.get('name')
+        normalized['description'] = block.get('description')
+        normalized['option'] = block.get('option', False)
+
+        normalizer = normalizers[type_]
+        if normalizer is not None:
+            normalizer(block, normalized, tasks)
+
+    # The root block of a record can be a reference itself; references are
+    # resolved once the block of their record is filled.
+    while references:
+        pending_references = []
+        for block, normalized in references:
+            normalized_record = normalized_records[block['record']]
+            if 'type' not in normalized_record:
+                pending_references.append((block, normalized))
+                continue
+
+            normalized.update(normalized_record)
+            normalized['option'] = block.get('option', False)
+            if 'name' in block:
+                normalized['name'] = block['name']
+            if 'description' in block:
+                normalized['description'] = block['description']
+
+        assert len(pending_references) < len(references), "records must not reference each other without nesting"
+        references = pending_references
+
+    normalized_specs = MappingProxyType(normalized_specs)
+    if serialized_specs is not None:
+        remember(normalized_specs_memo, serialized_specs, normalized_specs)
+        remember(normalized_specs_ids, id(specs), (specs, normalized_specs))
+
+    return normalized_specs
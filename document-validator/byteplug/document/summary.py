@@ -0,0 +1,122 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+from byteplug.document.traversal import normalize_location
+from byteplug.document.exception import ErrorCode
+
+# Notes:
+# - A large invalid document usually has the same error repeated for each
+#   item of an array (or each value of an object). Instead of collecting all
+#   the error records, an ErrorSummary object can be passed to the converters
+#   as the errors parameter; it groups the records as they're reported, by
+#   path (where indexes of arrays and keys of objects are replaced by '*') and
+#   by error code, and only keeps the first records of each group. Errors
+#   naming a field (an unexpected or a missing field) are also grouped by the
+#   name of the field.
+# - Field names come from the document (unexpected fields); to keep the size
+#   of a summary bounded, only the first fields of a path are given their own
+#   group (see the 'max_fields' parameter), the errors of the other fields
+#   are counted in a single truncated group.
+
+__all__ = ['ErrorGroup', 'ErrorSummary']
+
+# Codes of the errors whose parameter is the name of a field, and the
+# message of their truncated group.
+FIELD_CODES = {
+    ErrorCode.UNEXPECTED_FIELD: "other fields were unexpected",
+    ErrorCode.MISSING_FIELD: "other fields were missing"
+}
+
+class ErrorGroup:
+    """ Errors of a summary sharing the same path and the same code (and
+    the same field, if they name one).
+
+    The 'path' attribute is the normalized path, the 'count' attribute is the
+    number of errors and the 'examples' attribute is a list of the first
+    error records. The 'truncated' attribute tells whether the group collects
+    the errors of several fields (the ones exceeding the maximum number of
+    fields of the summary).
+    """
+
+    __slots__ = ('path', 'code', 'count', 'examples', 'truncated')
+
+    def __init__(self, path, code, truncated=False):
+        self.path = path
+        self.code = code
+        self.count = 0
+        self.examples = []
+        self.truncated = truncated
+
+    @property
+    def message(self):
+        if self.truncated:
+            return FIELD_CODES[self.code]
+
+        # Errors of a group only differ by their parameter if it's not coming
+        # from the specs and it's not a field name (for instance, the index of
+        # an invalid key); the message of the first error is used.
+        return self.examples[0].message
+
+class ErrorSummary:
+    """ Collect error records grouped by their normalized path and their code.
+
+    It can be passed to the converters as the errors parameter (which enables
+    lazy validation). Iterating over it yields the ErrorGroup objects in the
+    order their first error was reported, and its length is the total number
+    of errors.
+
+    Errors naming a field are grouped by field, up to 'max_fields' fields for
+    a given path and code; the errors of the other fields are grouped in a
+    truncated group, and the 'truncated' attribute is their number.
+    """
+
+    __slots__ = ('max_examples', 'max_fields', 'groups', 'fields', 'count', 'truncated')
+
+    def __init__(self, max_examples=5, max_fields=10):
+        self.max_examples = max_examples
+        self.max_fields = max_fields
+        self.groups = {}
+        self.fields = {}
+        self.count = 0
+        self.truncated = 0
+
+    def append(self, record):
+        self.count += 1
+
+        path = normalize_location(record.location)
+        if record.code in FIELD_CODES:
+            key = (path, record.code, record.parameter)
+            if key not in self.groups:
+                fields = self.fields.get((path, record.code), 0)
+                if fields < self.max_fields:
+                    self.fields[(path, record.code)] = fields + 1
+                else:
+                    key = (path, record.code)
+                    self.truncated += 1
+        else:
+            key = (path, record.code)
+
+        group = self.groups.get(key)
+        if group is None:
+            truncated = record.code in FIELD_CODES and len(key) == 2
+            group = ErrorGroup(list(path), record.code, truncated)
+            self.groups[key] = group
+
+        group.count += 1
+        if len(group.examples) < self.max_examples:
+            group.examples.append(record)
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.groups.values())
@@ -0,0 +1,124 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+# Notes:
+# - This module implements the engine walking a document (or a Python object)
+#   and its specs, on behalf of the 'document' and 'object' modules. It's
+#   using an explicit stack of tasks instead of recursion, therefore the depth
+#   of the document is not bounded by the Python recursion limit.
+# - Processing a node is done by a process_<type>_node() function of the
+#   calling module. A container node schedules its children by pushing tasks
+#   on the stack; a task is either a (path, node, specs, container, key) tuple
+#   whose result is stored in 'container[key]', or a (function, arguments)
+#   tuple which is called when it's popped (it's used to report errors in the
+#   same order as a recursive walk would). Because it's a stack, tasks must
+#   be pushed in reverse order.
+# - Paths are built lazily; a path is a (parent, prefix, key, depth) tuple and
+#   it's expanded to its list form (for instance, ['$foo', '[0]']) only when
+#   an error is reported. Building the list form for each node was the most
+#   expensive part of the walk.
+# - A hook can be passed to instrument the walk (see the 'profiler' module);
+#   it's called for each node instead of its process_<type>_node() function,
+#   which it's given along with the arguments, and it returns the adjusted
+#   node. For null values of optional nodes (which aren't processed), it's
+#   called with None as the function.
+
+__all__ = ['ROOT_PATH', 'expand_path', 'normalize_location', 'traverse']
+
+ROOT_PATH = (None, None, None, 0)
+
+def expand_path(path):
+    """ Return the list form of a path. """
+
+    segments = []
+    while path[1] is not None:
+        parent, prefix, key, _ = path
+        if prefix == '$':
+            segments.append('$' + key)
+        elif prefix == '[':
+            segments.append('[' + str(key) + ']')
+        elif prefix == '{':
+            segments.append('{' + str(key) + '}')
+        else:
+            segments.append('<' + str(key) + '>')
+
+        path = parent
+
+    segments.reverse()
+    return segments
+
+def normalize_location(location):
+    """ Return the list form of a path with indexes of arrays and keys of
+    objects replaced by '*' (for instance, ['$foo', '[*]']), as a tuple.
+    """
+
+    segments = []
+    while location[1] is not None:
+        parent, prefix, key, _ = location
+        if prefix == '$':
+            segments.append('$' + key)
+        elif prefix == '[':
+            segments.append('[*]')
+        elif prefix == '{':
+            segments.append('{*}')
+        else:
+            segments.append('<' + str(key) + '>')
+
+        location = parent
+
+    segments.reverse()
+    return tuple(segments)
+
+def finalize_node(container, key, function):
+    value = container[key]
+    if value is not None:
+        container[key] = function(value)
+
+def traverse(node, specs, adjust_node_map, errors, warnings, limits=None, finalize_node_map={}, path=ROOT_PATH, hook=None):
+    """ Walk a node and its children and return the adjusted node.
+
+    The finalize_node_map maps node types to functions that are applied on
+    the adjusted node once all its children are adjusted (for instance, to
+    turn a list into a tuple). The path is the one of the node if it's not
+    the root node of the document. The hook, if set, is called for each node
+    (see the notes of this module).
+    """
+
+    root = [None]
+    tasks = [(path, node, specs, root, 0)]
+    pop = tasks.pop
+    append = tasks.append
+
+    while tasks:
+        task = pop()
+        if len(task) == 2:
+            task[0](*task[1])
+            continue
+
+        path, node, specs, container, key = task
+
+        # We accept a None value if the type is marked as optional (the
+        # container is expected to be filled with None values already).
+        if node is None and specs['option']:
+            if hook is not None:
+                hook(None, path, node, specs, errors, warnings, tasks)
+            continue
+
+        if limits is not None:
+            limits.check_node(path, node, specs)
+
+        type_ = specs['type']
+        if type_ in finalize_node_map:
+            append((finalize_node, (container, key, finalize_node_map[type_])))
+
+        if hook is None:
+            container[key] = adjust_node_map[type_](path, node, specs, errors, warnings, tasks)
+        else:
+            container[key] = hook(adjust_node_map[type_], path, node, specs, errors, warnings, tasks)
+
+    return root[0]
@@ -6,9 +6,20 @@
 #
 # Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
 
-from byteplug.document.exception import ValidationError
+from byteplug.document.exception import ErrorCode, ErrorRecord
+
+# Maximum number of entries of the memos and caches of the modules.
+MEMO_SIZE = 4096
+
+def remember(memo, key, value):
+    # The oldest entry is evicted when the memo is full.
+    if len(memo) >= MEMO_SIZE:
+        del memo[next(iter(memo))]
+
+    memo[key] = value
 
 def read_minimum_value(specs):
+    # Return the minimum as an (exclusive, value) tuple.
     assert specs['type'] == 'number'
 
     minimum = specs.get('minimum')
@@ -21,6 +32,7 @@ def read_minimum_value(specs):
             return (exclusive, value)
 
 def read_maximum_value(specs):
+    # Return the maximum as an (exclusive, value) tuple.
     assert specs['type'] == 'number'
 
     maximum = specs.get('maximum')
@@ -32,31 +44,40 @@ def read_maximum_value(specs):
             value = maximum['value']
             return (exclusive, value)
 
-def check_length(value, length, path, errors, warnings):
-    if length is not None:
-        if type(length) in (int, float):
-            length = int(length)
+def read_length_value(length):
+    # Return the length either as an integer or as a (minimum, maximum) tuple.
+    if length is None:
+        return None
+    elif type(length) in (int, float):
+        return int(length)
+    else:
+        minimum = length.get('minimum')
+        if minimum is not None:
+            minimum = int(minimum)
 
-            if value != length:
-                error = ValidationError(path, f"length must be equal to {length}")
-                errors.append(error)
-                return
-        else:
-            minimum = length.get("minimum")
-            maximum = length.get("maximum")
+        maximum = length.get('maximum')
+        if maximum is not None:
+            maximum = int(maximum)
 
-            if minimum is not None:
-                minimum = int(minimum)
+        return (minimum, maximum)
 
-                if not (value >= minimum):
-                    error = ValidationError(path, f"length must be equal or greater than {minimum}")
-                    errors.append(error)
-                    return
+def check_length(value, length, path, errors):
+    # The length is expected in its normalized form (see read_length_value()).
+    if type(length) is int:
+        if value != length:
+            error = ErrorRecord(path, ErrorCode.LENGTH, length)
+            errors.append(error)
+    else:
+        minimum, maximum = length
 
-            if maximum is not None:
-                maximum = int(maximum)
+        if minimum is not None:
+            if not (value >= minimum):
+                error = ErrorRecord(path, ErrorCode.MINIMUM_LENGTH, minimum)
+                errors.append(error)
+                return
 
-                if not (value <= maximum):
-                    error = ValidationError(path, f"length must be equal or lower than {maximum}")
-                    errors.append(error)
-                    return
+        if maximum is not None:
+            if not (value <= maximum):
+                error = ErrorRecord(path, ErrorCode.MAXIMUM_LENGTH, maximum)
+                errors.append(error)
+                return
@@ -2,7 +2,7 @@ from setuptools import setup
 
 setup(
     name='byteplug-document',
-    version='0.1.2.dev4',
+    version='0.1.2.dev5',
     description="Byteplug toolkit that implements the Document Validator standard.",
     url='https://www.byteplug.io/standards/document-validator',
     author='Jonathan De Wachter',
@@ -12,7 +12,10 @@ setup(
         'License :: OSI Approved :: Open Software License 3.0 (OSL-3.0)'
     ],
     packages=['byteplug', 'byteplug.document'],
-    namespace_packages = ['byteplug'],
     python_requires='>=3.9',
-    install_requires=['pyyaml']
+    install_requires=['pyyaml'],
+    extras_require={
+        're2': ['google-re2'],
+        'msgpack': ['msgpack']
+    }
 )
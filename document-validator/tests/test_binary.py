@@ -0,0 +1,152 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+from byteplug.document import object_to_binary, binary_to_object
+from byteplug.document import object_to_document, document_to_object
+from byteplug.document import ValidationError
+import pytest
+
+SPECS = {
+    'type': 'map',
+    'fields': {
+        'foo': {'type': 'flag'},
+        'bar': {'type': 'number', 'decimal': False, 'minimum': -1000},
+        'quz': {'type': 'number'},
+        'yolo': {'type': 'string', 'option': True},
+        'items': {
+            'type': 'array',
+            'value': {'type': 'enum', 'values': ['foo', 'bar']}
+        },
+        'keys': {
+            'type': 'object',
+            'key': 'integer',
+            'value': {
+                'type': 'tuple',
+                'items': [{'type': 'number'}, {'type': 'map', 'fields': {}}]
+            }
+        },
+        'variant': {
+            'type': 'union',
+            'discriminator': 'kind',
+            'variants': {
+                'foo': {'type': 'map', 'fields': {'value': {'type': 'string'}}},
+                'bar': {'type': 'map', 'fields': {}}
+            }
+        }
+    }
+}
+
+OBJECT = {
+    'foo': True,
+    'bar': -300,
+    'quz': 1.5,
+    'yolo': None,
+    'items': ['bar', 'foo'],
+    'keys': {4: (2, {}), -7: (0.25, {})},
+    'variant': {'kind': 'foo', 'value': "héllo"}
+}
+
+def test_object_to_binary():
+    buffer = object_to_binary(OBJECT, SPECS)
+    assert buffer == (
+        b'\x01'                                     # foo
+        b'\xd7\x04'                                 # bar
+        b'\x01\x00\x00\x00\x00\x00\x00\xf8?'        # quz
+        b'\x00'                                     # yolo
+        b'\x02\x01\x00'                             # items
+        b'\x02\x08\x00\x04\x00\x0d\x01\x00\x00\x00\x00\x00\x00\xd0?\x00'  # keys
+        b'\x00\x06h\xc3\xa9llo'                     # variant
+    )
+    assert len(buffer) < len(object_to_document(OBJECT, SPECS)) / 3
+
+    # objects are checked like object_to_document() does
+    with pytest.raises(ValidationError) as e:
+        object_to_binary(OBJECT | {'bar': 4.2}, SPECS)
+    assert e.value.path == ['$bar']
+    assert e.value.message == "was expecting non-decimal number"
+
+    errors = []
+    assert object_to_binary(OBJECT | {'items': ['quz']}, SPECS, errors=errors) is None
+    assert len(errors) == 1
+    assert errors[0].path == ['$items', '[0]']
+    assert errors[0].message == "enum value is invalid"
+
+def test_binary_to_object():
+    buffer = object_to_binary(OBJECT, SPECS)
+    assert binary_to_object(buffer, SPECS) == OBJECT
+    assert binary_to_object(bytearray(buffer), SPECS) == OBJECT
+    assert binary_to_object(buffer, SPECS) == document_to_object(object_to_document(OBJECT, SPECS), SPECS)
+
+    # documents are checked like document_to_object() does
+    specs = {'type': 'array', 'value': {'type': 'number', 'decimal': False, 'maximum': 10}}
+    buffer = object_to_binary([1, 2, 3], specs)
+    with pytest.raises(ValidationError) as e:
+        binary_to_object(buffer, specs | {'length': 2})
+    assert e.value.path == []
+    assert e.value.message == "length must be equal to 2"
+
+    errors = []
+    lower_specs = specs | {'value': {'type': 'number', 'decimal': False, 'maximum': 1}}
+    binary_to_object(buffer, lower_specs, errors=errors)
+    assert len(errors) == 2
+    assert errors[0].path == ['[1]']
+    assert errors[0].message == "value must be equal or lower than 1"
+    assert errors[1].path == ['[2]']
+
+    with pytest.raises(ValidationError) as e:
+        binary_to_object(object_to_binary([1, 20], specs | {'value': {'type': 'number', 'decimal': False}}), specs)
+    assert e.value.path == ['[1]']
+    assert e.value.message == "value must be equal or lower than 10"
+
+    # limits are enforced
+    with pytest.raises(ValidationError) as e:
+        binary_to_object(buffer, specs, max_bytes=3)
+    assert e.value.message == "document size must be equal or lower than 3 bytes"
+
+    with pytest.raises(ValidationError) as e:
+        binary_to_object(buffer, specs, max_nodes=3)
+    assert e.value.message == "number of nodes must be equal or lower than 3"
+
+def test_binary_to_object_invalid():
+    buffer = object_to_binary(OBJECT, SPECS)
+
+    invalid_buffers = [
+        b'',
+        buffer[:-1],            # truncated
+        buffer + b'\x00',       # trailing bytes
+        b'\x02' + buffer[1:],   # invalid flag
+        buffer[:3] + b'\x02' + buffer[4:],  # invalid number tag
+        buffer[:-9] + b'\x05' + buffer[-8:]  # invalid variant
+    ]
+    for invalid_buffer in invalid_buffers:
+        errors = []
+        assert binary_to_object(invalid_buffer, SPECS, errors=errors) is None
+        assert len(errors) == 1
+        assert errors[0].path == []
+        assert errors[0].message == "binary document is invalid"
+
+    # counts can't exceed the remaining bytes
+    specs = {'type': 'array', 'value': {'type': 'map', 'fields': {}}}
+    assert object_to_binary([{}, {}], specs) == b'\x02\x00\x00'
+    with pytest.raises(ValidationError) as e:
+        binary_to_object(b'\xff\xff\xff\xff\x0f\x00', specs)
+    assert e.value.message == "binary document is invalid"
+
+    with pytest.raises(ValidationError) as e:
+        binary_to_object(b'\x02\xff\xfe', {'type': 'string'})
+    assert e.value.message == "binary document is invalid"
+
+    # varints are limited to the integers the JSON converters accept
+    with pytest.raises(ValidationError) as e:
+        binary_to_object(b'\x00' + b'\xff' * 100000 + b'\x01', {'type': 'number'})
+    assert e.value.message == "binary document is invalid"
+
+    with pytest.raises(ValidationError) as e:
+        binary_to_object(object_to_binary(10 ** 4400, {'type': 'number'}), {'type': 'number'})
+    assert e.value.message == "binary document is invalid"
+    assert binary_to_object(object_to_binary(10 ** 4000, {'type': 'number'}), {'type': 'number'}) == 10 ** 4000
@@ -0,0 +1,185 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+from byteplug.document import validate_specs, estimate_cost
+from byteplug.document import ValidationError
+import pytest
+
+def test_estimate_cost():
+    specs = {
+        'type': 'map',
+        'fields': {
+            'foo': {'type': 'flag'},
+            'bar': {'type': 'number'},
+            'quz': {'type': 'string', 'length': 10}
+        }
+    }
+
+    estimate = estimate_cost(specs)
+    assert estimate.is_bounded
+    assert estimate.nodes == 4
+    assert estimate.operations == 1 + 3 + 3
+    assert estimate.unbounded == []
+
+    # repetitions multiply the cost of their value
+    specs = {
+        'type': 'array',
+        'value': {
+            'type': 'array',
+            'value': {'type': 'number'},
+            'length': {'maximum': 10}
+        },
+        'length': {'maximum': 10}
+    }
+
+    estimate = estimate_cost(specs)
+    assert estimate.nodes == 1 + 10 * 11
+    assert estimate.operations == 1 + 10 * 11
+
+    # patterns cost an operation per character
+    specs = {'type': 'string', 'length': 10, 'pattern': "^a$"}
+    assert estimate_cost(specs).operations == 1 + 10
+
+def test_estimate_cost_union():
+    specs = {
+        'type': 'union',
+        'discriminator': 'kind',
+        'variants': {
+            'foo': {'type': 'map', 'fields': {'bar': {'type': 'number'}}},
+            'quz': {'type': 'map', 'fields': {'bar': {'type': 'number'}, 'baz': {'type': 'flag'}}}
+        }
+    }
+
+    # the cost of the most expensive variant (including its discriminator)
+    estimate = estimate_cost(specs)
+    assert estimate.nodes == 4
+    assert estimate.operations == 1 + 1 + 3 + 3
+
+def test_estimate_cost_recursive_records():
+    records = {
+        'tree': {
+            'type': 'map',
+            'fields': {
+                'left': {'type': 'reference', 'record': 'tree', 'option': True},
+                'right': {'type': 'reference', 'record': 'tree', 'option': True}
+            }
+        }
+    }
+    specs = {'type': 'reference', 'record': 'tree'}
+
+    estimate = estimate_cost(specs, records)
+    assert not estimate.is_bounded
+    assert estimate.unbounded == [
+        (['$left', '$left'], "record is recursive"),
+        (['$left', '$right', '$right'], "record is recursive")
+    ]
+
+    # the depth bounds the recursion (a binary tree here)
+    estimate = estimate_cost(specs, records, max_depth=10)
+    assert estimate.is_bounded
+    assert estimate.nodes == 2 ** 11 - 1
+
+    # children of empty containers cost nothing
+    records = {
+        'tree': {
+            'type': 'map',
+            'fields': {
+                'children': {
+                    'type': 'array',
+                    'length': 0,
+                    'value': {'type': 'reference', 'record': 'tree'}
+                }
+            }
+        }
+    }
+
+    estimate = estimate_cost(specs, records)
+    assert estimate.is_bounded
+    assert estimate.nodes == 2
+    assert estimate.operations == 3
+
+def test_estimate_cost_unbounded():
+    specs = {
+        'type': 'map',
+        'fields': {
+            'foo': {
+                'type': 'array',
+                'value': {'type': 'number'}
+            },
+            'bar': {
+                'type': 'string',
+                'pattern': "^[a-z]+$"
+            }
+        }
+    }
+
+    estimate = estimate_cost(specs)
+    assert not estimate.is_bounded
+    assert estimate.nodes == float('inf')
+    assert estimate.unbounded == [
+        (['$foo'], "length has no maximum"),
+        (['$bar'], "pattern is evaluated on strings of unbounded length")
+    ]
+
+    # limits bound the total
+    estimate = estimate_cost(specs, max_nodes=1000, max_string_length=100)
+    assert estimate.is_bounded
+    assert estimate.nodes == 1000
+    assert len(estimate.unbounded) == 2
+
+    estimate = estimate_cost(specs, max_bytes=1000)
+    assert estimate.is_bounded
+    assert estimate.nodes == 1000
+
+    # nodes deeper than the maximum depth aren't reachable
+    estimate = estimate_cost(specs, max_depth=0)
+    assert estimate.is_bounded
+    assert estimate.nodes == 1
+
+def test_estimate_cost_backtracking():
+    specs = {'type': 'string', 'pattern': "^(a+)+(?=b)$"}
+
+    estimate = estimate_cost(specs)
+    assert not estimate.is_bounded
+    assert estimate.unbounded == [([], "pattern is subject to catastrophic backtracking")]
+
+    # it's only evaluated on strings of a valid length
+    specs = dict(specs, length={'maximum': 8})
+    estimate = estimate_cost(specs)
+    assert estimate.is_bounded
+    assert estimate.unbounded == []
+
+def test_validate_specs_max_cost():
+    specs = {
+        'type': 'array',
+        'value': {'type': 'number'}
+    }
+
+    # without 'max_cost', the cost isn't estimated
+    validate_specs(specs)
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs(specs, max_cost=1000)
+    assert e.value.path == []
+    assert e.value.message == "estimated cost is unbounded"
+
+    errors, warnings = [], []
+    validate_specs(specs, errors=errors, warnings=warnings, max_cost=1000)
+    assert len(errors) == 1
+    assert len(warnings) == 1
+    assert warnings[0].path == []
+    assert warnings[0].message == "length has no maximum"
+
+    validate_specs(specs, max_cost=1000, limits={'max_nodes': 1000})
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs(specs, max_cost=1000, limits={'max_nodes': 1001})
+    assert e.value.message == "estimated cost must be equal or lower than 1000"
+
+    specs = dict(specs, length={'maximum': 999})
+    validate_specs(specs, max_cost=1000)
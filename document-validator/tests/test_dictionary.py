@@ -0,0 +1,99 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import zlib
+from byteplug.document import Node, object_to_document
+from byteplug.document import make_dictionary, compress_document, decompress_document
+from byteplug.document.limits import LimitExceeded
+import pytest
+
+ITEM_SPECS = Node('map', fields={
+    'product': Node('string'),
+    'price': Node('number'),
+    'status': Node('enum', values=['pending', 'shipped'])
+})
+
+SPECS = Node('map', fields={
+    'order': Node('string'),
+    'items': Node('array', value=ITEM_SPECS),
+    'payment': Node('union', discriminator='kind', variants={
+        'card': Node('map', fields={'last-digits': Node('string')}),
+        'cash': Node('map', fields={})
+    })
+})
+
+OBJECT = {
+    'order': "ord-42",
+    'items': [
+        {'product': "sku-1", 'price': 12.5, 'status': 'pending'},
+        {'product': "sku-2", 'price': 3, 'status': 'shipped'},
+        {'product': "sku-3", 'price': 7.25, 'status': 'shipped'}
+    ],
+    'payment': {'kind': 'card', 'last-digits': "1234"}
+}
+
+def test_make_dictionary():
+    dictionary = make_dictionary(SPECS)
+    assert dictionary == make_dictionary(SPECS.to_object())
+
+    # fragments of repeated nodes are placed after the others
+    assert dictionary == (
+        b'{"order": , "items": , "payment": '
+        b'{"kind": "card"{"kind": "cash"{"kind": "cash", "last-digits": "card"'
+        b'{"product": , "price": , "status": "pending""shipped"'
+        b'{}[]}, {}]], nullfalsetrue'
+    )
+
+    # recursive records are supported
+    records = {'tree': {'type': 'map', 'fields': {
+        'value': {'type': 'number'},
+        'children': {'type': 'array', 'value': {'type': 'reference', 'record': 'tree'}}
+    }}}
+    dictionary = make_dictionary({'type': 'reference', 'record': 'tree'}, records)
+    assert dictionary == b'{"value": , "children": {}[]}, {}]], nullfalsetrue'
+
+    # only the last 32KB are kept
+    specs = Node('enum', values=[f'value-{index}' for index in range(5000)])
+    dictionary = make_dictionary(specs)
+    assert len(dictionary) == 32768
+    assert dictionary.endswith(b'"value-4999"{}[]}, {}]], nullfalsetrue')
+
+def test_compress_document():
+    dictionary = make_dictionary(SPECS)
+    document = object_to_document(OBJECT, SPECS)
+
+    data = compress_document(document, dictionary)
+    assert len(data) < len(zlib.compress(document.encode('utf-8'), 9))
+    assert decompress_document(data, dictionary) == document.encode('utf-8')
+    assert decompress_document(compress_document(document.encode('utf-8'), dictionary), dictionary) == document.encode('utf-8')
+
+    # dictionaries of other specs are detected
+    with pytest.raises(ValueError):
+        decompress_document(data, make_dictionary(ITEM_SPECS))
+
+    with pytest.raises(ValueError):
+        decompress_document(data[:-1], dictionary)
+
+    with pytest.raises(ValueError):
+        decompress_document(data + b'\x00', dictionary)
+
+    # documents exceeding the maximum size aren't decompressed entirely
+    assert decompress_document(data, dictionary, max_bytes=len(document)) == document.encode('utf-8')
+    with pytest.raises(LimitExceeded) as e:
+        decompress_document(data, dictionary, max_bytes=len(document) - 1)
+    assert e.value.record.path == []
+
+    data = compress_document(b'[' + b'0, ' * 1000000 + b'0]', dictionary)
+    with pytest.raises(LimitExceeded):
+        decompress_document(data, dictionary, max_bytes=1024)
+
+    # the size of decompressed documents is limited by default
+    data = compress_document(b'[' + b'0, ' * 6000000 + b'0]', dictionary)
+    with pytest.raises(LimitExceeded) as e:
+        decompress_document(data, dictionary)
+    assert e.value.record.message == "document size must be equal or lower than 16777216 bytes"
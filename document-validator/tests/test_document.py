@@ -7,7 +7,8 @@
 # Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
 
 from byteplug.document import document_to_object
-from byteplug.document import ValidationError
+from byteplug.document import ValidationError, ErrorCode, ErrorRecord
+from byteplug.document import ErrorSummary
 import pytest
 
 # Notes:
@@ -549,6 +550,19 @@ def test_map_type():
     assert errors[2].path == ["$quz"]
     assert errors[2].message == "was expecting a JSON string"
 
+    # test if fields are reported in order; missing fields last and in the
+    # order they're declared
+    errors = []
+    document_to_object('{"bar": true, "yolo": false}', specs, errors=errors)
+    assert len(errors) == 4
+    assert errors[0].path == ["$bar"]
+    assert errors[1].path == []
+    assert errors[1].message == "'yolo' field was unexpected"
+    assert errors[2].path == []
+    assert errors[2].message == "'foo' field was missing"
+    assert errors[3].path == []
+    assert errors[3].message == "'quz' field was missing"
+
 def test_enum_type():
     specs = {
         'type': 'enum',
@@ -571,3 +585,337 @@ def test_enum_type():
         document_to_object('"Hello world!"', specs)
     assert e.value.path == []
     assert e.value.message == "enum value is invalid"
+
+def test_union_type():
+    specs = {
+        'type': 'union',
+        'discriminator': 'kind',
+        'variants': {
+            'click': {
+                'type': 'map',
+                'fields': {
+                    'x': {'type': 'number'},
+                    'y': {'type': 'number'}
+                }
+            },
+            'scroll': {
+                'type': 'map',
+                'fields': {
+                    'delta': {'type': 'number'}
+                }
+            }
+        }
+    }
+
+    for value in ['false', 'true', '42', '42.0', '"foo"', '[]']:
+        with pytest.raises(ValidationError) as e:
+            document_to_object(value, specs)
+        assert e.value.path == []
+        assert e.value.message == "was expecting a JSON object"
+
+    # the discriminator field is kept
+    object = document_to_object('{"kind": "click", "x": 1, "y": 2}', specs)
+    assert object == {'kind': 'click', 'x': 1, 'y': 2}
+
+    object = document_to_object('{"delta": 3, "kind": "scroll"}', specs)
+    assert object == {'delta': 3, 'kind': 'scroll'}
+
+    # test if the discriminator field is checked
+    with pytest.raises(ValidationError) as e:
+        document_to_object('{"x": 1, "y": 2}', specs)
+    assert e.value.path == []
+    assert e.value.message == "'kind' field was missing"
+
+    for value in ['"foo"', '42', '[]']:
+        with pytest.raises(ValidationError) as e:
+            document_to_object('{"kind": %s, "x": 1, "y": 2}' % value, specs)
+        assert e.value.path == []
+        assert e.value.message == "'kind' field must identify a variant"
+
+    # test if the node is checked against its variant only
+    errors = []
+    document_to_object('{"kind": "scroll", "x": 1, "y": "foo"}', specs, errors=errors)
+    assert [error.message for error in errors] == [
+        "'x' field was unexpected",
+        "'y' field was unexpected",
+        "'delta' field was missing"
+    ]
+
+    errors = []
+    document_to_object('{"kind": "click", "x": 1, "y": "foo"}', specs, errors=errors)
+    assert len(errors) == 1
+    assert errors[0].path == ['$y']
+    assert errors[0].message == "was expecting a JSON number"
+
+def test_limits():
+    specs = {
+        'type': 'array',
+        'value': {
+            'type': 'array',
+            'value': {'type': 'string'}
+        }
+    }
+
+    document = '[["foo", "bar"], ["quz"]]'
+    document_to_object(document, specs, max_bytes=25, max_depth=2, max_nodes=6, max_string_length=3)
+
+    # test if the size of the document is limited (in bytes)
+    with pytest.raises(ValidationError) as e:
+        document_to_object(document, specs, max_bytes=24)
+    assert e.value.path == []
+    assert e.value.message == "document size must be equal or lower than 24 bytes"
+
+    with pytest.raises(ValidationError) as e:
+        document_to_object('[["é"]]', specs, max_bytes=7)
+    assert e.value.path == []
+    assert e.value.message == "document size must be equal or lower than 7 bytes"
+
+    # test if the depth of the document is limited
+    with pytest.raises(ValidationError) as e:
+        document_to_object(document, specs, max_depth=1)
+    assert e.value.path == ["[0]", "[0]"]
+    assert e.value.message == "depth must be equal or lower than 1"
+
+    # test if the number of nodes is limited
+    with pytest.raises(ValidationError) as e:
+        document_to_object(document, specs, max_nodes=5)
+    assert e.value.path == ["[1]", "[0]"]
+    assert e.value.message == "number of nodes must be equal or lower than 5"
+
+    # test if the length of strings is limited
+    with pytest.raises(ValidationError) as e:
+        document_to_object('[["foobar"]]', specs, max_string_length=3)
+    assert e.value.path == ["[0]", "[0]"]
+    assert e.value.message == "string length must be equal or lower than 3"
+
+    # test if the conversion is aborted when a limit is exceeded
+    errors = []
+    object = document_to_object('[[42], ["foobar"], [42]]', specs, errors=errors, max_string_length=3)
+    assert object is None
+    assert len(errors) == 2
+    assert errors[0].path == ["[0]", "[0]"]
+    assert errors[0].message == "was expecting a JSON string"
+    assert errors[1].path == ["[1]", "[0]"]
+    assert errors[1].message == "string length must be equal or lower than 3"
+
+def test_deep_document():
+    # test if documents nested deeper than the Python recursion limit are
+    # supported (no recursion is involved)
+    depth = 20000
+
+    specs = {'type': 'string'}
+    for _ in range(depth):
+        specs = {'type': 'map', 'fields': {'foo': specs}}
+
+    document = depth * '{"foo": ' + '"bar"' + depth * '}'
+    object = document_to_object(document, specs)
+    for _ in range(depth):
+        object = object['foo']
+    assert object == "bar"
+
+    # test if errors are reported with their full path
+    document = depth * '{"foo": ' + '42' + depth * '}'
+    with pytest.raises(ValidationError) as e:
+        document_to_object(document, specs)
+    assert e.value.path == depth * ['$foo']
+    assert e.value.message == "was expecting a JSON string"
+
+    # test if the maximum depth is checked while parsing such documents
+    with pytest.raises(ValidationError) as e:
+        document_to_object(document, specs, max_depth=100)
+    assert e.value.message == "depth must be equal or lower than 100"
+
+def test_error_records():
+    specs = {
+        'type': 'array',
+        'value': {
+            'type': 'number',
+            'minimum': 0
+        }
+    }
+
+    # test if errors are reported as records when validating lazily
+    errors = []
+    document_to_object('[1, -1, "foo"]', specs, errors=errors)
+    assert type(errors[0]) is ErrorRecord
+    assert errors[0].code == ErrorCode.MINIMUM
+    assert errors[0].parameter == 0
+    assert errors[0].path == ["[1]"]
+    assert errors[0].message == "value must be equal or greater than 0"
+    assert errors[1].code == ErrorCode.INVALID_TYPE
+    assert errors[1].path == ["[2]"]
+    assert errors[1].message == "was expecting a JSON number"
+
+    exception = errors[0].to_exception()
+    assert type(exception) is ValidationError
+    assert exception.path == ["[1]"]
+    assert exception.message == "value must be equal or greater than 0"
+    assert exception.code == ErrorCode.MINIMUM
+
+    # test if the first record is raised as an exception otherwise
+    with pytest.raises(ValidationError) as e:
+        document_to_object('[1, -1, "foo"]', specs)
+    assert e.value.code == ErrorCode.MINIMUM
+
+    # test if errors aborting the conversion are also reported as records
+    errors = []
+    document_to_object('[1, 2, 3]', specs, errors=errors, max_nodes=2)
+    assert len(errors) == 1
+    assert errors[0].code == ErrorCode.NODES
+    assert errors[0].path == ["[1]"]
+
+def test_error_summary():
+    specs = {
+        'type': 'map',
+        'fields': {
+            'items': {
+                'type': 'array',
+                'value': {
+                    'type': 'map',
+                    'fields': {
+                        'price': {
+                            'type': 'number',
+                            'minimum': 0
+                        }
+                    }
+                }
+            }
+        }
+    }
+
+    items = ', '.join(['{"price": -1}'] * 100 + ['{"price": "foo"}'] + ['{"price": -1}'])
+    errors = ErrorSummary(max_examples=3)
+    document_to_object(f'{{"items": [{items}]}}', specs, errors=errors)
+    assert len(errors) == 102
+
+    groups = list(errors)
+    assert len(groups) == 2
+    assert groups[0].path == ["$items", "[*]", "$price"]
+    assert groups[0].code == ErrorCode.MINIMUM
+    assert groups[0].message == "value must be equal or greater than 0"
+    assert groups[0].count == 101
+    assert [error.path for error in groups[0].examples] == [
+        ["$items", "[0]", "$price"],
+        ["$items", "[1]", "$price"],
+        ["$items", "[2]", "$price"]
+    ]
+    assert groups[1].path == ["$items", "[*]", "$price"]
+    assert groups[1].code == ErrorCode.INVALID_TYPE
+    assert groups[1].count == 1
+    assert groups[1].examples[0].path == ["$items", "[100]", "$price"]
+
+    # errors naming different fields aren't grouped together
+    items = ', '.join(['{"price": 1, "foo": 1}'] * 3 + ['{"price": 1, "bar": 1}', '{}'])
+    errors = ErrorSummary()
+    document_to_object(f'{{"items": [{items}]}}', specs, errors=errors)
+    assert [(group.message, group.count) for group in errors] == [
+        ("'foo' field was unexpected", 3),
+        ("'bar' field was unexpected", 1),
+        ("'price' field was missing", 1)
+    ]
+
+    # only the first fields of a path are given their own group
+    for count in [100, 10000]:
+        fields = ', '.join(f'"field-{index}": 1' for index in range(count))
+        errors = ErrorSummary(max_examples=2, max_fields=3)
+        document_to_object(f'{{"items": [{{"price": 1, {fields}}}]}}', specs, errors=errors)
+        assert len(errors) == count
+        assert errors.truncated == count - 3
+
+        groups = list(errors)
+        assert len(groups) == 4
+        assert sum(len(group.examples) for group in groups) <= 8
+        assert [(group.message, group.count, group.truncated) for group in groups] == [
+            ("'field-0' field was unexpected", 1, False),
+            ("'field-1' field was unexpected", 1, False),
+            ("'field-2' field was unexpected", 1, False),
+            ("other fields were unexpected", count - 3, True)
+        ]
+
+def test_select():
+    specs = {
+        'type': 'map',
+        'fields': {
+            'tenant': {'type': 'string'},
+            'kind': {'type': 'enum', 'values': ['foo', 'bar']},
+            'items': {
+                'type': 'array',
+                'value': {
+                    'type': 'map',
+                    'fields': {
+                        'id': {'type': 'number'},
+                        'tags': {'type': 'array', 'value': {'type': 'string'}},
+                        'note': {'type': 'string', 'option': True}
+                    }
+                }
+            },
+            'extra': {'type': 'flag', 'option': True}
+        }
+    }
+
+    document = '{"tenant": "acme", "kind": "foo", "items": [{"id": 1, "tags": [42]}, {"id": 2, "tags": ["a"]}]}'
+
+    object = document_to_object(document, specs, select=['$tenant', '$kind'])
+    assert object == {'tenant': "acme", 'kind': "foo"}
+
+    object = document_to_object(document, specs, select=[['$items', '[]', '$id'], ['$tenant']])
+    assert object == {'tenant': "acme", 'items': [{'id': 1}, {'id': 2}]}
+
+    # a path selects its node entirely
+    with pytest.raises(ValidationError) as e:
+        document_to_object(document, specs, select=['$items.[].$id', '$items'])
+    assert e.value.path == ['$items', '[0]', '$tags', '[0]']
+
+    # unselected fields are skipped (including unexpected and missing fields)
+    document = '{"tenant": "acme", "kind": 42, "yolo": true}'
+    assert document_to_object(document, specs, select=['$tenant']) == {'tenant': "acme"}
+
+    with pytest.raises(ValidationError) as e:
+        document_to_object('{"kind": "foo"}', specs, select=['$tenant'])
+    assert e.value.message == "'tenant' field was missing"
+
+    # or they're checked shallowly
+    errors = []
+    document_to_object(document, specs, errors=errors, select=['$tenant'], check_unselected=True)
+    assert [(error.path, error.message) for error in errors] == [
+        (['$kind'], "was expecting a JSON string"),
+        ([], "'yolo' field was unexpected"),
+        ([], "'items' field was missing")
+    ]
+
+    with pytest.raises(AssertionError):
+        document_to_object(document, specs, select=['$items.[].$yolo'])
+
+    with pytest.raises(AssertionError):
+        document_to_object(document, specs, select=['$tenant'], lazy=True)
+
+def test_select_tuple():
+    specs = {
+        'type': 'map',
+        'fields': {
+            't': {
+                'type': 'tuple',
+                'items': [
+                    {'type': 'number'},
+                    {'type': 'map', 'fields': {'foo': {'type': 'string'}, 'bar': {'type': 'flag'}}}
+                ]
+            }
+        }
+    }
+
+    document = '{"t": [42, {"foo": "quz", "bar": "yolo"}]}'
+
+    # unselected items keep their position
+    object = document_to_object(document, specs, select=['$t.<0>'])
+    assert object == {'t': [42, None]}
+
+    object = document_to_object(document, specs, select=[['$t', '<1>', '$foo']])
+    assert object == {'t': [None, {'foo': "quz"}]}
+
+    with pytest.raises(ValidationError) as e:
+        document_to_object(document, specs, select=['$t.<1>'])
+    assert e.value.path == ['$t', '<1>', '$bar']
+
+    for segment in ['<2>', '<-1>', '<foo>', '[]']:
+        with pytest.raises(AssertionError):
+            document_to_object(document, specs, select=[['$t', segment]])
@@ -0,0 +1,181 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+from byteplug.document import formats
+from byteplug.document import object_to_document, document_to_object
+from byteplug.document import ValidationError
+import pytest
+
+SPECS = {
+    'type': 'map',
+    'fields': {
+        'foo': {'type': 'flag'},
+        'bar': {'type': 'number', 'decimal': False},
+        'quz': {'type': 'number'},
+        'yolo': {'type': 'string', 'option': True},
+        'keys': {
+            'type': 'object',
+            'key': 'integer',
+            'value': {'type': 'tuple', 'items': [{'type': 'number'}, {'type': 'string'}]}
+        },
+        'names': {
+            'type': 'object',
+            'key': 'string',
+            'value': {'type': 'array', 'value': {'type': 'number'}}
+        }
+    }
+}
+
+OBJECT = {
+    'foo': True,
+    'bar': -(1 << 40),
+    'quz': 1.5,
+    'yolo': None,
+    'keys': {4: (2, "héllo"), -300: (0.25, "")},
+    'names': {'foo': [1, 70000, -33], 'bar': []}
+}
+
+@pytest.fixture(params=['pure', 'native'])
+def implementation(request, monkeypatch, format):
+    # The pure-Python implementations are used when the native packages are
+    # marked as not installed.
+    if request.param == 'pure':
+        monkeypatch.setattr(formats, 'native_packages', {'msgpack': None})
+    else:
+        if format not in formats.NATIVE_PACKAGES:
+            pytest.skip(f"no native package for {format}")
+        pytest.importorskip(formats.NATIVE_PACKAGES[format])
+        monkeypatch.setattr(formats, 'native_packages', {})
+
+    return request.param
+
+@pytest.mark.parametrize('format', ['msgpack', 'cbor'])
+def test_formats(implementation, format):
+    document = object_to_document(OBJECT, SPECS, format=format)
+    assert type(document) is bytes
+    assert len(document) < len(object_to_document(OBJECT, SPECS))
+
+    # integer keys are represented natively
+    assert formats.loads(document, format)['keys'] == {4: [2, "héllo"], -300: [0.25, ""]}
+    assert document_to_object(document, SPECS, format=format) == OBJECT
+
+    # documents are checked like JSON documents are
+    specs = {'type': 'array', 'value': {'type': 'number', 'decimal': False, 'maximum': 10}}
+    errors = []
+    document_to_object(formats.dumps([1, 20, 2.5], format), specs, errors=errors, format=format)
+    assert len(errors) == 2
+    assert errors[0].path == ['[1]']
+    assert errors[0].message == "value must be equal or lower than 10"
+    assert errors[1].path == ['[2]']
+
+    specs = {'type': 'object', 'key': 'integer', 'value': {'type': 'flag'}}
+    assert document_to_object(formats.dumps({'1': True, 2: False}, format), specs, format=format) == {1: True, 2: False}
+    with pytest.raises(ValidationError) as e:
+        document_to_object(formats.dumps({1: True, 'a': False}, format), specs, format=format)
+    assert e.value.message == "key at index 1 is invalid; expected it to be an integer"
+
+    specs = {'type': 'object', 'key': 'string', 'value': {'type': 'flag'}}
+    with pytest.raises(ValidationError) as e:
+        document_to_object(formats.dumps({'a': True, 2: False}, format), specs, format=format)
+    assert e.value.message == "key at index 1 is invalid; expected to match the pattern"
+
+    with pytest.raises(ValidationError) as e:
+        document_to_object(formats.dumps(b'foo', format), {'type': 'string'}, format=format)
+    assert e.value.message == "was expecting a JSON string"
+
+    # limits are enforced
+    document = formats.dumps([[[1]]], format)
+    specs = {'type': 'array', 'value': {'type': 'array', 'value': {'type': 'array', 'value': {'type': 'number'}}}}
+    with pytest.raises(ValidationError) as e:
+        document_to_object(document, specs, max_depth=2, format=format)
+    assert e.value.message == "depth must be equal or lower than 2"
+
+    with pytest.raises(ValidationError) as e:
+        document_to_object(document, specs, max_bytes=2, format=format)
+    assert e.value.message == "document size must be equal or lower than 2 bytes"
+
+@pytest.mark.parametrize('format', ['msgpack', 'cbor'])
+def test_formats_values(format):
+    values = [
+        None, True, False, 0, 1, -1, 23, 24, -24, -25, 127, 128, -32, -33,
+        255, 256, -128, -129, 65535, 65536, -32768, -32769,
+        (1 << 32) - 1, 1 << 32, -(1 << 31), -(1 << 31) - 1,
+        (1 << 64) - 1, -(1 << 63), 0.0, -2.5, 1e300,
+        "", "a" * 31, "a" * 32, "é" * 200, "a" * 70000, b'', b'foo', b'a' * 300,
+        [], list(range(15)), list(range(16)), list(range(70000)),
+        {}, {i: str(i) for i in range(15)}, {str(i): i for i in range(16)}
+    ]
+    if format == 'cbor':
+        # Bignums.
+        values += [1 << 64, -(1 << 64) - 1, 1 << 200]
+
+    for value in values:
+        document = formats.encode(value, formats.WRITERS[format])
+        assert formats.decode(document, formats.READERS[format]) == value
+
+    # documents nested too deeply for the native packages are supported
+    value = []
+    for _ in range(10000):
+        value = [value]
+    document = formats.dumps(value, format)
+    value = formats.loads(document, format)
+    for _ in range(10000):
+        assert len(value) == 1
+        value = value[0]
+    assert value == []
+
+    with pytest.raises(ValidationError) as e:
+        document_to_object(document, {'type': 'array', 'value': {'type': 'flag'}}, max_depth=100, format=format)
+    assert e.value.message == "depth must be equal or lower than 100"
+
+@pytest.mark.parametrize('format', ['msgpack', 'cbor'])
+def test_formats_invalid(implementation, format):
+    document = formats.encode({'foo': [1, "bar"]}, formats.WRITERS[format])
+
+    invalid_documents = [
+        b'',
+        document[:-1],          # truncated
+        document + b'\x00',     # trailing bytes
+        document[:1] + b'\xff' + document[2:]
+    ]
+    for invalid_document in invalid_documents:
+        with pytest.raises(ValueError):
+            formats.decode(invalid_document, formats.READERS[format])
+
+    # counts can't exceed the remaining bytes
+    huge_array = b'\xdd\xff\xff\xff\xff' if format == 'msgpack' else b'\x9a\xff\xff\xff\xff'
+    with pytest.raises(ValueError):
+        formats.decode(huge_array + b'\x00', formats.READERS[format])
+
+    # documents are rejected the same way by the native packages
+    if format == 'msgpack':
+        unsupported_documents = [
+            b'\xd6\x05\x00\x00\x00\x01',  # extension type
+            b'\xd6\xff\x00\x00\x00\x01',  # timestamp
+            b'\x81\x80\x01',                 # map key
+            b'\x81\x91\x01\x01',            # array key
+            b'\xc1'
+        ]
+    else:
+        unsupported_documents = [
+            b'\x9f\x01\xff',                 # indefinite-length array
+            b'\xc4\x82\x21\x19\x6a\xb3',  # decimal fraction
+            b'\xd8\x23\x63abc',              # regular expression
+            b'\xf7',                          # undefined
+            b'\xa1\x80\x01'                  # array key
+        ]
+    for unsupported_document in unsupported_documents:
+        with pytest.raises(ValueError):
+            formats.loads(unsupported_document, format)
+
+        with pytest.raises(ValueError):
+            document_to_object(unsupported_document, {'type': 'flag'}, format=format)
+
+    # timestamp headers inside values aren't rejected
+    document = formats.dumps("\xd6\xff", format)
+    assert formats.loads(document, format) == "\xd6\xff"
@@ -0,0 +1,145 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+from byteplug.document import document_to_object, normalize_specs
+from byteplug.document import generate_documents
+import pytest
+
+SPECS = {
+    'type': 'map',
+    'fields': {
+        'flag': {'type': 'flag'},
+        'integer': {
+            'type': 'number',
+            'decimal': False,
+            'minimum': {'value': 0, 'exclusive': True},
+            'maximum': 10
+        },
+        'decimal': {
+            'type': 'number',
+            'minimum': -1.5,
+            'option': True
+        },
+        'slug': {
+            'type': 'string',
+            'length': {'minimum': 3, 'maximum': 24},
+            'pattern': r"^[a-z]+(-[a-z0-9]+)*$"
+        },
+        'code': {
+            'type': 'string',
+            'length': 5,
+            'pattern': r"^(?:[A-F]|\d){5}$"
+        },
+        'items': {
+            'type': 'array',
+            'value': {
+                'type': 'tuple',
+                'items': [
+                    {'type': 'string'},
+                    {'type': 'enum', 'values': ['foo', 'bar', 'quz']}
+                ]
+            },
+            'length': {'maximum': 3}
+        },
+        'scores': {
+            'type': 'object',
+            'key': 'integer',
+            'value': {'type': 'number'},
+            'length': {'minimum': 1}
+        },
+        'tags': {
+            'type': 'object',
+            'key': 'string',
+            'value': {'type': 'flag', 'option': True},
+            'option': True
+        },
+        'event': {
+            'type': 'union',
+            'discriminator': 'kind',
+            'variants': {
+                'click': {
+                    'type': 'map',
+                    'fields': {
+                        'x': {'type': 'number'},
+                        'y': {'type': 'number', 'option': True}
+                    }
+                },
+                'scroll': {
+                    'type': 'map',
+                    'fields': {'delta': {'type': 'number'}}
+                }
+            }
+        }
+    }
+}
+
+def test_generate_documents():
+    documents = list(generate_documents(SPECS, 500, seed=42))
+    assert len(documents) == 500
+    for document in documents:
+        document_to_object(document, SPECS)
+
+    # the same seed yields the same documents
+    assert list(generate_documents(SPECS, 500, seed=42)) == documents
+    assert list(generate_documents(SPECS, 500, seed=43)) != documents
+
+def test_generate_invalid_documents():
+    invalid_count = 0
+    for document in generate_documents(SPECS, 1000, seed=42, invalid_ratio=0.5):
+        errors = []
+        document_to_object(document, SPECS, errors=errors)
+        if len(errors) > 0:
+            invalid_count += 1
+
+    assert 400 < invalid_count < 600
+
+    # each invalid document is actually invalid
+    for document in generate_documents(SPECS, 1000, seed=42, invalid_ratio=1.0):
+        errors = []
+        document_to_object(document, SPECS, errors=errors)
+        assert len(errors) > 0
+
+def test_generate_recursive_documents():
+    records = {
+        'tree': {
+            'type': 'map',
+            'fields': {
+                'value': {'type': 'number'},
+                'children': {
+                    'type': 'array',
+                    'value': {'type': 'reference', 'record': 'tree'},
+                    'option': True
+                }
+            }
+        }
+    }
+    specs = normalize_specs({'type': 'reference', 'record': 'tree'}, records)
+
+    for document in generate_documents(specs, 100, seed=42):
+        document_to_object(document, specs)
+
+    for document in generate_documents(specs, 100, seed=42, invalid_ratio=1.0):
+        errors = []
+        document_to_object(document, specs, errors=errors)
+        assert len(errors) > 0
+
+    # the recursion must be optional
+    records['tree']['fields']['children']['option'] = False
+    records['tree']['fields']['children']['length'] = {'minimum': 1}
+    with pytest.raises(ValueError):
+        list(generate_documents({'type': 'reference', 'record': 'tree'}, 1, records=records))
+
+def test_generate_impossible_documents():
+    specs = {
+        'type': 'string',
+        'length': {'maximum': 2},
+        'pattern': r"^[a-z]{3}$"
+    }
+
+    with pytest.raises(ValueError):
+        list(generate_documents(specs, 1))
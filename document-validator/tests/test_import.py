@@ -0,0 +1,52 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import sys
+import subprocess
+import byteplug.document
+import pytest
+
+def imported_modules(statement):
+    # Return the modules imported by a fresh interpreter running the
+    # statement.
+    process = subprocess.run(
+        [sys.executable, '-c', f"import sys; {statement}; print(' '.join(sys.modules))"],
+        capture_output=True, text=True, check=True
+    )
+
+    return set(process.stdout.split())
+
+def test_lazy_imports():
+    modules = imported_modules("from byteplug.document import document_to_object, object_to_document")
+    assert 'byteplug.document.document' in modules
+    for module in ['yaml', 'pkg_resources', 'byteplug.document.loader', 'byteplug.document.generator']:
+        assert module not in modules
+
+    # modules of the optional features are imported when they're used
+    optional_modules = [
+        'pickle',
+        'byteplug.document.formats',
+        'byteplug.document.deepjson',
+        'byteplug.document.summary',
+        'byteplug.document.profiler',
+        'byteplug.document.lazy',
+        'byteplug.document.projection'
+    ]
+    for module in optional_modules:
+        assert module not in modules
+
+    modules = imported_modules("from byteplug.document import load_specs")
+    assert 'yaml' in modules
+
+    # all public names are exposed
+    for name in byteplug.document.__all__:
+        assert getattr(byteplug.document, name) is not None
+    assert set(byteplug.document.__all__) <= set(dir(byteplug.document))
+
+    with pytest.raises(AttributeError):
+        byteplug.document.foo
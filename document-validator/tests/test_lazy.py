@@ -0,0 +1,120 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import json
+from byteplug.document import document_to_object
+from byteplug.document import LazyDict, LazyList
+from byteplug.document import ValidationError
+import pytest
+
+SPECS = {
+    'type': 'map',
+    'fields': {
+        'foo': {'type': 'string'},
+        'bar': {
+            'type': 'array',
+            'value': {
+                'type': 'map',
+                'fields': {
+                    'quz': {'type': 'number', 'minimum': 0},
+                    'yolo': {'type': 'tuple', 'items': [{'type': 'flag'}, {'type': 'flag'}]}
+                }
+            }
+        },
+        'baz': {
+            'type': 'object',
+            'key': 'integer',
+            'value': {'type': 'string'},
+            'option': True
+        },
+        'qux': {'type': 'flag', 'option': True}
+    }
+}
+
+def test_lazy_conversion():
+    document = {
+        'foo': "Hello world!",
+        'bar': [
+            {'quz': 1, 'yolo': [True, False]},
+            {'quz': -1, 'yolo': [True, False]}
+        ],
+        'baz': {'1': "one", '2': "two"}
+    }
+
+    object = document_to_object(json.dumps(document), SPECS, lazy=True)
+    assert type(object) is LazyDict
+    assert list(object.keys()) == ['foo', 'bar', 'baz', 'qux']
+    assert 'qux' in object
+    assert object['qux'] is None
+    assert object['foo'] == "Hello world!"
+
+    # containers are proxies as well and values are cached
+    assert type(object['bar']) is LazyList
+    assert object['bar'] is object['bar']
+    assert len(object['bar']) == 2
+    assert object['bar'][0] == {'quz': 1, 'yolo': (True, False)}
+    assert object['bar'][-2]['yolo'] == (True, False)
+    assert object['baz'] == {1: "one", 2: "two"}
+
+    # invalid children are reported when they're accessed
+    item = object['bar'][1]
+    with pytest.raises(ValidationError) as e:
+        item['quz']
+    assert e.value.path == ['$bar', '[1]', '$quz']
+    assert e.value.message == "value must be equal or greater than 0"
+
+    with pytest.raises(IndexError):
+        object['bar'][2]
+
+    with pytest.raises(KeyError):
+        object['yolo']
+
+    # the node itself is checked when it's created
+    with pytest.raises(ValidationError) as e:
+        document_to_object(json.dumps(document | {'yolo': 42}), SPECS, lazy=True)
+    assert e.value.path == []
+    assert e.value.message == "'yolo' field was unexpected"
+
+def test_validate_all():
+    document = {
+        'foo': "Hello world!",
+        'bar': [{'quz': 1, 'yolo': [True, 42]}, {'quz': -1, 'yolo': [True, False]}]
+    }
+
+    object = document_to_object(json.dumps(document), SPECS, lazy=True)
+    assert object['foo'] == "Hello world!"
+
+    with pytest.raises(ValidationError) as e:
+        object.validate_all()
+    assert e.value.path == ['$bar', '[0]', '$yolo', '<1>']
+
+    errors = []
+    object.validate_all(errors=errors)
+    assert [error.path for error in errors] == [['$bar', '[0]', '$yolo', '<1>'], ['$bar', '[1]', '$quz']]
+
+    errors = []
+    object['bar'][1].validate_all(errors=errors)
+    assert [error.path for error in errors] == [['$bar', '[1]', '$quz']]
+
+    document['bar'] = [{'quz': 1, 'yolo': [True, False]}]
+    object = document_to_object(json.dumps(document), SPECS, lazy=True)
+    object.validate_all()
+    assert object['bar'] == [{'quz': 1, 'yolo': (True, False)}]
+
+def test_lazy_limits():
+    document = {'foo': "bar", 'bar': [{'quz': index, 'yolo': [True, False]} for index in range(10)]}
+
+    # nodes are counted as they're converted
+    object = document_to_object(json.dumps(document), SPECS, lazy=True, max_nodes=10)
+    items = object['bar']
+    for index in range(4):
+        items[index]['quz']
+
+    with pytest.raises(ValidationError) as e:
+        items[4]['quz']
+    assert e.value.message == "number of nodes must be equal or lower than 10"
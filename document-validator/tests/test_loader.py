@@ -0,0 +1,150 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+from byteplug.document import load_specs, normalize_specs
+from byteplug.document import ValidationError
+from byteplug.document import loader
+import pickle
+import pytest
+
+SPECS = """\
+type: map
+fields:
+  foo:
+    type: string
+    pattern: "^[a-z]+$"
+  bar:
+    type: array
+    value:
+      type: number
+    length: 42.5
+"""
+
+def test_load_specs(tmp_path):
+    path = tmp_path / 'specs.yml'
+    path.write_text(SPECS)
+
+    warnings = []
+    specs = load_specs(path, warnings=warnings)
+    assert specs == normalize_specs(loader.yaml.safe_load(SPECS))
+
+    assert len(warnings) == 1
+    assert warnings[0].path == ["$bar", "length"]
+    assert warnings[0].message == "should be an integer (got float)"
+    assert (warnings[0].line, warnings[0].column) == (10, 13)
+
+def test_load_specs_errors(tmp_path):
+    path = tmp_path / 'specs.yml'
+    path.write_text(SPECS.replace("type: number", "type: numbr"))
+
+    with pytest.raises(ValidationError) as e:
+        load_specs(path)
+    assert e.value.path == ["$bar", "[]"]
+    assert e.value.message == "value of 'type' is incorrect"
+    assert (e.value.line, e.value.column) == (9, 7)
+
+    # missing values are located at their parent
+    path.write_text(SPECS.replace("    type: string\n", ""))
+
+    errors = []
+    assert load_specs(path, errors=errors) is None
+    assert len(errors) == 1
+    assert errors[0].path == ["$foo"]
+    assert errors[0].message == "'type' property is missing"
+    assert (errors[0].line, errors[0].column) == (4, 5)
+
+    path.write_text("type: map\nfields: [\n")
+
+    with pytest.raises(ValidationError) as e:
+        load_specs(path)
+    assert e.value.path == []
+    assert e.value.message == "YAML is invalid"
+    assert e.value.line == 3
+
+def test_load_specs_cache(tmp_path, monkeypatch):
+    path = tmp_path / 'specs.yml'
+    path.write_text(SPECS)
+
+    cache_directory = tmp_path / 'cache'
+    specs = load_specs(path, cache_directory=cache_directory)
+    assert len(list(cache_directory.iterdir())) == 1
+
+    # cached specs are neither parsed nor validated
+    def read_yaml(content):
+        raise AssertionError("specs should have been cached")
+    monkeypatch.setattr(loader, 'read_yaml', read_yaml)
+
+    warnings = []
+    cached_specs = load_specs(path, warnings=warnings, cache_directory=cache_directory)
+    assert cached_specs == specs
+    assert cached_specs['fields']['foo']['pattern'] is specs['fields']['foo']['pattern']
+
+    assert len(warnings) == 1
+    assert warnings[0].path == ["$bar", "length"]
+    assert (warnings[0].line, warnings[0].column) == (10, 13)
+
+    # a different file is a different entry
+    path.write_text(SPECS + "description: Foo.\n")
+    with pytest.raises(AssertionError):
+        load_specs(path, cache_directory=cache_directory)
+
+def test_load_specs_cache_failures(tmp_path):
+    path = tmp_path / 'specs.yml'
+    path.write_text(SPECS)
+
+    # a corrupted cache is ignored and written again
+    cache_directory = tmp_path / 'cache'
+    specs = load_specs(path, cache_directory=cache_directory)
+    cache_path, = cache_directory.iterdir()
+
+    for content in [b'', b'foo', cache_path.read_bytes()[:-10], pickle.dumps(42)]:
+        cache_path.write_bytes(content)
+
+        warnings = []
+        assert load_specs(path, warnings=warnings, cache_directory=cache_directory) == specs
+        assert len(warnings) == 1
+        assert loader.read_cache(cache_path) is not None
+
+    # a cache that can't be written is skipped
+    cache_directory = tmp_path / 'file'
+    cache_directory.write_text("")
+    assert load_specs(path, cache_directory=cache_directory) == specs
+
+def test_load_specs_records(tmp_path):
+    path = tmp_path / 'specs.yml'
+    path.write_text("type: array\nvalue:\n  type: reference\n  record: user\n")
+
+    records = {
+        'user': {
+            'type': 'map',
+            'fields': {'name': {'type': 'string'}}
+        }
+    }
+
+    with pytest.raises(ValidationError) as e:
+        load_specs(path)
+    assert e.value.path == ["[]", "record"]
+    assert e.value.message == "'user' record is undefined"
+    assert (e.value.line, e.value.column) == (4, 11)
+
+    specs = load_specs(path, records=records)
+    assert specs['value']['type'] == 'map'
+    assert specs['value']['fields']['name']['type'] == 'string'
+
+    # the records are part of the cache entry
+    cache_directory = tmp_path / 'cache'
+    specs = load_specs(path, cache_directory=cache_directory, records=records)
+    assert specs['value']['type'] == 'map'
+
+    other_records = {'user': {'type': 'string'}}
+    specs = load_specs(path, cache_directory=cache_directory, records=other_records)
+    assert specs['value']['type'] == 'string'
+    assert len(list(cache_directory.iterdir())) == 2
+
+    with pytest.raises(ValidationError):
+        load_specs(path, cache_directory=cache_directory)
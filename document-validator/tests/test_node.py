@@ -8,6 +8,7 @@
 
 from byteplug.document.node import Node
 import yaml
+import pytest
 
 def test_type():
     for type_ in ['flag', 'number', 'string']:
@@ -15,7 +16,8 @@ def test_type():
 
         assert node.to_object() == {'type': type_}
 
-        assert node(option=True).to_object() == {
+        node = node(option=True)
+        assert node.to_object() == {
             'type': type_,
             'option': True
         }
@@ -28,6 +30,29 @@ def test_type():
             'option': True
         }
 
+def test_immutability():
+    node = Node('array', value=Node('number'))
+
+    # calling a node returns a new node
+    other_node = node(option=True)
+    assert other_node is not node
+    assert node.to_object() == {'type': 'array', 'value': {'type': 'number'}}
+
+    with pytest.raises(AttributeError):
+        node.type_ = 'flag'
+
+    # the object form of children is shared
+    value = Node('number', min=0)
+    node = Node('map', fields={'foo': value, 'bar': value})
+    assert node.to_object()['fields']['foo'] is value.to_object()
+    assert node.to_object() is node.to_object()
+
+    # nodes are compared structurally
+    assert Node('array', value=Node('number')) == Node('array', value=Node('number'))
+    assert Node('array', value=Node('number')) != Node('array', value=Node('string'))
+    assert hash(Node('array', value=Node('number'))) == hash(Node('array', value=Node('number')))
+    assert len({Node('flag'), Node('flag'), Node('flag', option=True)}) == 2
+
 def test_flag_type():
     flag = Node('flag', option=True)
     assert flag.to_object() == {'type': 'flag', 'option': True}
@@ -175,3 +200,37 @@ def test_enum_type():
         'option': True
     }
     yaml.dump(enum)
+
+def test_union_type():
+    Node('union', discriminator='kind', variants={'foo': Node('map', fields={'bar': Node('flag')})})
+
+    union = Node('union',
+        discriminator='kind',
+        variants={
+            'foo': Node('map', fields={'bar': Node('flag')}),
+            'quz': Node('map', fields={'bar': Node('number')})
+        },
+        option=True
+    )
+    assert union.to_object() == {
+        'type': 'union',
+        'discriminator': 'kind',
+        'variants': {
+            'foo': {'type': 'map', 'fields': {'bar': {'type': 'flag'}}},
+            'quz': {'type': 'map', 'fields': {'bar': {'type': 'number'}}}
+        },
+        'option': True
+    }
+    yaml.dump(union)
+
+    with pytest.raises(AssertionError):
+        Node('union', variants={'foo': Node('flag')})
+
+def test_reference_type():
+    reference = Node('reference', record='foo', option=True)
+    assert reference.to_object() == {
+        'type': 'reference',
+        'record': 'foo',
+        'option': True
+    }
+    yaml.dump(reference)
@@ -560,6 +560,19 @@ def test_map_type():
     assert errors[2].path == ["$quz"]
     assert errors[2].message == "was expecting a string"
 
+    # test if fields are reported in order; missing fields last and in the
+    # order they're declared
+    errors = []
+    object_to_document({'bar': True, 'yolo': False}, specs, errors=errors)
+    assert len(errors) == 4
+    assert errors[0].path == ["$bar"]
+    assert errors[1].path == []
+    assert errors[1].message == "'yolo' field was unexpected"
+    assert errors[2].path == []
+    assert errors[2].message == "'foo' field was missing"
+    assert errors[3].path == []
+    assert errors[3].message == "'quz' field was missing"
+
 def test_enum_type():
     specs = {
         'type': 'enum',
@@ -581,3 +594,73 @@ def test_enum_type():
         object_to_document("Hello world!", specs)
     assert e.value.path == []
     assert e.value.message == "enum value is invalid"
+
+def test_union_type():
+    specs = {
+        'type': 'union',
+        'discriminator': 'kind',
+        'variants': {
+            'click': {
+                'type': 'map',
+                'fields': {
+                    'x': {'type': 'number'},
+                    'y': {'type': 'number'}
+                }
+            },
+            'scroll': {
+                'type': 'map',
+                'fields': {
+                    'delta': {'type': 'number'}
+                }
+            }
+        }
+    }
+
+    for value in [False, True, 42, 42.0, "foo", [], ()]:
+        with pytest.raises(ValidationError) as e:
+            object_to_document(value, specs)
+        assert e.value.path == []
+        assert e.value.message == "was expecting a dict"
+
+    document = object_to_document({'kind': 'click', 'x': 1, 'y': 2}, specs)
+    assert document == '{"kind": "click", "x": 1, "y": 2}'
+
+    # test if the discriminator field is checked
+    with pytest.raises(ValidationError) as e:
+        object_to_document({'x': 1, 'y': 2}, specs)
+    assert e.value.path == []
+    assert e.value.message == "'kind' field was missing"
+
+    with pytest.raises(ValidationError) as e:
+        object_to_document({'kind': 'foo', 'x': 1, 'y': 2}, specs)
+    assert e.value.path == []
+    assert e.value.message == "'kind' field must identify a variant"
+
+    with pytest.raises(ValidationError) as e:
+        object_to_document({'kind': 'scroll', 'delta': "foo"}, specs)
+    assert e.value.path == ['$delta']
+    assert e.value.message == "was expecting an integer or float"
+
+def test_deep_object():
+    # test if objects nested deeper than the Python recursion limit are
+    # supported (no recursion is involved)
+    depth = 20000
+
+    specs = {'type': 'string'}
+    object = "bar"
+    for _ in range(depth):
+        specs = {'type': 'map', 'fields': {'foo': specs}}
+        object = {'foo': object}
+
+    document = object_to_document(object, specs)
+    assert document == depth * '{"foo": ' + '"bar"' + depth * '}'
+
+    # test if errors are reported with their full path
+    object = 42
+    for _ in range(depth):
+        object = {'foo': object}
+
+    with pytest.raises(ValidationError) as e:
+        object_to_document(object, specs)
+    assert e.value.path == depth * ['$foo']
+    assert e.value.message == "was expecting a string"
@@ -0,0 +1,148 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+import re
+import pickle
+from byteplug.document import validate_specs, document_to_object
+from byteplug.document import ValidationError
+from byteplug.document.pattern import compile_pattern, is_vulnerable_pattern
+from byteplug.document.pattern import LinearPattern, BacktrackingPattern, Re2Pattern
+import byteplug.document.pattern
+import byteplug.document.utility
+import pytest
+
+SAFE_PATTERNS = [
+    r"^[a-z]+(-[a-z]+)*$",
+    r"^\d{2,4}x?$",
+    r"^(\d{3}-)*$",
+    r"^(foo|far)*$",
+    r"^(ab|a)*c$",
+    r"^([a-z]+\.)+[a-z]{2,}$",
+    r"^[\w.+-]+@[\w-]+\.[\w.-]+$"
+]
+
+VULNERABLE_PATTERNS = [
+    r"^(a+)+$",
+    r"(a|aa)+$",
+    r"(a*)*b",
+    r"^(\w+\s?)*$",
+    r"(\s*\w+)*$",
+    r"(.*a){5}"
+]
+
+def test_is_vulnerable_pattern():
+    for pattern in SAFE_PATTERNS:
+        assert not is_vulnerable_pattern(pattern)
+
+    for pattern in VULNERABLE_PATTERNS:
+        assert is_vulnerable_pattern(pattern)
+
+def test_linear_pattern():
+    patterns = SAFE_PATTERNS + VULNERABLE_PATTERNS + [
+        r"a.b",
+        r"^[^abc]+$",
+        r"\bfoo\b",
+        r"^(?:a|b|)c",
+        r"^[\d\s]+\Z",
+        r"^$"
+    ]
+
+    strings = [
+        "", "a", "aa", "aaa!", "ab", "abc", "a-b", "foo", "foo bar", "far",
+        "123", "123-456-", "12\n", "a.bc", "a@b.c", "aaab", "c", "ac"
+    ]
+
+    for pattern in patterns:
+        linear_pattern = LinearPattern(pattern)
+        for string in strings:
+            assert linear_pattern.match(string) == bool(re.match(pattern, string))
+
+def test_compile_pattern(monkeypatch):
+    monkeypatch.setattr(byteplug.document.pattern, 're2', None)
+    monkeypatch.setattr(byteplug.document.pattern, 'compiled_patterns', {})
+
+    assert type(compile_pattern(r"^[a-z]+$")) is re.Pattern
+    assert type(compile_pattern(r"^(a+)+$")) is LinearPattern
+    assert type(compile_pattern(r"^(a+)+(?=!)")) is BacktrackingPattern
+
+    # the pattern is compiled once
+    assert compile_pattern(r"^[a-z]+$") is compile_pattern(r"^[a-z]+$")
+
+    with pytest.raises(re.error):
+        compile_pattern(r"^[a-z+$")
+
+    # compiled patterns are pickled as their source
+    for pattern in [r"^(a+)+$", r"^(a+)+(?=!)"]:
+        assert pickle.loads(pickle.dumps(compile_pattern(pattern))) is compile_pattern(pattern)
+
+    # the oldest patterns are evicted when the cache is full
+    monkeypatch.setattr(byteplug.document.utility, 'MEMO_SIZE', 2)
+    monkeypatch.setattr(byteplug.document.pattern, 'compiled_patterns', {})
+    for pattern in [r"^a$", r"^b$", r"^c$"]:
+        compile_pattern(pattern)
+    assert list(byteplug.document.pattern.compiled_patterns) == [r"^b$", r"^c$"]
+
+def test_re2_pattern(monkeypatch):
+    pytest.importorskip('re2')
+    monkeypatch.setattr(byteplug.document.pattern, 'compiled_patterns', {})
+
+    # only vulnerable patterns are compiled with the 're2' module
+    assert type(compile_pattern(r"^[a-z]+$")) is re.Pattern
+    assert type(compile_pattern(r"^(a+)+$")) is Re2Pattern
+    assert type(compile_pattern(r"^(\w+\s?)*$")) is LinearPattern
+
+    patterns = VULNERABLE_PATTERNS + [
+        r"^([a-c]+|[^x]b)+$",
+        r"^(a+)+\$$",
+        r"^(a+)+",
+        r"\A(.+)+x"
+    ]
+
+    strings = [
+        "", "a", "aa", "aa\n", "a\n\n", "aaa!", "ab", "abc", "ab\nb",
+        "a$", "a$\n", "12\n", "٣", "é", "aaaax", "\ud800", "a\ud800"
+    ]
+
+    # results are the same as the ones of the 're' module
+    for pattern in patterns:
+        compiled_pattern = compile_pattern(pattern)
+        for string in strings:
+            assert bool(compiled_pattern.match(string)) == bool(re.match(pattern, string))
+
+    assert pickle.loads(pickle.dumps(compile_pattern(r"^(a+)+$"))) is compile_pattern(r"^(a+)+$")
+
+def test_vulnerable_pattern_specs():
+    specs = {
+        'type': 'string',
+        'pattern': r"^(a+)+$"
+    }
+
+    warnings = []
+    validate_specs(specs, warnings=warnings)
+    assert warnings[0].path == ['pattern']
+    assert warnings[0].message == "pattern is subject to catastrophic backtracking"
+
+    # a crafted string doesn't take exponential time to be rejected
+    value = 64 * 'a' + '!'
+    with pytest.raises(ValidationError) as e:
+        document_to_object(f'"{value}"', specs)
+    assert e.value.message == "value did not match the pattern"
+
+    # when the pattern can't be evaluated in linear time, it's not evaluated
+    # if the length of the string is invalid
+    specs = {
+        'type': 'string',
+        'length': {'maximum': 16},
+        'pattern': r"^(a+)+(?=!)"
+    }
+
+    errors = []
+    value = 20 * 'b'
+    document_to_object(f'"{value}"', specs, errors=errors)
+    assert len(errors) == 1
+    assert errors[0].message == "length must be equal or lower than 16"
@@ -0,0 +1,68 @@
+# Copyright (c) 2022 - Byteplug Inc.
+#
+# This source file is part of the Byteplug toolkit for the Python programming
+# language which is released under the OSL-3.0 license. Please refer to the
+# LICENSE file that can be found at the root of the project directory.
+#
+# Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
+
+from byteplug.document import document_to_object, object_to_document
+from byteplug.document import Profiler
+import pytest
+
+SPECS = {
+    'type': 'map',
+    'fields': {
+        'items': {
+            'type': 'array',
+            'value': {
+                'type': 'map',
+                'fields': {
+                    'name': {'type': 'string'},
+                    'price': {
+                        'type': 'number',
+                        'minimum': 0
+                    }
+                }
+            }
+        }
+    }
+}
+
+def test_profiler():
+    profiler = Profiler()
+
+    document = '{"items": [{"name": "foo", "price": 1}, {"name": "quz", "price": -1}]}'
+    errors = []
+    document_to_object(document, SPECS, errors=errors, profiler=profiler)
+    assert len(errors) == 1
+
+    # statistics are accumulated over conversions
+    object_to_document({'items': [{'name': "foobar"}]}, SPECS, errors=[], profiler=profiler)
+
+    nodes = profiler.to_dict()
+    assert set(nodes.keys()) == {'', '$items', '$items.[*]', '$items.[*].$name', '$items.[*].$price'}
+
+    assert nodes['']['calls'] == 2
+    assert nodes['$items']['sizes'] == {'count': 2, 'total': 3, 'minimum': 1, 'maximum': 2}
+    assert nodes['$items.[*]']['calls'] == 3
+    assert nodes['$items.[*]']['failures'] == 1 # the missing 'price' field
+    assert nodes['$items.[*].$name']['sizes'] == {'count': 3, 'total': 12, 'minimum': 3, 'maximum': 6}
+    assert nodes['$items.[*].$price']['calls'] == 2
+    assert nodes['$items.[*].$price']['failures'] == 1
+
+    for node in nodes.values():
+        assert node['cumulative_time'] >= node['time'] >= 0.0
+    assert nodes['']['cumulative_time'] == pytest.approx(sum(node['time'] for node in nodes.values()))
+
+    # test the text and collapsed stack exports
+    lines = profiler.to_text().splitlines()
+    assert lines[0].split() == ['calls', 'tottime', 'cumtime', 'failures', 'avgsize', 'maxsize', 'path']
+    assert lines[1].split()[-1] == '<root>'
+    assert len(lines) == 6
+
+    lines = profiler.to_collapsed().splitlines()
+    assert len(lines) == 5
+    assert any(line.startswith('<root>;$items;[*];$price ') for line in lines)
+    for line in lines:
+        int(line.split(' ')[-1])
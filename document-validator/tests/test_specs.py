@@ -6,8 +6,11 @@
 #
 # Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, June 2022
 
-from byteplug.document import validate_specs
+from byteplug.document import validate_specs, normalize_specs, pickle_specs
+from byteplug.document import Node
 from byteplug.document import ValidationError
+from types import MappingProxyType
+import pickle
 import pytest
 
 VALID_NAMES = [
@@ -30,17 +33,17 @@ def dict_minus_item(a, key):
     b.pop(key)
     return b
 
-def bool_value_property_test(specs, key, path):
-    validate_specs(specs | {key: True})
-    validate_specs(specs | {key: False})
+def bool_value_property_test(specs, key, path, **kwargs):
+    validate_specs(specs | {key: True}, **kwargs)
+    validate_specs(specs | {key: False}, **kwargs)
 
     with pytest.raises(ValidationError) as e:
-        validate_specs(specs | {key: 42})
+        validate_specs(specs | {key: 42}, **kwargs)
     assert e.value.path == path + [key]
     assert e.value.message == f"value must be a bool"
 
     with pytest.raises(ValidationError) as e:
-        validate_specs(specs | {key: "Hello world!"})
+        validate_specs(specs | {key: "Hello world!"}, **kwargs)
     assert e.value.path == path + [key]
     assert e.value.message == f"value must be a bool"
 
@@ -144,8 +147,8 @@ def length_property_test(specs):
     assert e.value.path == ["length"]
     assert e.value.message == "'foo' property is unexpected"
 
-def option_property_test(specs, path):
-    bool_value_property_test(specs, "option", path)
+def option_property_test(specs, path, **kwargs):
+    bool_value_property_test(specs, "option", path, **kwargs)
 
 def additional_properties_test(specs):
     errors = []
@@ -342,6 +345,12 @@ def test_string_type():
     validate_specs(specs | {'pattern': '^[a-z]+(-[a-z]+)*$'})
     string_value_property_test(specs, 'pattern', [])
 
+    for invalid_pattern in ['^[a-z+$', '(foo', '*foo']:
+        with pytest.raises(ValidationError) as e:
+            validate_specs(specs | {'pattern': invalid_pattern})
+        assert e.value.path == ['pattern']
+        assert e.value.message == "value must be a valid regex"
+
     # test the 'option' property
     option_property_test(specs, [])
 
@@ -779,3 +788,352 @@ def test_enum_type():
     assert errors[2].message == "'bar' value is duplicated"
     assert errors[3].path == ["option"]
     assert errors[3].message == "value must be a bool"
+
+def test_union_type():
+    # test minimal specs
+    specs = {
+        'type': 'union',
+        'discriminator': 'kind',
+        'variants': {
+            'foo': {'type': 'map', 'fields': {'bar': {'type': 'number'}}},
+            'quz': {'type': 'map', 'fields': {'bar': {'type': 'string'}}}
+        }
+    }
+    validate_specs(specs)
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs({'type': 'union', 'variants': specs['variants']})
+    assert e.value.path == []
+    assert e.value.message == "'discriminator' property is missing"
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs({'type': 'union', 'discriminator': 'kind'})
+    assert e.value.path == []
+    assert e.value.message == "'variants' property is missing"
+
+    # test 'discriminator' property
+    with pytest.raises(ValidationError) as e:
+        validate_specs(specs | {'discriminator': 42})
+    assert e.value.path == ["discriminator"]
+    assert e.value.message == "value must be a string"
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs(specs | {'discriminator': '@kind'})
+    assert e.value.path == ["discriminator"]
+    assert e.value.message == "'@kind' is an incorrect key name"
+
+    # test 'variants' property
+    for value in [True, False, 42, "Hello world!", []]:
+        with pytest.raises(ValidationError) as e:
+            validate_specs(specs | {'variants': value})
+        assert e.value.path == ["variants"]
+        assert e.value.message == "value must be a dict"
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs(specs | {'variants': {}})
+    assert e.value.path == ["variants"]
+    assert e.value.message == "must contain at least one variant"
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs(specs | {'variants': {'@foo': specs['variants']['foo']}})
+    assert e.value.path == ["variants"]
+    assert e.value.message == "'@foo' is an incorrect key name"
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs(specs | {'variants': {'foo': {'type': 'map'}}})
+    assert e.value.path == ["@foo"]
+    assert e.value.message == "'fields' property is missing"
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs(specs | {'variants': {'foo': {'type': 'flag'}}})
+    assert e.value.path == ["@foo"]
+    assert e.value.message == "value of 'type' must be 'map'"
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs(specs | {'variants': {'foo': {'type': 'map', 'fields': {'kind': {'type': 'flag'}}}}})
+    assert e.value.path == ["@foo", "fields"]
+    assert e.value.message == "'kind' field conflicts with the discriminator"
+
+    # test the 'option' property
+    option_property_test(specs, [])
+
+    # test additional properties
+    additional_properties_test(specs)
+
+def test_reference_type():
+    # test minimal specs
+    specs = {
+        'type': 'reference',
+        'record': 'foo'
+    }
+    validate_specs(specs, records={'foo': {'type': 'flag'}})
+
+    # references are checked even if no records are passed
+    with pytest.raises(ValidationError) as e:
+        validate_specs(specs)
+    assert e.value.path == ["record"]
+    assert e.value.message == "'foo' record is undefined"
+
+    validate_specs(specs, check_references=False)
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs({'type': 'reference'})
+    assert e.value.path == []
+    assert e.value.message == "'record' property is missing"
+
+    # test 'record' property
+    for value in [True, False, 42, [], {}]:
+        with pytest.raises(ValidationError) as e:
+            validate_specs({'type': 'reference', 'record': value})
+        assert e.value.path == ["record"]
+        assert e.value.message == "value must be a string"
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs({'type': 'reference', 'record': '@foo'})
+    assert e.value.path == ["record"]
+    assert e.value.message == "'@foo' is an incorrect record name"
+
+    # test if references are resolved (including the ones of the records)
+    records = {
+        'foo': {'type': 'array', 'value': {'type': 'reference', 'record': 'bar'}},
+        'bar': {'type': 'map', 'fields': {'foo': {'type': 'reference', 'record': 'foo'}}},
+        'quz': {'type': 'reference', 'record': 'yolo'}
+    }
+
+    validate_specs(specs, records=records)
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs({'type': 'array', 'value': {'type': 'reference', 'record': 'quz'}}, records=records)
+    assert e.value.path == ["[]", "record"]
+    assert e.value.message == "'yolo' record is undefined"
+
+    # test the 'option' property
+    option_property_test(specs, [], check_references=False)
+
+    # test additional properties
+    additional_properties_test(specs)
+
+def test_normalize_specs():
+    specs = {
+        'type': 'map',
+        'fields': {
+            'foo': {
+                'type': 'number',
+                'decimal': False,
+                'minimum': 0,
+                'maximum': {'exclusive': True, 'value': 42}
+            },
+            'bar': {
+                'type': 'array',
+                'value': {
+                    'type': 'string',
+                    'length': 8.0,
+                    'pattern': "^[a-z]+$"
+                },
+                'length': {'maximum': 4},
+                'option': True
+            },
+            'quz': {
+                'type': 'tuple',
+                'items': [
+                    {'type': 'flag'},
+                    {'type': 'enum', 'values': ['foo', 'bar']}
+                ]
+            }
+        },
+        'name': 'foo',
+        'description': "Lorem ipsum."
+    }
+
+    normalized_specs = normalize_specs(specs)
+    assert type(normalized_specs) is MappingProxyType
+    assert normalized_specs['name'] == 'foo'
+    assert normalized_specs['description'] == "Lorem ipsum."
+    assert normalized_specs['option'] == False
+
+    foo = normalized_specs['fields']['foo']
+    assert foo['decimal'] == False
+    assert foo['minimum'] == (False, 0)
+    assert foo['maximum'] == (True, 42)
+    assert foo['name'] is None
+    assert foo['option'] == False
+
+    bar = normalized_specs['fields']['bar']
+    assert bar['length'] == (None, 4)
+    assert bar['option'] == True
+    assert bar['value']['length'] == 8
+    assert bar['value']['pattern'].match("foobar")
+    assert not bar['value']['pattern'].match("FOOBAR")
+
+    assert normalized_specs['required'] == frozenset(['foo', 'quz'])
+    assert normalized_specs['optional'] == ('bar',)
+
+    quz = normalized_specs['fields']['quz']
+    assert quz['items'][0]['type'] == 'flag'
+    assert quz['items'][1]['values'] == ('foo', 'bar')
+
+    # the canonical form is read-only
+    with pytest.raises(TypeError):
+        normalized_specs['fields']['foo']['decimal'] = True
+
+    # normalized specs are returned unchanged, nodes are accepted (and their
+    # canonical form is cached)
+    assert normalize_specs(normalized_specs) is normalized_specs
+    assert normalize_specs(Node('number'))['minimum'] is None
+
+    node = Node('array', value=Node('number'))
+    assert normalize_specs(node) is normalize_specs(node)
+
+    # the canonical form of dict specs is memoized, other specs have their
+    # own canonical form
+    assert normalize_specs(specs) is normalized_specs
+    other_specs = dict(specs, fields=dict(specs['fields'], foo={'type': 'number', 'decimal': True}))
+    assert normalize_specs(other_specs)['fields']['foo']['decimal'] == True
+    assert normalize_specs({'type': 'number', 'decimal': True}) is not normalize_specs({'type': 'number', 'decimal': 1})
+
+def test_normalize_specs_references():
+    records = {
+        'tree': {
+            'type': 'map',
+            'fields': {
+                'value': {'type': 'number'},
+                'children': {
+                    'type': 'array',
+                    'value': {'type': 'reference', 'record': 'tree'},
+                    'option': True
+                }
+            }
+        }
+    }
+
+    specs = {
+        'type': 'tuple',
+        'items': [
+            {'type': 'reference', 'record': 'tree'},
+            {'type': 'reference', 'record': 'tree', 'option': True}
+        ]
+    }
+
+    normalized_specs = normalize_specs(specs, records)
+    first, second = normalized_specs['items']
+    assert first['type'] == 'map'
+    assert first['option'] == False
+    assert second['option'] == True
+
+    # the record is normalized once and its children are shared (recursive
+    # records are cyclic)
+    assert first['fields'] is second['fields']
+    assert first['fields']['children']['value']['fields'] is first['fields']
+
+    # normalized records can be shared by several specs
+    normalized_records = {}
+    tree = normalize_specs({'type': 'reference', 'record': 'tree'}, records, normalized_records)
+    other_tree = normalize_specs({'type': 'reference', 'record': 'tree'}, records, normalized_records)
+    assert tree['fields'] is other_tree['fields']
+
+    with pytest.raises(AssertionError):
+        normalize_specs({'type': 'reference', 'record': 'tree'})
+
+def test_normalize_specs_pickling():
+    records = {
+        'tree': {
+            'type': 'map',
+            'fields': {
+                'name': {'type': 'string', 'pattern': "^(a+)+$"},
+                'children': {
+                    'type': 'array',
+                    'value': {'type': 'reference', 'record': 'tree'}
+                }
+            }
+        }
+    }
+
+    specs = normalize_specs({'type': 'reference', 'record': 'tree'}, records)
+    other_specs = pickle.loads(pickle_specs(specs))
+
+    assert type(other_specs) is MappingProxyType
+    assert type(other_specs['fields']['name']['pattern']) is type(specs['fields']['name']['pattern'])
+
+    # cycles are preserved
+    assert other_specs['fields']['children']['value']['fields'] is other_specs['fields']
+
+    # other proxies are pickled as usual
+    with pytest.raises(TypeError):
+        pickle.dumps(specs)
+
+def test_validate_specs_memoization():
+    specs = {
+        'type': 'map',
+        'fields': {
+            'foo': {'type': 'string', 'length': 42.5}
+        }
+    }
+
+    # valid specs report the same warnings when validated again
+    for _ in range(2):
+        warnings = []
+        validate_specs(specs, warnings=warnings)
+        assert len(warnings) == 1
+        assert warnings[0].path == ["$foo", "length"]
+        assert warnings[0].message == "should be an integer (got float)"
+
+    # the memo distinguishes values that compare equal
+    warnings = []
+    validate_specs({'type': 'string', 'length': 42}, warnings=warnings)
+    validate_specs({'type': 'string', 'length': 42.0}, warnings=warnings)
+    assert len(warnings) == 1
+    assert warnings[0].path == ["length"]
+
+    # invalid specs are not memoized
+    for _ in range(2):
+        with pytest.raises(ValidationError) as e:
+            validate_specs({'type': 'string', 'length': -1})
+        assert e.value.path == ["length"]
+
+    # nodes are memoized, including the nodes of their tree
+    node = Node('string', pattern="^(a+)+$")
+    for _ in range(2):
+        warnings = []
+        validate_specs(node, warnings=warnings)
+        assert len(warnings) == 1
+        assert warnings[0].path == ["pattern"]
+
+    warnings = []
+    validate_specs(Node('map', fields={'foo': Node('number'), 'bar': node}), warnings=warnings)
+    assert len(warnings) == 1
+    assert warnings[0].path == ["$bar", "pattern"]
+    assert warnings[0].message == "pattern is subject to catastrophic backtracking"
+
+    with pytest.raises(ValidationError) as e:
+        validate_specs(Node('array', value=Node('string', pattern="(")))
+    assert e.value.path == ["[]", "pattern"]
+
+def test_specs_identity_memoization(monkeypatch):
+    from byteplug.document import specs as specs_module
+
+    specs = {
+        'type': 'map',
+        'fields': {
+            'foo': {'type': 'string', 'length': 42.5}
+        }
+    }
+
+    validate_specs(specs, warnings=[])
+    normalized_specs = normalize_specs(specs)
+
+    # the same dict specs are looked up by identity, they're not serialized
+    # again
+    def serialize_specs(specs):
+        raise AssertionError("specs shouldn't be serialized")
+    monkeypatch.setattr(specs_module, 'serialize_specs', serialize_specs)
+
+    warnings = []
+    validate_specs(specs, warnings=warnings)
+    assert len(warnings) == 1
+    assert warnings[0].path == ["$foo", "length"]
+
+    assert normalize_specs(specs) is normalized_specs
+
+    # other dict specs are still serialized
+    with pytest.raises(AssertionError):
+        normalize_specs(dict(specs))
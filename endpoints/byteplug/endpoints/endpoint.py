@@ -14,9 +14,11 @@ from byteplug.document.specs import validate_specs
 Operate = Enum('Operate', 'ITEM COLLECTION')
 
 def request(specs):
+    # Nodes are validated as nodes (see validate_specs()); references are
+    # checked when the endpoint is added.
+    validate_specs(specs, check_references=False)
     if type(specs) is Node:
         specs = specs.to_object()
-    validate_specs(specs)
 
     def decorator(function):
         assert "specs" in dir(function), "the @request decorator must be followed by an endpoint decorator"
@@ -26,9 +28,11 @@ def request(specs):
     return decorator
 
 def response(specs):
+    # Nodes are validated as nodes (see validate_specs()); references are
+    # checked when the endpoint is added.
+    validate_specs(specs, check_references=False)
     if type(specs) is Node:
         specs = specs.to_object()
-    validate_specs(specs)
 
     def decorator(function):
         assert "specs" in dir(function), "the @response decorator must be followed by an endpoint decorator"
@@ -40,9 +44,9 @@ def response(specs):
 def error(tag, specs=None, name=None, description=None):
     assert re.match(r"^[a-z]+(-[a-z]+)*$", tag), "invalid tag name"
     if specs:
+        validate_specs(specs, check_references=False)
         if type(specs) is Node:
             specs = specs.to_object()
-        validate_specs(specs)
 
     def decorator(function):
         assert "specs" in dir(function), "the @error decorator must be followed by an endpoint decorator"
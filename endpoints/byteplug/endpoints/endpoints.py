@@ -6,25 +6,61 @@
 #
 # Written by Jonathan De Wachter <jonathan.dewachter@byteplug.io>, July 2022
 
+import gc
 import re
-import yaml
-from flask import Flask, request
-from flask_cors import CORS
-from byteplug.document.specs import validate_specs
+from byteplug.document.specs import validate_specs, normalize_specs
+from byteplug.document.specs import find_references, find_undefined_record
 from byteplug.document.node import Node
 from byteplug.document.object import object_to_document
 from byteplug.document.document import document_to_object
+from byteplug.document.dictionary import make_dictionary, compress_document, decompress_document
+from byteplug.document.dictionary import MAX_DOCUMENT_SIZE
+from byteplug.document.limits import LimitExceeded
 from byteplug.document.exception import ValidationError, ValidationWarning
+from byteplug.document.summary import ErrorSummary
 from byteplug.endpoints.endpoint import Operate
 from byteplug.endpoints.exception import EndpointError
 from byteplug.endpoints.utility import invalid_response_specs_mismatch, json_body_expected, body_not_json_format, json_body_specs_mismatch, no_json_body_expected
 from byteplug.endpoints.utility import invalid_error_specs_mismatch, invalid_error, invalid_error_specs_mismatch, unhandled_error
-from byteplug.endpoints.utility import valid_error
+from byteplug.endpoints.utility import valid_error, json_body_too_large, invalid_body_encoding
+
+# Notes:
+# - Flask and YAML are imported on first use (when an Endpoints object is
+#   created and when the specs are generated, respectively); applications
+#   and tools only using the decorators or the document validator don't pay
+#   for importing them.
+# - JSON bodies of requests and responses can be compressed with a preset
+#   dictionary derived from their specs (see make_dictionary()), which both
+#   sides share; it's negotiated with the 'byteplug-zdict' token in the
+#   'Content-Encoding' header of requests, and in the 'Accept-Encoding'
+#   header of requests for the responses. Error responses aren't compressed.
+
+# Limits enforced on JSON bodies of requests (see document_to_object()).
+LIMITS = ['max_bytes', 'max_depth', 'max_nodes', 'max_string_length']
+
+# Content coding of JSON bodies compressed with the dictionary of their specs.
+DICTIONARY_ENCODING = 'byteplug-zdict'
 
 # TOOD; Move this to utils.py ?
 def authorization_denied():
     return {}, 401
 
+def accepts_dictionary_encoding(accept_encodings):
+    # The token must be listed explicitly (a '*' value doesn't match it since
+    # clients must know the specs to decompress the body).
+    for value, quality in accept_encodings:
+        if value == DICTIONARY_ENCODING and quality > 0:
+            return True
+
+    return False
+
+def check_references(specs, records):
+    # Records can reference each other (in any order), therefore references
+    # are checked when the endpoint is added.
+    for _, record in find_references(specs):
+        undefined_record = find_undefined_record(record, records)
+        assert undefined_record is None, f"'{undefined_record}' record does not exist (must be added first)"
+
 def make_endpoint_block(endpoint):
     block = {}
 
@@ -68,7 +104,9 @@ def make_endpoint_block(endpoint):
     return block
 
 class Endpoints:
-    def __init__(self, name, title=None, summary=None, contact=None, license=None, version=None):
+    def __init__(self, name, title=None, summary=None, contact=None, license=None, version=None, limits=None):
+        from flask import Flask
+        from flask_cors import CORS
 
         self.flask = Flask(name)
         self.flask_cors = CORS(self.flask)
@@ -81,17 +119,29 @@ class Endpoints:
 
         self.version = version
 
+        # Default limits of all endpoints.
+        if limits is None:
+            limits = {}
+        for key in limits.keys():
+            assert key in LIMITS, f"'{key}' limit is invalid"
+        self.limits = limits
+
         self.records = {}
 
+        # Records are normalized once and shared by all the specs referencing
+        # them (see normalize_specs()).
+        self.normalized_records = {}
+
         self.endpoints = []
         self.collections = {}
 
     def add_record(self, tag, specs):
         assert re.match(r"^[a-z]+(-[a-z]+)*$", tag), "invalid record name"
 
+        # Records can reference records that are added later.
+        validate_specs(specs, check_references=False)
         if type(specs) is Node:
             specs = specs.to_object()
-        validate_specs(specs)
 
         assert tag not in self.records, "record with that name already exists"
         self.records[tag] = specs
@@ -106,9 +156,24 @@ class Endpoints:
             'endpoints': []
         }
 
-    def add_endpoint(self, endpoint):
+    def add_endpoint(self, endpoint, limits=None):
         assert 'specs' in dir(endpoint), "not an endpoint"
 
+        # The limits of the endpoint override the default limits.
+        if limits is None:
+            limits = {}
+        for key in limits.keys():
+            assert key in LIMITS, f"'{key}' limit is invalid"
+        limits = self.limits | limits
+
+        if endpoint.specs['request']:
+            check_references(endpoint.specs['request'], self.records)
+        if endpoint.specs['response']:
+            check_references(endpoint.specs['response'], self.records)
+        for error in endpoint.specs['errors'].values():
+            if error['specs']:
+                check_references(error['specs'], self.records)
+
         if endpoint.specs.get('collection'):
             name = endpoint.specs.get('collection')
 
@@ -138,6 +203,29 @@ class Endpoints:
         #
 
         def endpoint_function_maker(endpoint):
+            from flask import request
+
+            # Specs are normalized once, rather than on each request (see
+            # normalize_specs()); referenced records are shared.
+            records, normalized_records = self.records, self.normalized_records
+
+            request_specs = None
+            request_dictionary = None
+            if endpoint.specs['request']:
+                request_specs = normalize_specs(endpoint.specs['request'], records, normalized_records)
+                request_dictionary = make_dictionary(request_specs)
+
+            response_specs = None
+            response_dictionary = None
+            if endpoint.specs['response']:
+                response_specs = normalize_specs(endpoint.specs['response'], records, normalized_records)
+                response_dictionary = make_dictionary(response_specs)
+
+            error_specs = {}
+            for tag, error in endpoint.specs['errors'].items():
+                if error['specs']:
+                    error_specs[tag] = normalize_specs(error['specs'], records, normalized_records)
+
             def endpoint_function(*args, **kwargs):
 
                 input_kwargs = {}
@@ -168,11 +256,18 @@ class Endpoints:
                     input_kwargs['item'] = item_id
 
                 has_body = request.content_length > 0
+
+                # Reject large bodies before they're even read.
+                max_bytes = limits.get('max_bytes')
+                if max_bytes is not None and request.content_length > max_bytes:
+                    return json_body_too_large(max_bytes)
+
                 is_body_json = None
                 if has_body:
                     is_body_json = request.is_json
+                is_body_compressed = request.headers.get('Content-Encoding') == DICTIONARY_ENCODING
                 json_body = None
-                if is_body_json:
+                if is_body_json and not is_body_compressed:
                     # Note that the raw data may not be valid JSON.
                     json_body = request.get_data(as_text=True)
 
@@ -184,8 +279,20 @@ class Endpoints:
                     if not is_body_json:
                         return body_not_json_format()
 
-                    errors, warnings = [], []
-                    document = document_to_object(json_body, endpoint.specs['request'], errors=errors, warnings=warnings)
+                    if is_body_compressed:
+                        # The limit applies to the decompressed body as well;
+                        # it's always limited, even if the endpoint has no
+                        # limit (see decompress_document()).
+                        max_decompressed_bytes = max_bytes if max_bytes is not None else MAX_DOCUMENT_SIZE
+                        try:
+                            json_body = decompress_document(request.get_data(), request_dictionary, max_decompressed_bytes)
+                        except ValueError:
+                            return invalid_body_encoding()
+                        except LimitExceeded:
+                            return json_body_too_large(max_decompressed_bytes)
+
+                    errors, warnings = ErrorSummary(), []
+                    document = document_to_object(json_body, request_specs, errors=errors, warnings=warnings, **limits)
                     if len(errors) > 0:
                         return json_body_specs_mismatch(errors, warnings)
 
@@ -226,8 +333,8 @@ class Endpoints:
 
                             # assert e.value != None, "error didn't expect a value"
 
-                            errors, warnings = [], []
-                            document = object_to_document(e.value, error['specs'], errors=errors, warnings=warnings, no_dump=True)
+                            errors, warnings = ErrorSummary(), []
+                            document = object_to_document(e.value, error_specs[e.tag], errors=errors, warnings=warnings, no_dump=True)
 
                             if len(errors) > 0:
                                 return invalid_error_specs_mismatch(errors, warnings)
@@ -239,12 +346,20 @@ class Endpoints:
                     return unhandled_error()
 
                 if endpoint.specs['response']:
-                    errors, warnings = [], []
-                    document = object_to_document(value, endpoint.specs['response'], errors=errors, warnings=warnings)
+                    errors, warnings = ErrorSummary(), []
+                    document = object_to_document(value, response_specs, errors=errors, warnings=warnings)
                     if len(errors) > 0:
                         return invalid_response_specs_mismatch(errors, warnings)
 
-                    return document, 200, {'Content-Type': 'application/json'}
+                    if accepts_dictionary_encoding(request.accept_encodings):
+                        headers = {
+                            'Content-Type': 'application/json',
+                            'Content-Encoding': DICTIONARY_ENCODING,
+                            'Vary': 'Accept-Encoding'
+                        }
+                        return compress_document(document, response_dictionary), 200, headers
+
+                    return document, 200, {'Content-Type': 'application/json', 'Vary': 'Accept-Encoding'}
                 else:
                     return ('', 204)
 
@@ -292,6 +407,8 @@ class Endpoints:
             def json_specs():
                 return specs_obj, 200, {'Content-Type': 'application/json'}
         else:
+            import yaml
+
             specs_yaml_string = yaml.safe_dump(specs_obj, sort_keys=False)
             @self.flask.route(path, methods=['GET'])
             def yaml_specs():
@@ -300,6 +417,8 @@ class Endpoints:
     def add_shutdown_endpoint(self):
         # Code taken from Stackoverflow (turns out it's not necessary by the
         # unit tests; could be removed).
+        from flask import request
+
         @self.flask.route("/shutdown", methods=['GET'])
         def shutdown():
             shutdown_func = request.environ.get('werkzeug.server.shutdown')
@@ -308,6 +427,22 @@ class Endpoints:
             shutdown_func()
             return "Shutting down..."
 
+    def freeze(self):
+        """ Prepare the endpoints to be shared by forked workers.
+
+        Call it once all endpoints are added, right before the workers are
+        forked (for instance, by a pre-forking server loading the application
+        in its master process). The objects created so far, including the
+        normalized specs of the endpoints, are moved to the permanent
+        generation of the garbage collector (see gc.freeze()); collections in
+        the workers don't write to their headers anymore. Updates of their
+        reference counts still copy the pages of the objects the workers use,
+        only the pages of the objects they don't touch stay shared.
+        """
+
+        gc.collect()
+        gc.freeze()
+
     def run(self, host='127.0.0.1', port=5000):
         self.flask.run(host, port)
 
@@ -373,6 +508,8 @@ class Endpoints:
             block['collections'] = collections_block
 
         if to_string:
+            import yaml
+
             return yaml.safe_dump(block, sort_keys=False)
         else:
             return block
@@ -17,6 +17,31 @@ def errors_to_json(errors):
 
     return json
 
+def error_summary_to_json(summary):
+    # Errors that occurred once are reported as usual; repeated errors are
+    # reported once with their normalized path (for instance,
+    # '$items.[*].$price'), their count and the paths of the first of them.
+    # The errors of the fields exceeding the maximum number of fields of the
+    # summary are reported as a group as well.
+    json = []
+    for group in summary:
+        if group.count == 1 and not group.truncated:
+            error = group.examples[0]
+            item = {
+                'path': '.'.join(error.path),
+                'message': error.message
+            }
+        else:
+            item = {
+                'path': '.'.join(group.path),
+                'message': group.message,
+                'count': group.count,
+                'examples': ['.'.join(error.path) for error in group.examples]
+            }
+        json.append(item)
+
+    return json
+
 def json_response(json, code):
     return json, code, {'Content-Type': 'application/json'}
 
@@ -46,12 +71,32 @@ def json_body_specs_mismatch(errors, warnings):
         'code': 'json-body-specs-mismatch',
         'name': "The JSON body does not match the specs",
         'description': "The JSON body in the HTTP request does not match the specifications.",
-        'errors': errors_to_json(errors),
+        'errors': error_summary_to_json(errors),
         'warnings': errors_to_json(warnings)
     }
 
     return json_response(json, 400)
 
+def json_body_too_large(max_bytes):
+    json = {
+        'kind': 'client-side-error',
+        'code': 'json-body-too-large',
+        'name': "The JSON body is too large",
+        'description': f"The JSON body in the HTTP request must not exceed {max_bytes} bytes."
+    }
+
+    return json_response(json, 413)
+
+def invalid_body_encoding():
+    json = {
+        'kind': 'client-side-error',
+        'code': 'invalid-body-encoding',
+        'name': "The body encoding is invalid",
+        'description': "The compressed body in the HTTP request could not be decompressed with the dictionary of the specs."
+    }
+
+    return json_response(json, 400)
+
 def no_json_body_expected():
     json = {
         'kind': 'client-side-error',
@@ -68,7 +113,7 @@ def invalid_response_specs_mismatch(errors, warnings):
         'code': 'invalid-response-specs-mismatch',
         'name': "Invalid returned response JSON body",
         'description': "The endpoint did not return a response JSON body matching its specifications.",
-        'errors': errors_to_json(errors),
+        'errors': error_summary_to_json(errors),
         'warnings': errors_to_json(warnings)
     }
 
@@ -90,7 +135,7 @@ def invalid_error_specs_mismatch(errors, warnings):
         'code': 'invalid-error-specs-mismatch',
         'name': "Invalid returned error JSON body",
         'description': "The endpoint did not return an error JSON body matching its specifications.",
-        'errors': errors_to_json(errors),
+        'errors': error_summary_to_json(errors),
         'warnings': errors_to_json(warnings)
     }
 
@@ -2,7 +2,7 @@ from setuptools import setup
 
 setup(
     name='byteplug-endpoints',
-    version='0.1.2.dev4',
+    version='0.1.2.dev5',
     description="Byteplug toolkit that implements the Endpoints standard.",
     url='https://www.byteplug.io/standards/endpoints',
     author='Jonathan De Wachter',
@@ -12,7 +12,6 @@ setup(
         'License :: OSI Approved :: Open Software License 3.0 (OSL-3.0)'
     ],
     packages=['byteplug', 'byteplug.endpoints'],
-    namespace_packages = ['byteplug'],
     python_requires='>=3.9',
-    install_requires=['pyyaml', 'flask', 'byteplug-document']
+    install_requires=['pyyaml', 'flask', 'byteplug-document>=0.1.2.dev5']
 )
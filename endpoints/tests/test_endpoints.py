@@ -596,3 +596,267 @@ def test_specs_endpoint():
     assert json_response['standard'] == "https://www.byteplug.io/standards/easy-endpoints/1.0"
 
     stop_server(server, 8088)
+
+def test_limits():
+    """ Test the limits enforced on the JSON body of requests. """
+
+    @request(Node('array', value=Node('string')))
+    @endpoint("foo")
+    def foo(document):
+        pass
+
+    @request(Node('array', value=Node('string')))
+    @endpoint("bar")
+    def bar(document):
+        pass
+
+    endpoints = Endpoints("test", limits={'max_bytes': 32, 'max_nodes': 4})
+    endpoints.add_endpoint(foo)
+    endpoints.add_endpoint(bar, limits={'max_bytes': 64})
+
+    server = start_server(endpoints, 8089)
+
+    # test triggering the 'json-body-too-large' client-side error
+    url = build_url('/foo', 8089)
+    response = requests_post_json(url, ["Hello world!"] * 4)
+    assert response.status_code == 413
+    assert response.json() == {
+        'kind': 'client-side-error',
+        'code': 'json-body-too-large',
+        'name': "The JSON body is too large",
+        'description': "The JSON body in the HTTP request must not exceed 32 bytes."
+    }
+
+    # test if endpoint limits override the default limits
+    url = build_url('/bar', 8089)
+    response = requests_post_json(url, ["Hello world!"] * 3)
+    assert response.status_code == 204
+
+    response = requests_post_json(url, ["foo"] * 4)
+    assert response.status_code == 400
+    assert response.json()['errors'] == [{
+        'path': '[3]',
+        'message': "number of nodes must be equal or lower than 4"
+    }]
+
+    stop_server(server, 8089)
+
+def test_error_summary():
+    """ Test if repeated errors of a JSON body are summarized. """
+
+    @request(Node('map', fields={
+        'items': Node('array', value=Node('map', fields={
+            'price': Node('number', min=0)
+        }))
+    }))
+    @endpoint("foo")
+    def foo(document):
+        pass
+
+    endpoints = Endpoints("test")
+    endpoints.add_endpoint(foo)
+
+    server = start_server(endpoints, 8090)
+
+    url = build_url('/foo', 8090)
+    response = requests_post_json(url, {'items': [{'price': -1}] * 100 + [{'price': "foo"}]})
+    assert response.status_code == 400
+    assert response.json()['errors'] == [
+        {
+            'path': '$items.[*].$price',
+            'message': "value must be equal or greater than 0",
+            'count': 100,
+            'examples': [
+                '$items.[0].$price',
+                '$items.[1].$price',
+                '$items.[2].$price',
+                '$items.[3].$price',
+                '$items.[4].$price'
+            ]
+        },
+        {
+            'path': '$items.[100].$price',
+            'message': "was expecting a JSON number"
+        }
+    ]
+
+    # the number of unexpected fields reported is bounded
+    document = {f'field-{index}': 1 for index in range(1000)} | {'items': []}
+    response = requests_post_json(url, document)
+    assert response.status_code == 400
+    errors = response.json()['errors']
+    assert len(errors) == 11
+    assert errors[10] == {
+        'path': '',
+        'message': "other fields were unexpected",
+        'count': 990,
+        'examples': ['', '', '', '', '']
+    }
+
+    stop_server(server, 8090)
+
+def test_records():
+    """ Test if specs can reference records, including recursive ones. """
+
+    from byteplug.endpoints.endpoint import response
+
+    @request(Node('reference', record='tree'))
+    @response(Node('array', value=Node('reference', record='tree')))
+    @endpoint("foo")
+    def foo(document):
+        return [document, document]
+
+    @request(Node('reference', record='quz'))
+    @endpoint("bar")
+    def bar(document):
+        pass
+
+    endpoints = Endpoints("test")
+    endpoints.add_record("tree", Node('map', fields={
+        'value': Node('number'),
+        'children': Node('array', value=Node('reference', record='tree'), option=True)
+    }))
+    endpoints.add_endpoint(foo)
+
+    with pytest.raises(AssertionError) as e:
+        endpoints.add_endpoint(bar)
+    assert str(e.value) == "'quz' record does not exist (must be added first)"
+
+    # records are exposed once and referenced by the endpoints
+    block = endpoints.generate_specs(to_string=False)
+    assert block['endpoints']['foo']['request'] == {'type': 'reference', 'record': 'tree'}
+    assert block['records']['tree']['fields']['children']['value'] == {'type': 'reference', 'record': 'tree'}
+
+    server = start_server(endpoints, 8091)
+
+    url = build_url('/foo', 8091)
+    document = {'value': 1, 'children': [{'value': 2, 'children': [{'value': 3}]}]}
+    response = requests_post_json(url, document)
+    assert response.status_code == 200
+    adjusted_document = {'value': 1, 'children': [{'value': 2, 'children': [{'value': 3, 'children': None}]}]}
+    assert response.json() == [adjusted_document, adjusted_document]
+
+    response = requests_post_json(url, {'value': 1, 'children': [{'value': "foo"}]})
+    assert response.status_code == 400
+    assert response.json()['errors'] == [{
+        'path': '$children.[0].$value',
+        'message': "was expecting a JSON number"
+    }]
+
+    stop_server(server, 8091)
+
+def test_dictionary_encoding():
+    """ Test if bodies can be compressed with the dictionary of their specs. """
+
+    from byteplug.endpoints.endpoint import response
+    from byteplug.document import make_dictionary, compress_document, decompress_document
+
+    request_specs = Node('array', value=Node('map', fields={
+        'status': Node('enum', values=['pending', 'shipped'])
+    }))
+    response_specs = Node('map', fields={'count': Node('number')})
+
+    @request(request_specs)
+    @response(response_specs)
+    @endpoint("foo")
+    def foo(document):
+        return {'count': len(document)}
+
+    endpoints = Endpoints("test", limits={'max_bytes': 256})
+    endpoints.add_endpoint(foo)
+
+    server = start_server(endpoints, 8093)
+
+    url = build_url('/foo', 8093)
+    request_dictionary = make_dictionary(request_specs)
+    response_dictionary = make_dictionary(response_specs)
+
+    document = json.dumps([{'status': 'shipped'}] * 10)
+    headers = {
+        'Content-Type': 'application/json',
+        'Content-Encoding': 'byteplug-zdict',
+        'Accept-Encoding': 'byteplug-zdict'
+    }
+
+    response = requests.post(url, data=compress_document(document, request_dictionary), headers=headers)
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'byteplug-zdict'
+    assert json.loads(decompress_document(response.content, response_dictionary)) == {'count': 10}
+
+    # responses are compressed only if the token is accepted
+    response = requests_post_json(url, [{'status': 'shipped'}], headers={'Accept-Encoding': 'gzip, *'})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    assert response.json() == {'count': 1}
+
+    # test triggering the 'invalid-body-encoding' client-side error
+    data = compress_document(document, response_dictionary)
+    response = requests.post(url, data=data, headers=headers)
+    assert response.status_code == 400
+    assert response.json()['code'] == 'invalid-body-encoding'
+
+    # the limits apply to the decompressed body
+    data = compress_document(json.dumps([{'status': 'shipped'}] * 20), request_dictionary)
+    assert len(data) < 256
+    response = requests.post(url, data=data, headers=headers)
+    assert response.status_code == 413
+    assert response.json()['code'] == 'json-body-too-large'
+
+    stop_server(server, 8093)
+
+    # the decompressed body is limited even if the endpoint has no limit
+    endpoints = Endpoints("test")
+    endpoints.add_endpoint(foo)
+
+    server = start_server(endpoints, 8094)
+
+    url = build_url('/foo', 8094)
+    data = compress_document(json.dumps([{'status': 'shipped'}] * 1000000), request_dictionary)
+    response = requests.post(url, data=data, headers=headers)
+    assert response.status_code == 413
+    assert response.json()['description'] == "The JSON body in the HTTP request must not exceed 16777216 bytes."
+
+    stop_server(server, 8094)
+
+def test_freeze():
+    """ Test if endpoints still serve requests once frozen. """
+
+    import gc
+
+    @request(Node('string'))
+    @endpoint("foo")
+    def foo(document):
+        pass
+
+    endpoints = Endpoints("test")
+    endpoints.add_endpoint(foo)
+
+    endpoints.freeze()
+    try:
+        assert gc.get_freeze_count() > 0
+
+        server = start_server(endpoints, 8092)
+
+        url = build_url('/foo', 8092)
+        response = requests_post_json(url, "bar")
+        assert response.status_code == 204
+
+        stop_server(server, 8092)
+    finally:
+        gc.unfreeze()
+
+def test_lazy_imports():
+    """ Test if Flask and YAML are only imported when needed. """
+
+    import sys
+    import subprocess
+
+    process = subprocess.run(
+        [sys.executable, '-c', "import sys, byteplug.endpoints; print(' '.join(sys.modules))"],
+        capture_output=True, text=True, check=True
+    )
+
+    modules = process.stdout.split()
+    assert 'byteplug.endpoints.endpoints' in modules
+    for module in ['flask', 'flask_cors', 'yaml', 'pkg_resources']:
+        assert module not in modules